@@ -86,6 +86,9 @@ class SalonAdmin(admin.ModelAdmin):
         ('Фото салона', {
             'fields': ('photo', 'photo_2', 'photo_3', 'photo_4', 'photo_5')
         }),
+        ('Расписание записей', {
+            'fields': ('slot_step', 'buffer_before', 'buffer_after', 'min_lead_time')
+        }),
     )
 
 
@@ -44,6 +44,8 @@ class SalonSerializer(serializers.ModelSerializer):
             "type",
             "slug",
             "photos",
+            "rating_avg",
+            "rating_count",
         ]
 
     def get_photos(self, obj: Salon):
@@ -119,6 +121,9 @@ class AppointmentSerializer(serializers.ModelSerializer):
     stylist = StylistSerializer()
     start_time_local = serializers.SerializerMethodField()
     end_time_local = serializers.SerializerMethodField()
+    total_price = serializers.DecimalField(
+        max_digits=12, decimal_places=2, source="get_total_price", read_only=True
+    )
 
     class Meta:
         model = Appointment
@@ -137,6 +142,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
             "payment_status",
             "notes",
             "services",
+            "total_price",
             "created_at",
         ]
         read_only_fields = fields
@@ -154,6 +160,9 @@ class AdminAppointmentSerializer(serializers.ModelSerializer):
     client_name = serializers.SerializerMethodField()
     client_phone = serializers.SerializerMethodField()
     stylist_name = serializers.SerializerMethodField()
+    total_price = serializers.DecimalField(
+        max_digits=12, decimal_places=2, source="get_total_price", read_only=True
+    )
 
     class Meta:
         model = Appointment
@@ -166,6 +175,7 @@ class AdminAppointmentSerializer(serializers.ModelSerializer):
             "client_phone",
             "stylist_name",
             "services",
+            "total_price",
             "notes",
         ]
         read_only_fields = fields
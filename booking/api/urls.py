@@ -1,14 +1,18 @@
 from django.urls import path
 
 from booking.api.views import (
+    AdminAppointmentListView,
     AdminAppointmentStatusView,
     AdminAppointmentsView,
     AdminProfileView,
     AppointmentListCreateView,
+    AvailableSlotsRangeView,
     AvailableSlotsView,
     CityListView,
     CustomObtainAuthToken,
+    FirstAvailableSlotView,
     RegistrationView,
+    SalonAvailabilityView,
     SalonListView,
     SalonServiceListView,
     StylistServiceListView,
@@ -21,12 +25,24 @@ urlpatterns = [
     path("cities/", CityListView.as_view(), name="api-cities"),
     path("salons/", SalonListView.as_view(), name="api-salons"),
     path("salons/<int:pk>/services/", SalonServiceListView.as_view(), name="api-salon-services"),
+    path("salons/<int:pk>/availability/", SalonAvailabilityView.as_view(), name="api-salon-availability"),
     path("stylists/", StylistListView.as_view(), name="api-stylists"),
     path("stylists/<int:stylist_id>/services/", StylistServiceListView.as_view(), name="api-stylist-services"),
     path("stylists/<int:stylist_id>/slots/", AvailableSlotsView.as_view(), name="api-available-slots"),
+    path(
+        "stylists/<int:stylist_id>/slots/range/",
+        AvailableSlotsRangeView.as_view(),
+        name="api-available-slots-range",
+    ),
+    path(
+        "stylists/<int:stylist_id>/slots/first/",
+        FirstAvailableSlotView.as_view(),
+        name="api-first-available-slot",
+    ),
     path("appointments/", AppointmentListCreateView.as_view(), name="api-appointments"),
     path("admin/profile/", AdminProfileView.as_view(), name="api-admin-profile"),
     path("admin/appointments/", AdminAppointmentsView.as_view(), name="api-admin-appointments"),
+    path("admin/appointments/list/", AdminAppointmentListView.as_view(), name="api-admin-appointment-list"),
     path(
         "admin/appointments/<int:pk>/status/",
         AdminAppointmentStatusView.as_view(),
@@ -1,13 +1,17 @@
+import base64
+import binascii
+import json
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import List, Tuple
+from itertools import chain
+from typing import List, Optional, Tuple
 from decimal import Decimal
 from datetime import datetime
 
-import pytz
-from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from rest_framework import generics, permissions, status
@@ -16,14 +20,20 @@ from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from booking.availability import (
+    NextSlotIndex,
+    SlotConflict,
+    SlotPolicy,
+    find_slot_conflict,
+    iter_stylist_days,
+    load_stylist_day,
+    load_stylist_days,
+)
 from booking.models import (
     Appointment,
     AppointmentService,
-    BreakPeriod,
     Stylist,
-    StylistDayOff,
     StylistService,
-    WorkingHour,
 )
 from booking.api.serializers import (
     AdminAppointmentSerializer,
@@ -37,11 +47,15 @@ from booking.api.serializers import (
     StylistSerializer,
 )
 from booking.models import City, Salon, SalonService
-from booking.views import ensure_guest_account, normalize_uzbek_phone
+from booking.views import ensure_guest_account, local_day_bounds, normalize_uzbek_phone
 from users.models import Profile
 
 User = get_user_model()
 
+MAX_SLOT_RANGE_DAYS = 60
+ADMIN_APPOINTMENTS_PAGE_SIZE = 50
+ADMIN_APPOINTMENTS_MAX_PAGE_SIZE = 200
+
 
 def _normalize_start_time(value) -> datetime:
     if isinstance(value, datetime):
@@ -52,8 +66,7 @@ def _normalize_start_time(value) -> datetime:
         raise ValueError("Укажите дату и время начала в формате ISO 8601")
 
     if timezone.is_naive(dt):
-        tz = pytz.timezone(settings.TIME_ZONE)
-        dt = tz.localize(dt)
+        dt = timezone.make_aware(dt)
     return dt
 
 
@@ -74,103 +87,94 @@ def _collect_stylist_services(
     return list(stylist_services), total_duration, total_price
 
 
+def _serialize_slots(starts, total_duration: timedelta, total_price: Decimal, service_ids: List[int]):
+    duration_minutes = int(total_duration.total_seconds() // 60)
+    return [
+        {
+            "start": start.isoformat(),
+            "end": (start + total_duration).isoformat(),
+            "duration_minutes": duration_minutes,
+            "total_price": float(total_price),
+            "services": service_ids,
+        }
+        for start in starts
+    ]
+
+
+def _slot_policy(stylist: Stylist, stylist_services: List[StylistService]) -> SlotPolicy:
+    return SlotPolicy.for_salon(stylist.salon, [ss.salon_service for ss in stylist_services])
+
+
 def _available_slots_for_stylist(stylist: Stylist, target_date: datetime.date, salon_service_ids: List[int]):
     stylist_services, total_duration, total_price = _collect_stylist_services(stylist, salon_service_ids)
 
-    tz = pytz.timezone(settings.TIME_ZONE)
-    working_hours = WorkingHour.objects.filter(stylist=stylist, weekday=target_date.weekday())
-    slots = []
-    step = timedelta(minutes=15)
-
-    for wh in working_hours:
-        start_dt = datetime.combine(target_date, wh.start_time)
-        end_dt = datetime.combine(target_date, wh.end_time)
-        breaks = BreakPeriod.objects.filter(working_hour=wh)
-
-        while start_dt + total_duration <= end_dt:
-            aware_start = tz.localize(start_dt)
-            aware_end = aware_start + total_duration
-
-            overlap = (
-                Appointment.objects
-                .filter(stylist=stylist, start_time__lt=aware_end, end_time__gt=aware_start)
-                .exclude(status=Appointment.Status.CANCELLED)
-                .exists()
-            )
+    service_ids = [ss.salon_service_id for ss in stylist_services]
+    policy = _slot_policy(stylist, stylist_services)
+    day = load_stylist_day(stylist, target_date)
+    starts = day.free_starts(total_duration, policy, not_before=policy.earliest_start())
+    return _serialize_slots(starts, total_duration, total_price, service_ids)
 
-            in_break = any(
-                datetime.combine(target_date, b.start_time) < start_dt + total_duration
-                and datetime.combine(target_date, b.end_time) > start_dt
-                for b in breaks
-            )
 
-            in_dayoff = StylistDayOff.objects.filter(
-                stylist=stylist,
-                date=target_date,
-            ).filter(
-                Q(from_time__isnull=True, to_time__isnull=True)
-                | Q(from_time__lt=(start_dt + total_duration).time(), to_time__gt=start_dt.time())
-            ).exists()
-
-            if not overlap and not in_break and not in_dayoff:
-                slots.append(
-                    {
-                        "start": aware_start.isoformat(),
-                        "end": aware_end.isoformat(),
-                        "duration_minutes": int(total_duration.total_seconds() // 60),
-                        "total_price": float(total_price),
-                        "services": [ss.salon_service_id for ss in stylist_services],
-                    }
-                )
+def _available_slots_by_day(stylist: Stylist, start_date, end_date, salon_service_ids: List[int]):
+    """Yield ``{"date", "slots"}`` for every day of the range from one bulk load."""
+    stylist_services, total_duration, total_price = _collect_stylist_services(stylist, salon_service_ids)
 
-            start_dt += step
+    service_ids = [ss.salon_service_id for ss in stylist_services]
+    policy = _slot_policy(stylist, stylist_services)
+    not_before = policy.earliest_start()
+    for day in iter_stylist_days(stylist, start_date, end_date):
+        starts = day.free_starts(total_duration, policy, not_before=not_before)
+        yield {
+            "date": day.date.isoformat(),
+            "slots": _serialize_slots(starts, total_duration, total_price, service_ids),
+        }
 
-    return slots
 
+def _collect_salon_offers(salon: Salon, salon_service_ids: List[int]):
+    """Return ``(stylist, stylist_services, duration, price)`` for every stylist
+    of ``salon`` who provides all of ``salon_service_ids``, from one query."""
+    by_stylist = defaultdict(list)
+    stylist_services = (
+        StylistService.objects
+        .filter(
+            stylist__salon=salon,
+            salon_service__salon=salon,
+            salon_service_id__in=salon_service_ids,
+            salon_service__is_active=True,
+            salon_service__service__is_active=True,
+        )
+        .select_related("stylist", "stylist__user", "salon_service")
+        .order_by("stylist_id")
+    )
+    for ss in stylist_services:
+        by_stylist[ss.stylist_id].append(ss)
 
-def _validate_slot_constraints(stylist: Stylist, start_time: datetime, total_duration: timedelta) -> None:
-    tz = pytz.timezone(settings.TIME_ZONE)
-    local_start = start_time.astimezone(tz)
-    local_end = local_start + total_duration
+    required = set(salon_service_ids)
+    offers = []
+    for services in by_stylist.values():
+        if {ss.salon_service_id for ss in services} != required:
+            continue
+        total_duration = sum((ss.salon_service.duration for ss in services), timedelta())
+        total_price = sum((ss.price for ss in services), Decimal("0"))
+        offers.append((services[0].stylist, services, total_duration, total_price))
+    return offers
 
-    working_hours = list(WorkingHour.objects.filter(stylist=stylist, weekday=local_start.weekday()))
-    window = next(
-        (
-            wh for wh in working_hours
-            if wh.start_time <= local_start.time() and wh.end_time >= local_end.time()
-        ),
-        None,
-    )
-    if not window:
-        raise ValueError("Выбранное время вне рабочего графика мастера.")
-
-    breaks = BreakPeriod.objects.filter(working_hour=window)
-    in_break = any(
-        datetime.combine(local_start.date(), b.start_time) < local_start.replace(tzinfo=None) + total_duration
-        and datetime.combine(local_start.date(), b.end_time) > local_start.replace(tzinfo=None)
-        for b in breaks
-    )
-    if in_break:
-        raise ValueError("Это время попадает в перерыв мастера.")
-
-    in_dayoff = StylistDayOff.objects.filter(
-        stylist=stylist,
-        date=local_start.date(),
-    ).filter(
-        Q(from_time__isnull=True, to_time__isnull=True)
-        | Q(from_time__lt=local_end.time(), to_time__gt=local_start.time())
-    ).exists()
-    if in_dayoff:
-        raise ValueError("Мастер недоступен в выбранное время.")
-
-    overlap = (
-        Appointment.objects
-        .filter(stylist=stylist, start_time__lt=local_end.astimezone(pytz.UTC), end_time__gt=local_start.astimezone(pytz.UTC))
-        .exclude(status=Appointment.Status.CANCELLED)
-        .exists()
-    )
-    if overlap:
-        raise ValueError("На это время уже есть запись.")
+
+_SLOT_CONFLICT_MESSAGES = {
+    SlotConflict.OFF_HOURS: "Выбранное время вне рабочего графика мастера.",
+    SlotConflict.BREAK: "Это время попадает в перерыв мастера.",
+    SlotConflict.DAY_OFF: "Мастер недоступен в выбранное время.",
+    SlotConflict.BUSY: "На это время уже есть запись.",
+    SlotConflict.TOO_SOON: "На это время записаться уже нельзя, выберите время позже.",
+}
+
+
+def _validate_slot_constraints(
+    stylist: Stylist, start_time: datetime, total_duration: timedelta, policy: Optional[SlotPolicy] = None
+) -> None:
+    conflict = find_slot_conflict(stylist, start_time, start_time + total_duration, policy=policy)
+    if conflict:
+        raise ValueError(_SLOT_CONFLICT_MESSAGES[conflict])
 
 
 class RegistrationView(generics.CreateAPIView):
@@ -198,9 +202,20 @@ class CityListView(generics.ListAPIView):
 
 
 class SalonListView(generics.ListAPIView):
-    queryset = Salon.objects.active().select_related("city")
     serializer_class = SalonSerializer
 
+    def get_queryset(self):
+        qs = Salon.objects.active().select_related("city")
+        min_rating = self.request.query_params.get("min_rating")
+        if min_rating:
+            try:
+                qs = qs.filter(rating_avg__gte=float(min_rating))
+            except ValueError:
+                pass
+        if self.request.query_params.get("ordering") == "rating":
+            qs = qs.order_by("-rating_avg", "-rating_count", "name")
+        return qs
+
 
 class SalonServiceListView(generics.ListAPIView):
     serializer_class = SalonServiceSerializer
@@ -241,7 +256,7 @@ class StylistServiceListView(generics.ListAPIView):
 class AvailableSlotsView(APIView):
     def get(self, request, stylist_id: int):
         try:
-            stylist = Stylist.objects.get(pk=stylist_id)
+            stylist = Stylist.objects.select_related("salon").get(pk=stylist_id)
         except Stylist.DoesNotExist:
             return Response({"detail": "Мастер не найден."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -269,6 +284,154 @@ class AvailableSlotsView(APIView):
         return Response({"stylist": stylist_id, "date": target_date.isoformat(), "slots": slots})
 
 
+class AvailableSlotsRangeView(APIView):
+    """Slots for every day of ``from..to`` (inclusive, up to ``MAX_SLOT_RANGE_DAYS``).
+
+    With ``stream=1`` the days are sent as newline-delimited JSON as soon as
+    each one is computed.
+    """
+
+    def get(self, request, stylist_id: int):
+        try:
+            stylist = Stylist.objects.select_related("salon").get(pk=stylist_id)
+        except Stylist.DoesNotExist:
+            return Response({"detail": "Мастер не найден."}, status=status.HTTP_404_NOT_FOUND)
+
+        from_str = request.query_params.get("from")
+        to_str = request.query_params.get("to")
+        services_param = request.query_params.get("services")
+
+        if not from_str or not to_str or not services_param:
+            return Response({"detail": "Укажите период и список услуг."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            start_date = datetime.strptime(from_str, "%Y-%m-%d").date()
+            end_date = datetime.strptime(to_str, "%Y-%m-%d").date()
+        except ValueError:
+            return Response({"detail": "Неверный формат даты. Используйте YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if end_date < start_date:
+            return Response({"detail": "Дата окончания раньше даты начала."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if (end_date - start_date).days + 1 > MAX_SLOT_RANGE_DAYS:
+            return Response(
+                {"detail": f"Период не может превышать {MAX_SLOT_RANGE_DAYS} дней."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            salon_service_ids = [int(part) for part in services_param.split(",") if part]
+        except ValueError:
+            return Response({"detail": "Список услуг должен содержать ID через запятую."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            days = _available_slots_by_day(stylist, start_date, end_date, salon_service_ids)
+            first_day = next(days)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.query_params.get("stream") in {"1", "true", "True"}:
+            lines = (json.dumps(day, ensure_ascii=False) + "\n" for day in chain([first_day], days))
+            return StreamingHttpResponse(lines, content_type="application/x-ndjson")
+
+        return Response({
+            "stylist": stylist_id,
+            "from": start_date.isoformat(),
+            "to": end_date.isoformat(),
+            "days": [first_day, *days],
+        })
+
+
+class FirstAvailableSlotView(APIView):
+    """Earliest free slot of the stylist within ``MAX_SLOT_RANGE_DAYS`` from ``from``."""
+
+    def get(self, request, stylist_id: int):
+        try:
+            stylist = Stylist.objects.select_related("salon").get(pk=stylist_id)
+        except Stylist.DoesNotExist:
+            return Response({"detail": "Мастер не найден."}, status=status.HTTP_404_NOT_FOUND)
+
+        services_param = request.query_params.get("services")
+        if not services_param:
+            return Response({"detail": "Укажите список услуг."}, status=status.HTTP_400_BAD_REQUEST)
+
+        today = timezone.localdate()
+        from_str = request.query_params.get("from")
+        try:
+            start_date = datetime.strptime(from_str, "%Y-%m-%d").date() if from_str else today
+        except ValueError:
+            return Response({"detail": "Неверный формат даты. Используйте YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        start_date = max(start_date, today)
+
+        try:
+            salon_service_ids = [int(part) for part in services_param.split(",") if part]
+        except ValueError:
+            return Response({"detail": "Список услуг должен содержать ID через запятую."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            stylist_services, total_duration, total_price = _collect_stylist_services(stylist, salon_service_ids)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        end_date = start_date + timedelta(days=MAX_SLOT_RANGE_DAYS - 1)
+        policy = _slot_policy(stylist, stylist_services)
+        next_index = NextSlotIndex.load([stylist], start_date, end_date, policy)
+        first_slot = next_index.earliest(stylist, total_duration, not_before=policy.earliest_start())
+
+        slot = None
+        if first_slot:
+            service_ids = [ss.salon_service_id for ss in stylist_services]
+            slot = _serialize_slots([first_slot], total_duration, total_price, service_ids)[0]
+
+        return Response({"stylist": stylist_id, "slot": slot})
+
+
+class SalonAvailabilityView(APIView):
+    """Slots of every stylist of the salon who provides all requested services."""
+
+    def get(self, request, pk: int):
+        try:
+            salon = Salon.objects.active().get(pk=pk)
+        except Salon.DoesNotExist:
+            return Response({"detail": "Салон не найден."}, status=status.HTTP_404_NOT_FOUND)
+
+        date_str = request.query_params.get("date")
+        services_param = request.query_params.get("services")
+
+        if not date_str or not services_param:
+            return Response({"detail": "Укажите дату и список услуг."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        except ValueError:
+            return Response({"detail": "Неверный формат даты. Используйте YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            salon_service_ids = [int(part) for part in services_param.split(",") if part]
+        except ValueError:
+            return Response({"detail": "Список услуг должен содержать ID через запятую."}, status=status.HTTP_400_BAD_REQUEST)
+
+        offers = _collect_salon_offers(salon, salon_service_ids)
+        days = load_stylist_days([stylist for stylist, *_ in offers], target_date)
+        # Набор услуг салона у всех мастеров одинаковый — и правила слотов тоже.
+        policy = SlotPolicy.for_salon(salon, [ss.salon_service for ss in offers[0][1]] if offers else [])
+        not_before = policy.earliest_start()
+
+        stylists = []
+        for stylist, stylist_services, total_duration, total_price in offers:
+            starts = days[stylist.pk].free_starts(total_duration, policy, not_before=not_before)
+            if not starts:
+                continue
+            service_ids = [ss.salon_service_id for ss in stylist_services]
+            stylists.append({
+                "stylist": stylist.pk,
+                "full_name": stylist.user.get_full_name() or stylist.user.username,
+                "slots": _serialize_slots(starts, total_duration, total_price, service_ids),
+            })
+
+        return Response({"salon": salon.pk, "date": target_date.isoformat(), "stylists": stylists})
+
+
 class AppointmentListCreateView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -279,6 +442,7 @@ class AppointmentListCreateView(APIView):
         appointments = (
             Appointment.objects
             .filter(customer=request.user)
+            .with_total_price()
             .select_related("stylist", "stylist__user", "stylist__level")
             .prefetch_related("services", "services__stylist_service", "services__stylist_service__salon_service")
             .order_by("-start_time")
@@ -302,7 +466,10 @@ class AppointmentListCreateView(APIView):
         end_time = start_time + total_duration
 
         try:
-            _validate_slot_constraints(stylist, start_time, total_duration)
+            _validate_slot_constraints(
+                stylist, start_time, total_duration,
+                SlotPolicy.for_salon(stylist.salon, [ss.salon_service for ss in stylist_services]),
+            )
         except ValueError as exc:
             return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -331,23 +498,28 @@ class AppointmentListCreateView(APIView):
             guest_name = ""
             guest_phone_raw = ""
 
-        with transaction.atomic():
-            appointment = Appointment.objects.create(
-                customer=customer,
-                guest_name=guest_name,
-                guest_phone=guest_phone_raw,
-                stylist=stylist,
-                start_time=start_time,
-                end_time=end_time,
-                notes=notes,
-                payment_method=payment_method,
-            )
-
-            for ss in stylist_services:
-                AppointmentService.objects.create(
-                    appointment=appointment,
-                    stylist_service=ss,
+        try:
+            with transaction.atomic():
+                appointment = Appointment(
+                    customer=customer,
+                    guest_name=guest_name,
+                    guest_phone=guest_phone_raw,
+                    stylist=stylist,
+                    start_time=start_time,
+                    end_time=end_time,
+                    notes=notes,
+                    payment_method=payment_method,
                 )
+                appointment.mark_slot_checked()
+                appointment.save()
+
+                for ss in stylist_services:
+                    AppointmentService.objects.create(
+                        appointment=appointment,
+                        stylist_service=ss,
+                    )
+        except IntegrityError:
+            return Response({"detail": _SLOT_CONFLICT_MESSAGES[SlotConflict.BUSY]}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(
             {
@@ -374,6 +546,68 @@ class AdminProfileView(APIView):
         })
 
 
+def _admin_appointments(salon):
+    return (
+        Appointment.objects
+        .filter(stylist__salon=salon)
+        .with_total_price()
+        .select_related("customer", "customer__profile", "stylist", "stylist__user")
+        .prefetch_related(
+            "services",
+            "services__stylist_service",
+            "services__stylist_service__salon_service",
+            "services__stylist_service__salon_service__service",
+        )
+    )
+
+
+def _encode_appointment_cursor(appointment: Appointment) -> str:
+    position = [appointment.start_time.isoformat(), appointment.pk]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def _decode_appointment_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        start_str, pk = json.loads(raw)
+        start_time = parse_datetime(start_str)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        start_time = None
+    if start_time is None:
+        raise ValueError("Неверный курсор.")
+    return start_time, pk
+
+
+def _filter_admin_appointments(appointments, params):
+    """Фильтры ?from=&to=&stylist=&status= списка записей админа."""
+    try:
+        start_date = datetime.strptime(params["from"], "%Y-%m-%d").date() if params.get("from") else None
+        end_date = datetime.strptime(params["to"], "%Y-%m-%d").date() if params.get("to") else None
+    except ValueError:
+        raise ValueError("Неверный формат даты. Используйте YYYY-MM-DD.")
+    if start_date and end_date and end_date < start_date:
+        raise ValueError("Дата окончания раньше даты начала.")
+    if start_date:
+        appointments = appointments.filter(start_time__gte=local_day_bounds(start_date, start_date)[0])
+    if end_date:
+        appointments = appointments.filter(start_time__lt=local_day_bounds(end_date, end_date)[1])
+
+    if params.get("stylist"):
+        try:
+            appointments = appointments.filter(stylist_id=int(params["stylist"]))
+        except ValueError:
+            raise ValueError("ID мастера должен быть числом.")
+
+    statuses = [part for value in params.getlist("status") for part in value.split(",") if part]
+    if statuses:
+        unknown = set(statuses) - set(Appointment.Status.values)
+        if unknown:
+            raise ValueError(f"Неизвестный статус: {', '.join(sorted(unknown))}")
+        appointments = appointments.filter(status__in=statuses)
+    return appointments
+
+
 class AdminAppointmentsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -395,15 +629,8 @@ class AdminAppointmentsView(APIView):
             target_date = timezone.localdate()
 
         appointments = (
-            Appointment.objects
-            .filter(stylist__salon=profile.salon, start_time__date=target_date)
-            .select_related("customer", "customer__profile", "stylist", "stylist__user")
-            .prefetch_related(
-                "services",
-                "services__stylist_service",
-                "services__stylist_service__salon_service",
-                "services__stylist_service__salon_service__service",
-            )
+            _admin_appointments(profile.salon)
+            .filter(start_time__date=target_date)
             .order_by("start_time")
         )
 
@@ -411,6 +638,48 @@ class AdminAppointmentsView(APIView):
         return Response({"date": target_date.isoformat(), "appointments": data})
 
 
+class AdminAppointmentListView(APIView):
+    """Записи салона страницами по ключу ``(start_time, id)`` — без OFFSET.
+
+    Фильтры: ``from``/``to`` (YYYY-MM-DD, локальные дни включительно),
+    ``stylist`` и ``status`` (через запятую или несколько раз). ``next`` из
+    ответа передаётся в ``cursor`` вместе с теми же фильтрами; на последней
+    странице он ``null``.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        profile = getattr(request.user, "profile", None)
+        if not (profile and profile.is_salon_admin and profile.salon):
+            return Response({"detail": "Недостаточно прав."}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            appointments = _filter_admin_appointments(_admin_appointments(profile.salon), request.query_params)
+            cursor = request.query_params.get("cursor")
+            if cursor:
+                start_time, pk = _decode_appointment_cursor(cursor)
+                appointments = appointments.filter(
+                    Q(start_time__gt=start_time) | Q(start_time=start_time, pk__gt=pk)
+                )
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get("limit") or ADMIN_APPOINTMENTS_PAGE_SIZE)
+        except ValueError:
+            return Response({"detail": "limit должен быть числом."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, ADMIN_APPOINTMENTS_MAX_PAGE_SIZE))
+
+        # Лишняя запись только сообщает, есть ли следующая страница.
+        page = list(appointments.order_by("start_time", "pk")[:limit + 1])
+        has_next = len(page) > limit
+        page = page[:limit]
+        return Response({
+            "results": AdminAppointmentSerializer(page, many=True).data,
+            "next": _encode_appointment_cursor(page[-1]) if has_next else None,
+        })
+
+
 class AdminAppointmentStatusView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -420,7 +689,7 @@ class AdminAppointmentStatusView(APIView):
             return Response({"detail": "Недостаточно прав."}, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            appointment = Appointment.objects.select_related("stylist", "stylist__salon").get(
+            appointment = Appointment.objects.with_total_price().select_related("stylist", "stylist__salon").get(
                 pk=pk, stylist__salon=profile.salon
             )
         except Appointment.DoesNotExist:
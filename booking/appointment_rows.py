@@ -0,0 +1,91 @@
+"""Rendered dashboard rows of appointments, cached per appointment.
+
+A row is rendered from ``partials/appointment_row.html`` once per version of
+the appointment (``updated_at`` and the annotated total) and per variant of
+the viewer: the salon admin sees everything, a stylist sees the phone and
+the cancel button only if their settings allow it. A dashboard refresh of a
+salon with thousands of rows then renders only the rows that changed.
+
+The CSRF token differs between users and must never be shared through the
+cache, so rows are stored with a placeholder substituted on every render.
+Changes that do not touch the appointment itself (a renamed service, a new
+phone of the client) show up when the row expires after ``CACHE_TIMEOUT``.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+__all__ = [
+    "CACHE_TIMEOUT",
+    "ROW_TEMPLATE",
+    "attach_rendered_rows",
+    "render_appointment_row",
+    "render_appointment_rows",
+]
+
+
+ROW_TEMPLATE = "partials/appointment_row.html"
+CACHE_TIMEOUT = 10 * 60
+_CSRF_PLACEHOLDER = "__appointment_row_csrf_token__"
+
+
+def _variant(row_context) -> str:
+    if row_context.get("is_salon_admin"):
+        viewer = "admin"
+    else:
+        stylist = row_context.get("stylist")
+        viewer = "stylist:{:d}{:d}".format(
+            bool(getattr(stylist, "show_client_phone", False)),
+            bool(getattr(stylist, "allow_cancel_appointment", False)),
+        )
+    return "{}:{:d}".format(viewer, bool(row_context.get("show_stylist")))
+
+
+def _row_key(variant: str, appointment) -> str:
+    updated_at = appointment.updated_at.timestamp() if appointment.updated_at else ""
+    return f"appointment_row:v1:{variant}:{appointment.pk}:{updated_at}:{appointment.get_total_price()}"
+
+
+def render_appointment_rows(appointments: Iterable, row_context) -> Dict[int, str]:
+    """{id записи: разметка строки}; готовые строки берутся из кэша одним запросом.
+
+    ``row_context`` — контекст строки без самой записи: ``csrf_token``,
+    ``show_stylist`` и ``is_salon_admin`` или ``stylist``.
+    """
+    appointments = list(appointments)
+    variant = _variant(row_context)
+    keys = {appointment.pk: _row_key(variant, appointment) for appointment in appointments}
+    found = cache.get_many(keys.values())
+
+    missing = {}
+    render_context = {**row_context, "csrf_token": _CSRF_PLACEHOLDER}
+    for appointment in appointments:
+        key = keys[appointment.pk]
+        if key not in found:
+            found[key] = missing[key] = render_to_string(
+                ROW_TEMPLATE, {**render_context, "a": appointment}
+            )
+    if missing:
+        cache.set_many(missing, CACHE_TIMEOUT)
+
+    csrf_token = str(row_context.get("csrf_token", ""))
+    return {
+        pk: mark_safe(found[key].replace(_CSRF_PLACEHOLDER, csrf_token))
+        for pk, key in keys.items()
+    }
+
+
+def render_appointment_row(appointment, row_context) -> str:
+    return render_appointment_rows([appointment], row_context)[appointment.pk]
+
+
+def attach_rendered_rows(appointments: Iterable, row_context) -> None:
+    """Положить готовую строку в ``rendered_row`` каждой записи для таблицы дашборда."""
+    appointments = list(appointments)
+    rows = render_appointment_rows(appointments, row_context)
+    for appointment in appointments:
+        appointment.rendered_row = rows[appointment.pk]
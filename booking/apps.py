@@ -5,4 +5,5 @@ class BookingConfig(AppConfig):
     name = 'booking'
 
     def ready(self):
-        pass
\ No newline at end of file
+        import booking.checks
+        import booking.signals
\ No newline at end of file
@@ -0,0 +1,772 @@
+"""Availability engine shared by every slot-producing view.
+
+A stylist-day is loaded once (working hours, breaks, day-offs and active
+appointments) and kept as a bitmap of ``CELL_MINUTES`` cells: working hours
+set bits, breaks, day-offs and appointments clear them. Finding the starts
+that fit a given duration is then a sliding-window AND over a Python ``int``
+without any datetime arithmetic per candidate.
+
+Built days are kept in the Django cache per stylist and date (see
+:class:`CachedSchedule`); ``booking.signals`` drops them whenever a schedule
+row or an appointment of that stylist changes. Several worker processes must
+share one cache backend for the invalidation to reach all of them; the
+system check ``booking.W001`` warns when the default cache is process-local.
+"""
+from __future__ import annotations
+
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from time import time_ns
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from booking.maintenance import ensure_appointment_overlap_guard
+from booking.models import Appointment, BreakPeriod, StylistDayOff, WorkingHour
+
+__all__ = [
+    "CACHE_TIMEOUT",
+    "CELL_MINUTES",
+    "SLOT_STEP",
+    "CachedSchedule",
+    "NextSlotIndex",
+    "ScheduleSnapshot",
+    "SlotConflict",
+    "SlotPolicy",
+    "StylistDay",
+    "find_slot_conflict",
+    "invalidate_stylist",
+    "invalidate_stylist_dates",
+    "iter_stylist_days",
+    "load_stylist_day",
+    "load_stylist_days",
+]
+
+
+SLOT_STEP = timedelta(minutes=15)
+CELL_MINUTES = 5
+# Страховка на случай пропущенной инвалидации (например, .update() мимо сигналов).
+CACHE_TIMEOUT = 10 * 60
+
+_CELL_SECONDS = CELL_MINUTES * 60
+_DAY_CELLS = 24 * 60 // CELL_MINUTES
+
+
+def _aware(target_date: date, value: time) -> datetime:
+    return timezone.make_aware(datetime.combine(target_date, value))
+
+
+def _wall_seconds(moment: datetime, origin: date) -> float:
+    """Local wall-clock seconds of ``moment`` counted from midnight of ``origin``.
+
+    Cells are positions on the wall clock, not elapsed time, so a day with a
+    DST switch still maps 10:00 to the same cell as any other day.
+    """
+    local = timezone.localtime(moment)
+    return (local.date() - origin).days * 86400 + _seconds(local.time()) + local.microsecond / 1e6
+
+
+def _local_datetime(target_date: date, cell: int) -> Optional[datetime]:
+    """Aware datetime of a wall-clock cell, or ``None`` if it falls into a DST gap."""
+    naive = datetime.combine(target_date, time.min) + timedelta(minutes=cell * CELL_MINUTES)
+    zone = timezone.get_current_timezone()
+    if hasattr(zone, "localize"):
+        aware = zone.normalize(zone.localize(naive))
+    else:
+        aware = naive.replace(tzinfo=zone)
+    # Через UTC: astimezone() в ту же зону вернул бы значение без изменений.
+    if aware.astimezone(dt_timezone.utc).astimezone(zone).replace(tzinfo=None) != naive:
+        return None
+    return aware
+
+
+def _missing_cells(target_date: date) -> int:
+    """Cells of ``target_date`` whose wall-clock time does not exist (DST gap)."""
+    return _zone_missing_cells(target_date, timezone.get_current_timezone())
+
+
+@lru_cache(maxsize=1024)
+def _zone_missing_cells(target_date: date, zone) -> int:
+    first = _aware(target_date, time.min)
+    last = _aware(target_date, time.max)
+    if first.utcoffset() == last.utcoffset():
+        return 0
+    missing = 0
+    for cell in range(_DAY_CELLS):
+        if _local_datetime(target_date, cell) is None:
+            missing |= 1 << cell
+    return missing
+
+
+def _seconds(value: time) -> int:
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _cell_floor(seconds: float) -> int:
+    return int(seconds // _CELL_SECONDS)
+
+
+def _cell_ceil(seconds: float) -> int:
+    return -int(-seconds // _CELL_SECONDS)
+
+
+def _span(start: int, end: int) -> int:
+    """Bitmask with the cells ``[start, end)`` set."""
+    start = max(start, 0)
+    end = min(end, _DAY_CELLS)
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+def _runs(mask: int, length: int) -> int:
+    """Return a mask whose bit ``i`` is set when cells ``i..i+length-1`` are set.
+
+    The window is widened by doubling, so a run of ``length`` cells costs
+    ``O(log length)`` shifts instead of ``length``.
+    """
+    result = mask
+    covered = 1
+    while covered < length:
+        shift = min(covered, length - covered)
+        result &= result >> shift
+        covered += shift
+    return result
+
+
+def _dilate(mask: int, cells: int) -> int:
+    """Grow every run of ``mask`` by ``cells`` on both sides (within the day)."""
+    result = mask
+    radius = 0
+    while radius < cells:
+        shift = min(2 * radius + 1, cells - radius)
+        result |= (result << shift) | (result >> shift)
+        radius += shift
+    return result & _span(0, _DAY_CELLS)
+
+
+def _grid(start: int, end: int, step: int) -> int:
+    """Bitmask with every ``step``-th cell set from ``start`` up to ``end``."""
+    if end <= start:
+        return 0
+    count = (end - start + step - 1) // step
+    pattern = ((1 << (count * step)) - 1) // ((1 << step) - 1)
+    return pattern << start
+
+
+@dataclass(frozen=True)
+class SlotPolicy:
+    """Booking rules of a salon applied on top of the stylist's schedule.
+
+    ``buffer_before``/``buffer_after`` must stay free around every
+    appointment, so two bookings are at least their sum apart;
+    ``lead_time`` is how long in advance a client may book at the latest.
+    """
+
+    step: timedelta = SLOT_STEP
+    buffer_before: timedelta = timedelta()
+    buffer_after: timedelta = timedelta()
+    lead_time: timedelta = timedelta()
+
+    @classmethod
+    def for_salon(cls, salon, salon_services: Iterable = ()) -> "SlotPolicy":
+        """Settings of ``salon``; a value set on any of ``salon_services`` wins
+        (the largest one when several services are booked together)."""
+        if salon is None:
+            return cls()
+        salon_services = list(salon_services)
+
+        def pick(name, default):
+            overrides = [
+                getattr(salon_service, name) for salon_service in salon_services
+                if getattr(salon_service, name) is not None
+            ]
+            if overrides:
+                return max(overrides)
+            value = getattr(salon, name)
+            return default if value is None else value
+
+        return cls(
+            step=pick("slot_step", SLOT_STEP),
+            buffer_before=pick("buffer_before", timedelta()),
+            buffer_after=pick("buffer_after", timedelta()),
+            lead_time=salon.min_lead_time or timedelta(),
+        )
+
+    @property
+    def padding(self) -> timedelta:
+        return self.buffer_before + self.buffer_after
+
+    def earliest_start(self, now: Optional[datetime] = None) -> datetime:
+        return (now or timezone.now()) + self.lead_time
+
+
+_DEFAULT_POLICY = SlotPolicy()
+
+
+@dataclass
+class StylistDay:
+    """Bitmap snapshot of a single stylist's schedule for one date.
+
+    Bit ``i`` of each mask describes the cell starting ``i * CELL_MINUTES``
+    minutes after local midnight: ``open`` holds working time minus breaks
+    and day-offs, ``booked`` the appointments. They are kept apart so that
+    salon buffers can be applied to appointments at query time. ``windows``
+    keeps the working intervals as ``[start, end)`` cell ranges because a
+    slot may not straddle two of them.
+    """
+
+    stylist_id: int
+    date: date
+    windows: List[Tuple[int, int]] = field(default_factory=list)
+    open: int = 0
+    booked: int = 0
+
+    @property
+    def free(self) -> int:
+        return self.open & ~self.booked
+
+    def free_mask(self, padding: timedelta = timedelta()) -> int:
+        """Free cells once every appointment is widened by ``padding`` on both sides."""
+        return self.open & ~_dilate(self.booked, _cell_ceil(padding.total_seconds()))
+
+    def free_starts(
+        self,
+        duration: timedelta,
+        policy: Optional[SlotPolicy] = None,
+        not_before: Optional[datetime] = None,
+    ) -> List[datetime]:
+        """Return every start inside a working window that fits ``duration``.
+
+        Candidates are generated from the beginning of each working window
+        with the policy's ``step``; a candidate is kept when all cells of
+        ``[start, start + duration)`` are free. The search runs on cell
+        numbers only; just the returned starts become aware datetimes.
+        """
+        policy = policy or _DEFAULT_POLICY
+        if duration <= timedelta() or not self.open:
+            return []
+
+        free = self.free_mask(policy.padding)
+        length = _cell_ceil(duration.total_seconds())
+        step_cells = max(1, _cell_ceil(policy.step.total_seconds()))
+        earliest = 0
+        if not_before is not None:
+            earliest = _cell_ceil(_wall_seconds(not_before, self.date))
+
+        hits = 0
+        for window_start, window_end in self.windows:
+            last_start = min(window_end - length + 1, _DAY_CELLS)
+            candidates = _grid(window_start, last_start, step_cells)
+            if earliest > window_start:
+                candidates &= ~((1 << earliest) - 1)
+            if candidates:
+                hits |= candidates & _runs(free & _span(window_start, window_end), length)
+
+        starts: List[datetime] = []
+        while hits:
+            lowest = hits & -hits
+            start = _local_datetime(self.date, lowest.bit_length() - 1)
+            if start is not None:
+                starts.append(start)
+            hits ^= lowest
+        return starts
+
+
+def _build_day(
+    stylist_id: int,
+    target_date: date,
+    working_hours,
+    breaks,
+    day_offs,
+    appointments,
+) -> StylistDay:
+    """Assemble a :class:`StylistDay` from rows that were already loaded.
+
+    Working hours are rounded inwards and busy periods outwards to whole
+    cells, so a coarse cell can only hide a slot, never double-book one.
+    """
+    day = StylistDay(stylist_id=stylist_id, date=target_date)
+
+    for start, end in working_hours:
+        window = (_cell_ceil(_seconds(start)), _cell_floor(_seconds(end)))
+        if window[1] > window[0]:
+            day.windows.append(window)
+            day.open |= _span(*window)
+    if not day.open:
+        return day
+
+    busy = 0
+    for start, end in breaks:
+        busy |= _span(_cell_floor(_seconds(start)), _cell_ceil(_seconds(end)))
+
+    for from_time, to_time in day_offs:
+        if from_time is None and to_time is None:
+            # Целый выходной день — свободных слотов нет.
+            day.open = 0
+            return day
+        if from_time is not None and to_time is not None:
+            busy |= _span(_cell_floor(_seconds(from_time)), _cell_ceil(_seconds(to_time)))
+
+    for start, end in appointments:
+        day.booked |= _span(
+            _cell_floor(_wall_seconds(start, target_date)),
+            _cell_ceil(_wall_seconds(end, target_date)),
+        )
+
+    day.open &= ~(busy | _missing_cells(target_date))
+    return day
+
+
+class ScheduleSnapshot:
+    """Schedule rows of several stylists over a date range, grouped by stylist.
+
+    Working hours, breaks, day-offs and appointments are fetched with one
+    query per table no matter how many stylists or days are requested;
+    :meth:`day` then assembles a :class:`StylistDay` from memory.
+    """
+
+    def __init__(self, start_date: date, end_date: date):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.hours = defaultdict(lambda: defaultdict(list))
+        self.breaks = defaultdict(lambda: defaultdict(list))
+        self.day_offs = defaultdict(lambda: defaultdict(list))
+        self.appointments = defaultdict(lambda: defaultdict(list))
+
+    @property
+    def dates(self) -> List[date]:
+        span = (self.end_date - self.start_date).days + 1
+        return [self.start_date + timedelta(days=offset) for offset in range(span)]
+
+    @classmethod
+    def load(cls, stylists: Iterable, start_date: date, end_date: date) -> "ScheduleSnapshot":
+        snapshot = cls(start_date, end_date)
+        stylist_ids = {getattr(stylist, "pk", stylist) for stylist in stylists}
+        if not stylist_ids:
+            return snapshot
+
+        weekdays = {target_date.weekday() for target_date in snapshot.dates}
+        working_hours = (
+            WorkingHour.objects
+            .filter(stylist_id__in=stylist_ids, weekday__in=weekdays)
+            .order_by("start_time")
+            .values_list("stylist_id", "weekday", "start_time", "end_time")
+        )
+        for stylist_id, weekday, start, end in working_hours:
+            snapshot.hours[stylist_id][weekday].append((start, end))
+
+        stylist_ids = set(snapshot.hours)
+        if not stylist_ids:
+            return snapshot
+
+        breaks = BreakPeriod.objects.filter(
+            working_hour__stylist_id__in=stylist_ids,
+            working_hour__weekday__in=weekdays,
+        ).values_list("working_hour__stylist_id", "working_hour__weekday", "start_time", "end_time")
+        for stylist_id, weekday, start, end in breaks:
+            snapshot.breaks[stylist_id][weekday].append((start, end))
+
+        day_offs = StylistDayOff.objects.filter(
+            stylist_id__in=stylist_ids, date__range=(start_date, end_date)
+        ).values_list("stylist_id", "date", "from_time", "to_time")
+        for stylist_id, day_off_date, from_time, to_time in day_offs:
+            snapshot.day_offs[stylist_id][day_off_date].append((from_time, to_time))
+
+        range_start = _aware(start_date, time.min)
+        range_end = _aware(end_date + timedelta(days=1), time.min)
+        appointments = (
+            Appointment.objects
+            .filter(
+                stylist_id__in=stylist_ids,
+                start_time__lt=range_end,
+                end_time__gt=range_start,
+            )
+            .exclude(status=Appointment.Status.CANCELLED)
+            .values_list("stylist_id", "start_time", "end_time")
+        )
+        for stylist_id, start, end in appointments:
+            # Запись может переходить через полночь — учитываем её во всех днях.
+            current = timezone.localtime(start).date()
+            last = timezone.localtime(end - timedelta(microseconds=1)).date()
+            while current <= last:
+                snapshot.appointments[stylist_id][current].append((start, end))
+                current += timedelta(days=1)
+
+        return snapshot
+
+    def day(self, stylist, target_date: date) -> StylistDay:
+        stylist_id = getattr(stylist, "pk", stylist)
+        weekday = target_date.weekday()
+        return _build_day(
+            stylist_id,
+            target_date,
+            self.hours[stylist_id][weekday],
+            self.breaks[stylist_id][weekday],
+            self.day_offs[stylist_id][target_date],
+            self.appointments[stylist_id][target_date],
+        )
+
+
+def _version_key(stylist_id: int) -> str:
+    return f"availability:version:{stylist_id}"
+
+
+def _stamp_key(stylist_id: int, target_date: date) -> str:
+    return f"availability:stamp:{stylist_id}:{target_date.isoformat()}"
+
+
+def _day_key(stylist_id: int, version: str, target_date: date) -> str:
+    return f"availability:day:v4:{stylist_id}:{version}:{target_date.isoformat()}"
+
+
+def _day_versions(stylist_ids: Iterable[int], dates: Iterable[date]) -> Dict[Tuple[int, date], str]:
+    """Версия каждого дня: версия мастера и отметка последней инвалидации этого дня.
+
+    Обе читаются одним ``get_many`` вместе, до сборки дня из базы, поэтому
+    инвалидация, пришедшая во время сборки, меняет ключ, и устаревший день
+    записывается туда, где его уже никто не прочитает.
+    """
+    version_keys = {stylist_id: _version_key(stylist_id) for stylist_id in stylist_ids}
+    stamp_keys = {
+        (stylist_id, target_date): _stamp_key(stylist_id, target_date)
+        for stylist_id in version_keys
+        for target_date in dates
+    }
+    found = cache.get_many([*version_keys.values(), *stamp_keys.values()])
+    versions = {}
+    for stylist_id, key in version_keys.items():
+        version = found.get(key)
+        if version is None:
+            # Случайная стартовая версия: после вытеснения ключа старые дни
+            # с прежней версией не должны снова стать видимыми.
+            cache.add(key, time_ns(), None)
+            version = cache.get(key)
+        versions[stylist_id] = version
+    return {
+        (stylist_id, target_date): f"{versions[stylist_id]}.{found.get(key, 0)}"
+        for (stylist_id, target_date), key in stamp_keys.items()
+    }
+
+
+def invalidate_stylist(stylist_id: int) -> None:
+    """Drop every cached day of a stylist (weekly schedule changed)."""
+    key = _version_key(stylist_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time_ns(), None)
+
+
+def invalidate_stylist_dates(stylist_id: int, dates: Iterable[date]) -> None:
+    """Drop the cached days of a stylist on the given dates only."""
+    stamp = time_ns()
+    # Отметка живёт дольше любого дня, собранного до неё: когда она истечёт,
+    # дни со старой отметкой уже истекли сами.
+    cache.set_many(
+        {_stamp_key(stylist_id, target_date): stamp for target_date in set(dates)},
+        2 * CACHE_TIMEOUT,
+    )
+
+
+class CachedSchedule:
+    """Read-through cache of :class:`StylistDay` objects over a date range.
+
+    Exposes the same ``dates``/``day()`` interface as :class:`ScheduleSnapshot`.
+    Cached days are fetched with a single ``get_many``; the missing ones are
+    built from one :class:`ScheduleSnapshot` covering just the missing
+    stylists and dates, and written back under the versions read before the
+    snapshot, so a concurrent invalidation is never overwritten.
+    """
+
+    def __init__(self, start_date: date, end_date: date, days: Dict[Tuple[int, date], StylistDay]):
+        self.start_date = start_date
+        self.end_date = end_date
+        self._days = days
+
+    @property
+    def dates(self) -> List[date]:
+        span = (self.end_date - self.start_date).days + 1
+        return [self.start_date + timedelta(days=offset) for offset in range(span)]
+
+    @classmethod
+    def load(cls, stylists: Iterable, start_date: date, end_date: date) -> "CachedSchedule":
+        schedule = cls(start_date, end_date, {})
+        stylist_ids = {getattr(stylist, "pk", stylist) for stylist in stylists}
+        if not stylist_ids:
+            return schedule
+
+        versions = _day_versions(stylist_ids, schedule.dates)
+        keys = {ident: _day_key(ident[0], version, ident[1]) for ident, version in versions.items()}
+        found = cache.get_many(list(keys.values()))
+
+        missing = []
+        for ident, key in keys.items():
+            if key in found:
+                schedule._days[ident] = found[key]
+            else:
+                missing.append(ident)
+
+        if missing:
+            missing_dates = [target_date for _, target_date in missing]
+            snapshot = ScheduleSnapshot.load(
+                {stylist_id for stylist_id, _ in missing}, min(missing_dates), max(missing_dates)
+            )
+            fresh = {}
+            for ident in missing:
+                day = snapshot.day(*ident)
+                schedule._days[ident] = day
+                fresh[keys[ident]] = day
+            cache.set_many(fresh, CACHE_TIMEOUT)
+
+        return schedule
+
+    def day(self, stylist, target_date: date) -> StylistDay:
+        return self._days[(getattr(stylist, "pk", stylist), target_date)]
+
+
+def iter_stylist_days(stylist, start_date: date, end_date: date) -> Iterator[StylistDay]:
+    """Yield the schedule of ``stylist`` for every date in ``[start_date, end_date]``.
+
+    Cached days are reused; the rows of the missing ones are fetched up
+    front in one snapshot.
+    """
+    schedule = CachedSchedule.load([stylist], start_date, end_date)
+    for target_date in schedule.dates:
+        yield schedule.day(stylist, target_date)
+
+
+def load_stylist_day(stylist, target_date: date) -> StylistDay:
+    """Load the schedule of ``stylist`` on ``target_date``, from the cache if possible."""
+    return next(iter_stylist_days(stylist, target_date, target_date))
+
+
+def load_stylist_days(stylists: Iterable, target_date: date) -> Dict[int, StylistDay]:
+    """Load ``target_date`` for many stylists at once, keyed by stylist id."""
+    schedule = CachedSchedule.load(stylists, target_date, target_date)
+    return {
+        getattr(stylist, "pk", stylist): schedule.day(stylist, target_date)
+        for stylist in stylists
+    }
+
+
+class SlotConflict:
+    """Reasons returned by :func:`find_slot_conflict`."""
+
+    BUSY = "busy"
+    OFF_HOURS = "off_hours"
+    BREAK = "break"
+    DAY_OFF = "day_off"
+    TOO_SOON = "too_soon"
+
+
+def find_slot_conflict(
+    stylist,
+    start_time: datetime,
+    end_time: datetime,
+    exclude_pk: Optional[int] = None,
+    check_schedule: bool = True,
+    policy: Optional[SlotPolicy] = None,
+) -> Optional[str]:
+    """Return why ``[start_time, end_time)`` cannot be booked, or ``None``.
+
+    The stylist-day rows are read once and the interval is compared with
+    them exactly (the cached cell bitmap would reject starts that are not
+    multiples of ``CELL_MINUTES``): one query for the working intervals
+    joined with their breaks, one for day-offs and one for appointments.
+    With ``check_schedule=False`` only the overlap with other appointments
+    is checked, as the manual booking forms allow times outside the schedule.
+
+    A ``policy`` adds the salon's minimum lead time and keeps its buffers
+    free around neighbouring appointments.
+
+    When the database itself rejects overlapping appointments (see
+    :func:`booking.maintenance.ensure_appointment_overlap_guard`) and there
+    are no buffers, the overlap query is skipped: the caller inserts
+    optimistically and treats ``IntegrityError`` as :attr:`SlotConflict.BUSY`.
+    """
+    stylist_id = getattr(stylist, "pk", stylist)
+    padding = policy.padding if policy else timedelta()
+
+    if check_schedule and policy and policy.lead_time and start_time < policy.earliest_start():
+        return SlotConflict.TOO_SOON
+
+    if check_schedule:
+        target_date = timezone.localtime(start_time).date()
+        windows = defaultdict(list)
+        rows = (
+            WorkingHour.objects
+            .filter(stylist_id=stylist_id, weekday=target_date.weekday())
+            .values_list("start_time", "end_time", "breaks__start_time", "breaks__end_time")
+        )
+        for window_start, window_end, break_start, break_end in rows:
+            breaks = windows[(window_start, window_end)]
+            if break_start is not None:
+                breaks.append((break_start, break_end))
+
+        breaks = next(
+            (
+                window_breaks
+                for (window_start, window_end), window_breaks in windows.items()
+                if _aware(target_date, window_start) <= start_time
+                and end_time <= _aware(target_date, window_end)
+            ),
+            None,
+        )
+        if breaks is None:
+            return SlotConflict.OFF_HOURS
+        for break_start, break_end in breaks:
+            if _aware(target_date, break_start) < end_time and _aware(target_date, break_end) > start_time:
+                return SlotConflict.BREAK
+
+        day_offs = StylistDayOff.objects.filter(
+            stylist_id=stylist_id, date=target_date
+        ).values_list("from_time", "to_time")
+        for from_time, to_time in day_offs:
+            if from_time is None and to_time is None:
+                return SlotConflict.DAY_OFF
+            if (
+                from_time is not None and to_time is not None
+                and _aware(target_date, from_time) < end_time
+                and _aware(target_date, to_time) > start_time
+            ):
+                return SlotConflict.DAY_OFF
+
+    if not padding and ensure_appointment_overlap_guard():
+        return None
+
+    appointments = (
+        Appointment.objects
+        .filter(
+            stylist_id=stylist_id,
+            start_time__lt=end_time + padding,
+            end_time__gt=start_time - padding,
+        )
+        .exclude(status=Appointment.Status.CANCELLED)
+    )
+    if exclude_pk is not None:
+        appointments = appointments.exclude(pk=exclude_pk)
+    if appointments.exists():
+        return SlotConflict.BUSY
+    return None
+
+
+class _MaxTree:
+    """Segment tree over gap capacities answering "first index >= i with value >= x"."""
+
+    def __init__(self, values: List[int]):
+        size = 1
+        while size < max(len(values), 1):
+            size *= 2
+        self.size = size
+        self.tree = [-1] * (2 * size)
+        self.tree[size:size + len(values)] = values
+        for node in range(size - 1, 0, -1):
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+
+    def first_at_least(self, start: int, value: int) -> Optional[int]:
+        return self._search(1, 0, self.size, start, value)
+
+    def _search(self, node: int, low: int, high: int, start: int, value: int) -> Optional[int]:
+        if high <= start or self.tree[node] < value:
+            return None
+        if high - low == 1:
+            return low
+        middle = (low + high) // 2
+        found = self._search(2 * node, low, middle, start, value)
+        if found is None:
+            found = self._search(2 * node + 1, middle, high, start, value)
+        return found
+
+
+@dataclass
+class _Gaps:
+    """Free runs of one stylist, as absolute cells counted from the snapshot start."""
+
+    starts: List[int]
+    ends: List[int]
+    window_starts: List[int]
+    aligned: List[int]
+    tree: _MaxTree
+
+
+class NextSlotIndex:
+    """Answer "earliest start at or after T that fits a duration" per stylist.
+
+    The free runs of every stylist are collected lazily from the bitmaps of
+    a :class:`CachedSchedule` (or any object with the same interface) on
+    first use; after that each query is a
+    bisect plus a segment-tree descent, i.e. logarithmic in the number of
+    gaps however many days are fully booked.
+    """
+
+    def __init__(self, snapshot, policy: Optional[SlotPolicy] = None):
+        self.snapshot = snapshot
+        self.policy = policy or _DEFAULT_POLICY
+        self.step_cells = max(1, _cell_ceil(self.policy.step.total_seconds()))
+        self._gaps: Dict[int, _Gaps] = {}
+
+    @classmethod
+    def load(cls, stylists: Iterable, start_date: date, end_date: date, policy: Optional[SlotPolicy] = None):
+        return cls(CachedSchedule.load(stylists, start_date, end_date), policy=policy)
+
+    def _align(self, cell: int, window_start: int) -> int:
+        offset = cell - window_start
+        return window_start + -(-offset // self.step_cells) * self.step_cells
+
+    def _collect(self, stylist_id: int) -> _Gaps:
+        starts, ends, window_starts, aligned = [], [], [], []
+        for day_number, target_date in enumerate(self.snapshot.dates):
+            day = self.snapshot.day(stylist_id, target_date)
+            free = day.free_mask(self.policy.padding)
+            base = day_number * _DAY_CELLS
+            for window_start, window_end in day.windows:
+                mask = free & _span(window_start, window_end)
+                while mask:
+                    run_start = (mask & -mask).bit_length() - 1
+                    shifted = mask >> run_start
+                    run_length = (~shifted & (shifted + 1)).bit_length() - 1
+                    mask &= ~_span(run_start, run_start + run_length)
+                    starts.append(base + run_start)
+                    ends.append(base + run_start + run_length)
+                    window_starts.append(base + window_start)
+                    aligned.append(self._align(base + run_start, base + window_start))
+        capacities = [end - first for end, first in zip(ends, aligned)]
+        return _Gaps(starts, ends, window_starts, aligned, _MaxTree(capacities))
+
+    def _gaps_for(self, stylist_id: int) -> _Gaps:
+        if stylist_id not in self._gaps:
+            self._gaps[stylist_id] = self._collect(stylist_id)
+        return self._gaps[stylist_id]
+
+    def earliest(self, stylist, duration: timedelta, not_before: Optional[datetime] = None) -> Optional[datetime]:
+        """Return the first free start of ``duration`` at or after ``not_before``."""
+        if duration <= timedelta():
+            return None
+
+        gaps = self._gaps_for(getattr(stylist, "pk", stylist))
+        length = _cell_ceil(duration.total_seconds())
+        after = 0
+        if not_before is not None:
+            after = max(0, _cell_ceil(_wall_seconds(not_before, self.snapshot.start_date)))
+
+        index = bisect_right(gaps.ends, after)
+        if index < len(gaps.ends) and gaps.starts[index] < after:
+            # Момент ``after`` внутри свободного промежутка — проверяем его остаток.
+            first = self._align(after, gaps.window_starts[index])
+            if first + length <= gaps.ends[index]:
+                return self._to_datetime(first)
+            index += 1
+
+        found = gaps.tree.first_at_least(index, length)
+        if found is None:
+            return None
+        return self._to_datetime(gaps.aligned[found])
+
+    def _to_datetime(self, cell: int) -> Optional[datetime]:
+        day_number, day_cell = divmod(cell, _DAY_CELLS)
+        return _local_datetime(self.snapshot.dates[day_number], day_cell)
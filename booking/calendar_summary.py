@@ -0,0 +1,155 @@
+"""Per-month calendar summaries of the dashboards, kept in the Django cache.
+
+A month of a channel (a salon, a stylist or every appointment, see
+``booking.notifications``) is counted by one grouped query and stored as one
+counter per day and status plus a marker that the month is complete.
+``booking.signals`` moves an appointment between counters with atomic
+``incr``/``decr`` when its day or status changes, so a busy salon never has
+to recount a month that is already cached. A change that lands while a month
+is being counted (or right after) drops the month instead, so the counters
+never miss or double-count it.
+"""
+from __future__ import annotations
+
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date, datetime
+from time import time_ns
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from booking.models import Appointment
+
+__all__ = [
+    "CALENDAR_STATUSES",
+    "CACHE_TIMEOUT",
+    "PRIMING_SECONDS",
+    "apply_calendar_change",
+    "month_summary",
+    "summarize_by_day",
+]
+
+
+CALENDAR_STATUSES = (
+    Appointment.Status.PENDING,
+    Appointment.Status.CONFIRMED,
+    Appointment.Status.DONE,
+)
+CACHE_TIMEOUT = 30 * 60
+# Сколько после начала подсчёта месяца изменения сбрасывают месяц вместо
+# incr: неизвестно, попала ли запись в подсчёт (коммит и on_commit разнесены).
+PRIMING_SECONDS = 10
+
+DayStatus = Tuple[date, str]
+
+
+def summarize_by_day(appointments_qs) -> Dict[str, Dict[str, int]]:
+    """{дата: {статус: количество}} одним GROUP BY по локальному дню и статусу."""
+    rows = (
+        appointments_qs
+        .filter(status__in=CALENDAR_STATUSES)
+        .order_by()
+        .annotate(day=TruncDate("start_time"))
+        .values("day", "status")
+        .annotate(total=Count("id"))
+    )
+    summary = defaultdict(dict)
+    for row in rows:
+        summary[row["day"].isoformat()][row["status"]] = row["total"]
+    return dict(summary)
+
+
+def _month_key(channel: str, year: int, month: int) -> str:
+    return f"calendar:v1:{channel}:{year:04d}-{month:02d}"
+
+
+def _priming_key(channel: str, year: int, month: int) -> str:
+    return f"calendar:v1:{channel}:{year:04d}-{month:02d}:priming"
+
+
+def _counter_key(channel: str, day: date, status: str) -> str:
+    return f"calendar:v1:{channel}:{day.isoformat()}:{status}"
+
+
+def _month_bounds(year: int, month: int) -> Tuple[datetime, datetime]:
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return (
+        timezone.make_aware(datetime(year, month, 1)),
+        timezone.make_aware(datetime(next_year, next_month, 1)),
+    )
+
+
+def month_summary(channel: str, appointments_qs, year: int, month: int) -> Dict[str, Dict[str, int]]:
+    """Сводка месяца канала из кэша; при промахе — один запрос и прогрев счётчиков.
+
+    ``appointments_qs`` — все записи канала, по нему считается месяц при промахе.
+    """
+    days = [date(year, month, day) for day in range(1, monthrange(year, month)[1] + 1)]
+    counter_keys = {
+        (day, status): _counter_key(channel, day, status)
+        for day in days
+        for status in CALENDAR_STATUSES
+    }
+    month_key = _month_key(channel, year, month)
+    found = cache.get_many([month_key, *counter_keys.values()])
+
+    if month_key in found and all(key in found for key in counter_keys.values()):
+        summary = defaultdict(dict)
+        for (day, status), key in counter_keys.items():
+            if found[key] > 0:
+                summary[day.isoformat()][status] = found[key]
+        return dict(summary)
+
+    # Метка подсчёта ставится до запроса: изменение, пришедшее во время него,
+    # снимает её, и записанный месяц сразу сбрасывается.
+    priming_key = _priming_key(channel, year, month)
+    token = time_ns()
+    cache.set(priming_key, token, PRIMING_SECONDS)
+
+    start, end = _month_bounds(year, month)
+    summary = summarize_by_day(appointments_qs.filter(start_time__gte=start, start_time__lt=end))
+    values = {
+        key: summary.get(day.isoformat(), {}).get(status, 0)
+        for (day, status), key in counter_keys.items()
+    }
+    values[month_key] = True
+    cache.set_many(values, CACHE_TIMEOUT)
+    if cache.get(priming_key) != token:
+        cache.delete(month_key)
+    return summary
+
+
+def apply_calendar_change(
+    channels: Iterable[str],
+    before: Optional[DayStatus],
+    after: Optional[DayStatus],
+) -> None:
+    """Перенести запись из счётчика ``before`` в ``after`` (день и статус; None — нет).
+
+    Не прогретые месяцы не трогаются: их посчитает следующее чтение.
+    """
+    if before == after:
+        return
+    for channel in channels:
+        for state, delta in ((before, -1), (after, 1)):
+            if state is None or state[1] not in CALENDAR_STATUSES:
+                continue
+            day, status = state
+            month_key = _month_key(channel, day.year, day.month)
+            priming_key = _priming_key(channel, day.year, day.month)
+            found = cache.get_many([month_key, priming_key])
+            if priming_key in found:
+                # Месяц только что считался: запись могла в подсчёт и попасть, и нет.
+                cache.delete_many([month_key, priming_key])
+                continue
+            if month_key not in found:
+                continue
+            try:
+                cache.incr(_counter_key(channel, day, status), delta)
+            except ValueError:
+                # Счётчик вытеснен — месяц больше не цельный, пусть пересчитается.
+                cache.delete(month_key)
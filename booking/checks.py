@@ -0,0 +1,30 @@
+"""System checks of the booking app."""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+__all__ = ["check_shared_cache"]
+
+_PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Кэш в памяти процесса не доносит инвалидации до других воркеров."""
+    backend = settings.CACHES.get("default", {}).get("BACKEND")
+    if backend not in _PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            "Кэш по умолчанию живёт в памяти одного процесса.",
+            hint=(
+                "Дни мастеров (booking.availability), версии каналов дашбордов и счётчики "
+                "календаря инвалидируются через кэш: с несколькими воркерами остальные "
+                "будут показывать уже занятые слоты и устаревшие дашборды. Укажите общий "
+                "кэш (Redis) в CACHES."
+            ),
+            id="booking.W001",
+        )
+    ]
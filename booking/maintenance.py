@@ -3,13 +3,20 @@ from __future__ import annotations
 
 from contextlib import suppress
 
-from django.db import connection
-from django.db.utils import OperationalError, ProgrammingError
+from django.db import connection, transaction
+from django.db.utils import DatabaseError, OperationalError, ProgrammingError
 
-__all__ = ["ensure_active_slot_constraint"]
+__all__ = [
+    "OVERLAP_CONSTRAINT",
+    "ensure_active_slot_constraint",
+    "ensure_appointment_overlap_guard",
+]
 
 
+OVERLAP_CONSTRAINT = "appointment_no_overlap"
+
 _CONSTRAINT_SYNCED = False
+_OVERLAP_GUARDED = None
 
 
 def _has_appointment_table() -> bool:
@@ -62,4 +69,81 @@ def ensure_active_slot_constraint() -> None:
             with connection.cursor() as cursor:
                 cursor.execute(statement)
 
-    _CONSTRAINT_SYNCED = True
\ No newline at end of file
+    _CONSTRAINT_SYNCED = True
+
+
+def _overlap_guard_statements() -> list:
+    if connection.vendor == "postgresql":
+        return [
+            "CREATE EXTENSION IF NOT EXISTS btree_gist;",
+            "DO $$ BEGIN "
+            f"IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = '{OVERLAP_CONSTRAINT}') THEN "
+            f"ALTER TABLE booking_appointment ADD CONSTRAINT {OVERLAP_CONSTRAINT} "
+            "EXCLUDE USING gist (stylist_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&) "
+            "WHERE (status <> 'X'); "
+            "END IF; END $$;",
+        ]
+    if connection.vendor == "sqlite":
+        # В SQLite нет EXCLUDE; запись в базу сериализована, поэтому проверка
+        # в триггере атомарна так же, как ограничение.
+        overlap = (
+            "SELECT RAISE(ABORT, '{name}') WHERE EXISTS ("
+            "SELECT 1 FROM booking_appointment "
+            "WHERE stylist_id = NEW.stylist_id AND status <> 'X' "
+            "AND start_time < NEW.end_time AND end_time > NEW.start_time{extra});"
+        )
+        return [
+            f"CREATE TRIGGER IF NOT EXISTS {OVERLAP_CONSTRAINT}_insert "
+            "BEFORE INSERT ON booking_appointment WHEN NEW.status <> 'X' BEGIN "
+            + overlap.format(name=OVERLAP_CONSTRAINT, extra="")
+            + " END;",
+            f"CREATE TRIGGER IF NOT EXISTS {OVERLAP_CONSTRAINT}_update "
+            "BEFORE UPDATE OF stylist_id, start_time, end_time, status ON booking_appointment "
+            "WHEN NEW.status <> 'X' BEGIN "
+            + overlap.format(name=OVERLAP_CONSTRAINT, extra=" AND id <> NEW.id")
+            + " END;",
+        ]
+    return []
+
+
+def _overlap_guard_installed() -> bool:
+    if connection.vendor == "postgresql":
+        query = "SELECT 1 FROM pg_constraint WHERE conname = %s"
+        name = OVERLAP_CONSTRAINT
+    else:
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s"
+        name = f"{OVERLAP_CONSTRAINT}_insert"
+    with connection.cursor() as cursor:
+        cursor.execute(query, [name])
+        return cursor.fetchone() is not None
+
+
+def ensure_appointment_overlap_guard() -> bool:
+    """Make the database reject overlapping active appointments of a stylist.
+
+    PostgreSQL gets a ``tstzrange`` exclusion constraint (needs the
+    ``btree_gist`` extension), SQLite a pair of ``BEFORE`` triggers. Returns
+    ``True`` when the guard is in place; otherwise (other vendors, missing
+    privileges, already overlapping rows) the caller has to keep checking
+    overlaps itself. A violation surfaces as :class:`django.db.IntegrityError`.
+    """
+    global _OVERLAP_GUARDED
+
+    if _OVERLAP_GUARDED is not None:
+        return _OVERLAP_GUARDED
+
+    statements = _overlap_guard_statements()
+    if not statements:
+        _OVERLAP_GUARDED = False
+        return False
+
+    if not _has_appointment_table():
+        return False
+
+    for statement in statements:
+        with suppress(DatabaseError):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(statement)
+
+    _OVERLAP_GUARDED = _overlap_guard_installed()
+    return _OVERLAP_GUARDED
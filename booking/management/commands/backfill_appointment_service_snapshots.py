@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min, OuterRef, Q, Subquery
+
+from booking.models import AppointmentService, StylistService
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет цену и длительность услуг старых записей из текущего прайса мастера "
+        "(только пустые значения; уже сохранённые не трогает)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=5000,
+            help="Сколько строк обновлять одним UPDATE (по диапазону id).",
+        )
+
+    def handle(self, *args, batch_size=5000, **options):
+        pending = AppointmentService.objects.filter(
+            Q(price__isnull=True) | Q(duration__isnull=True),
+            stylist_service__isnull=False,
+        )
+        bounds = pending.aggregate(first=Min("id"), last=Max("id"))
+        if bounds["first"] is None:
+            self.stdout.write("Пустых цен и длительностей нет.")
+            return
+
+        stylist_service = StylistService.objects.filter(pk=OuterRef("stylist_service_id"))
+        price = Subquery(stylist_service.values("price")[:1])
+        duration = Subquery(stylist_service.values("salon_service__duration")[:1])
+
+        updated = 0
+        for start in range(bounds["first"], bounds["last"] + 1, batch_size):
+            batch = pending.filter(id__gte=start, id__lt=start + batch_size)
+            # Два UPDATE, чтобы не затереть уже сохранённое значение второго поля.
+            updated += batch.filter(price__isnull=True).update(price=price)
+            batch.filter(duration__isnull=True).update(duration=duration)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: цены проставлены в {updated} строках. "
+            "Пересоберите свёртку отчётов: manage.py rebuild_daily_stats."
+        ))
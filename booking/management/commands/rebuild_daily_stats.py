@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.reports import rebuild_daily_stats
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Неверная дата «{value}». Используйте YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Пересобирает свёртку DailySalonStats из выполненных записей за период (по умолчанию — за всё время)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", help="Первый день периода, YYYY-MM-DD.")
+        parser.add_argument("--to", dest="end", help="Последний день периода, YYYY-MM-DD.")
+        parser.add_argument("--salon", type=int, help="Только этот салон (ID).")
+
+    def handle(self, *args, start=None, end=None, salon=None, **options):
+        start = _parse_date(start) if start else None
+        end = _parse_date(end) if end else None
+        if start and end and end < start:
+            raise CommandError("Дата окончания раньше даты начала.")
+
+        rows = rebuild_daily_stats(start, end, salon_id=salon)
+        self.stdout.write(self.style.SUCCESS(f"Готово: {rows} строк свёртки."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from booking.models import Salon
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает рейтинг салонов (rating_avg, rating_count) по отзывам."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--salon", type=int, help="Только этот салон (ID).")
+
+    def handle(self, *args, salon=None, **options):
+        salons = Salon.objects.all()
+        if salon:
+            salons = salons.filter(pk=salon)
+        updated = salons.refresh_ratings()
+        self.stdout.write(self.style.SUCCESS(f"Готово: рейтинг пересчитан у {updated} салонов."))
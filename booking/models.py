@@ -4,8 +4,9 @@ from decimal import Decimal
 
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import Avg, Q
+from django.db import models, transaction
+from django.db.models import Avg, Count, DecimalField, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
@@ -40,6 +41,22 @@ class SalonQuerySet(models.QuerySet):
             Q(subscription_expires_at__isnull=True) | Q(subscription_expires_at__gte=today)
         )
 
+    def refresh_ratings(self):
+        """Пересчитать rating_avg и rating_count салонов выборки по их отзывам одним UPDATE."""
+        reviews = Review.objects.filter(salon=OuterRef('pk')).order_by().values('salon')
+        return self.update(
+            rating_avg=Coalesce(
+                Subquery(reviews.annotate(avg=Avg('rating')).values('avg')[:1]),
+                Value(Decimal('0')),
+                output_field=DecimalField(max_digits=3, decimal_places=2),
+            ),
+            rating_count=Coalesce(
+                Subquery(reviews.annotate(count=Count('id')).values('count')[:1]),
+                Value(0),
+                output_field=IntegerField(),
+            ),
+        )
+
 
 class SalonApplication(models.Model):
     GENDER_CHOICES = [
@@ -116,6 +133,28 @@ class Salon(models.Model):
         verbose_name="Дизайн отображения записей в дашборде",
         help_text="По умолчанию используется первый дизайн с календарём и списком. Второй дизайн — шахматное расписание.",
     )
+    slot_step = models.DurationField(
+        default=timedelta(minutes=15),
+        verbose_name="Шаг слотов",
+        help_text="Интервал между возможными началами записи, кратно 5 минутам.",
+    )
+    buffer_before = models.DurationField(
+        default=timedelta(),
+        verbose_name="Подготовка перед услугой",
+    )
+    buffer_after = models.DurationField(
+        default=timedelta(),
+        verbose_name="Уборка после услуги",
+    )
+    min_lead_time = models.DurationField(
+        default=timedelta(),
+        verbose_name="Минимальное время до записи",
+        help_text="Насколько заранее клиент должен записаться.",
+    )
+    # Денормализованный рейтинг: ведётся сигналами Review, пересчёт —
+    # manage.py recompute_salon_ratings.
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
 
     objects = SalonQuerySet.as_manager()
 
@@ -131,7 +170,19 @@ class Salon(models.Model):
         return f"{self.name} ({self.city.name})"
 
     def average_rating(self):
-        return self.reviews.aggregate(avg=Avg('rating'))['avg'] or 0
+        return float(self.rating_avg or 0)
+
+    @classmethod
+    def refresh_rating(cls, salon_id):
+        """Пересчитать рейтинг салона в текущей транзакции.
+
+        Строка салона блокируется до пересчёта, поэтому параллельные отзывы
+        одного салона пересчитываются по очереди и видят друг друга.
+        """
+        salons = cls.objects.filter(pk=salon_id)
+        with transaction.atomic():
+            if salons.select_for_update().values_list('pk', flat=True).first() is not None:
+                salons.refresh_ratings()
 
     def get_photos(self):
         photos = []
@@ -156,6 +207,7 @@ class Salon(models.Model):
 
     class Meta:
         ordering = ['-position', 'name']
+        indexes = [models.Index(fields=['rating_avg'], name='salon_rating_avg')]
 
 
 
@@ -380,6 +432,10 @@ class SalonService(models.Model):
     duration = models.DurationField(default=timedelta(minutes=30))
     is_active = models.BooleanField(default=True)
     position = models.PositiveIntegerField(default=0, verbose_name="Позиция")
+    # Пустое значение — берётся настройка салона.
+    slot_step = models.DurationField(null=True, blank=True, verbose_name="Шаг слотов")
+    buffer_before = models.DurationField(null=True, blank=True, verbose_name="Подготовка перед услугой")
+    buffer_after = models.DurationField(null=True, blank=True, verbose_name="Уборка после услуги")
 
     class Meta:
         unique_together = ('salon', 'service')
@@ -468,6 +524,41 @@ class WorkingHour(models.Model):
         return f'{self.get_weekday_display()} {self.start_time}–{self.end_time}'
 
 
+def booked_price(prefix=''):
+    """Цена услуги записи в SQL: снимок, а у строк без него — текущий прайс мастера.
+
+    ``prefix`` — путь до AppointmentService, например ``'services__'`` от записи.
+    """
+    return Coalesce(f'{prefix}price', f'{prefix}stylist_service__price')
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def with_total_price(self):
+        """Аннотирует ``total_price`` — сумму цен услуг записи, посчитанную в БД."""
+        prices = (
+            AppointmentService.objects
+            .filter(appointment=OuterRef('pk'))
+            .order_by()
+            .values('appointment')
+            .annotate(total=Sum(booked_price()))
+            .values('total')
+        )
+        return self.annotate(total_price=Coalesce(
+            Subquery(prices),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ))
+
+    def revenue(self):
+        """Сумма цен услуг по всем записям выборки одним агрегатом."""
+        total = (
+            AppointmentService.objects
+            .filter(appointment__in=self.order_by().values('pk'))
+            .aggregate(total=Sum(booked_price()))['total']
+        )
+        return total or Decimal('0')
+
+
 class Appointment(models.Model):
     """Запись клиента на услуги (несколько)."""
 
@@ -554,11 +645,20 @@ class Appointment(models.Model):
 
     notes = models.TextField('Комментарий клиента', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Курсор ленты изменений дашборда: меняется при любом сохранении записи.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = AppointmentQuerySet.as_manager()
 
     class Meta:
         ordering = ['-start_time']
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
+        # Частичный уникальный индекс ниже не годится для выборок по мастеру
+        # и времени (постраничный список, окна дашбордов) — нужен полный.
+        indexes = [
+            models.Index(fields=['stylist', 'start_time'], name='appointment_stylist_start'),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['stylist', 'start_time'],
@@ -573,31 +673,70 @@ class Appointment(models.Model):
         return f'{name} ➜ {self.stylist} ({start})'
 
     def get_total_price(self):
+        # Если выборка пришла через with_total_price(), сумма уже посчитана в БД.
+        if 'total_price' in self.__dict__:
+            return self.total_price
         return sum(s.get_price() for s in self.services.all())
 
     def get_total_duration(self):
         return sum((s.get_duration() for s in self.services.all()), timedelta())
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Сохранённый интервал уже проверялся при записи.
+        instance.mark_slot_checked()
+        return instance
+
+    def _slot_key(self):
+        # __dict__, а не атрибуты: отложенные поля не должны вызывать запрос.
+        values = self.__dict__
+        return (
+            values.get('stylist_id'),
+            values.get('start_time'),
+            values.get('end_time'),
+            values.get('status') == Appointment.Status.CANCELLED,
+        )
+
+    def mark_slot_checked(self):
+        """Отметить текущий интервал как проверенный, чтобы clean() не повторял запрос.
+
+        Вызывается после booking.availability.find_slot_conflict(); если
+        пересечения запрещает сама БД, при вставке возможен IntegrityError.
+        """
+        self._checked_slot = self._slot_key()
+
     def save(self, *args, **kwargs):
         if not self.end_time:
             self.end_time = self.start_time + self.get_total_duration()
-        self.full_clean()
+        # Существование связанных строк гарантирует внешний ключ в БД,
+        # отдельный SELECT на каждый из них при записи не нужен.
+        self.full_clean(exclude=['customer', 'stylist', 'payment_card'])
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            # auto_now при update_fields пишется, только если поле перечислено явно.
+            kwargs['update_fields'] = {*update_fields, 'updated_at'}
         super().save(*args, **kwargs)
 
     def clean(self):
         if self.end_time and self.end_time <= self.start_time:
             raise ValidationError('Конец визита должен быть позже начала.')
 
-        if not self.customer and not (self.guest_name and self.guest_phone):
+        if not self.customer_id and not (self.guest_name and self.guest_phone):
             raise ValidationError('Укажите клиента или имя и телефон гостя.')
 
-        if self.customer and (self.guest_name or self.guest_phone):
+        if self.customer_id and (self.guest_name or self.guest_phone):
             raise ValidationError('Нельзя указывать и клиента, и данные гостя одновременно.')
 
+        if self.status == Appointment.Status.CANCELLED:
+            return
+        if self._slot_key() == getattr(self, '_checked_slot', None):
+            return
+
         clash = (
             Appointment.objects
             .filter(
-                stylist=self.stylist,
+                stylist_id=self.stylist_id,
                 start_time__lt=self.end_time,
                 end_time__gt=self.start_time,
             )
@@ -669,13 +808,33 @@ class AppointmentService(models.Model):
     appointment = models.ForeignKey(Appointment, related_name='services', on_delete=models.CASCADE)
     stylist_service = models.ForeignKey('StylistService', on_delete=models.SET_NULL,
                                         null=True, blank=True)
+    # Цена и длительность на момент записи: отчёты не должны меняться задним
+    # числом, когда мастер правит прайс. Пусто — у старых строк до
+    # backfill_appointment_service_snapshots; до тех пор и в Python
+    # (get_price), и в SQL (booked_price) берётся текущий прайс.
+    price = models.DecimalField('Цена на момент записи', max_digits=10, decimal_places=2,
+                                null=True, blank=True)
+    duration = models.DurationField('Длительность на момент записи', null=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        if self.stylist_service_id and (self.price is None or self.duration is None):
+            stylist_service = self.stylist_service
+            if self.price is None:
+                self.price = stylist_service.price
+            if self.duration is None and stylist_service.salon_service_id:
+                self.duration = stylist_service.salon_service.duration
+        super().save(*args, **kwargs)
 
     def get_duration(self):
+        if self.duration is not None:
+            return self.duration
         if self.stylist_service and self.stylist_service.salon_service:
             return self.stylist_service.salon_service.duration
         return timedelta()
 
     def get_price(self):
+        if self.price is not None:
+            return self.price
         if self.stylist_service:
             return self.stylist_service.price
         return Decimal('0')
@@ -690,6 +849,63 @@ class AppointmentService(models.Model):
         return f"AppointmentService #{self.pk}"
 
 
+class DailySalonStats(models.Model):
+    """Итоги выполненных записей мастера за день — свёртка для отчётов.
+
+    Строки пересчитываются при переходе записи в статус «Выполнена» и из
+    него (см. booking.reports); команда ``rebuild_daily_stats`` пересобирает
+    любой период.
+    """
+
+    salon = models.ForeignKey(Salon, on_delete=models.CASCADE, related_name='daily_stats')
+    stylist = models.ForeignKey('Stylist', on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField('Дата')
+    clients = models.PositiveIntegerField('Клиенты', default=0)
+    services = models.PositiveIntegerField('Услуги', default=0)
+    revenue = models.DecimalField('Выручка', max_digits=12, decimal_places=2, default=Decimal('0'))
+    cash_revenue = models.DecimalField('Наличными', max_digits=12, decimal_places=2, default=Decimal('0'))
+    card_revenue = models.DecimalField('Переводом на карту', max_digits=12, decimal_places=2, default=Decimal('0'))
+    cash_clients = models.PositiveIntegerField('Клиенты с оплатой наличными', default=0)
+    card_clients = models.PositiveIntegerField('Клиенты с оплатой на карту', default=0)
+
+    class Meta:
+        verbose_name = 'Итоги дня'
+        verbose_name_plural = 'Итоги по дням'
+        unique_together = ('stylist', 'date')
+        indexes = [
+            models.Index(fields=['salon', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.stylist} — {self.date}: {self.revenue} сум"
+
+
+class AppointmentTombstone(models.Model):
+    """След удалённой записи, чтобы опрос дашборда (dashboard_delta) убрал её строку.
+
+    Пишется в post_delete, в том числе при каскадном удалении; старше
+    ``TTL`` следы удаляются при следующем удалении записи.
+    """
+
+    TTL = timedelta(days=1)
+
+    appointment_id = models.IntegerField('ID записи')
+    salon_id = models.IntegerField('ID салона', null=True, blank=True)
+    date = models.DateField('Дата записи')
+    deleted_at = models.DateTimeField('Удалена', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Удалённая запись'
+        verbose_name_plural = 'Удалённые записи'
+        indexes = [
+            models.Index(fields=['salon_id', 'deleted_at']),
+            models.Index(fields=['deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"Запись #{self.appointment_id} удалена {self.deleted_at}"
+
+
 class StylistService(models.Model):
     stylist = models.ForeignKey('Stylist', on_delete=models.CASCADE, related_name='stylist_services')
     salon_service = models.ForeignKey('SalonService', on_delete=models.CASCADE, null=True, blank=True)
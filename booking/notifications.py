@@ -0,0 +1,170 @@
+"""In-process change notifications for appointment long-polls and streams.
+
+Waiters subscribe to channels (a salon, a stylist or every appointment) and
+park on an ``asyncio`` event instead of re-querying the database; the save
+hooks in ``booking.signals`` publish after commit. A publication may carry a
+message (which appointment changed and how); event streams read them with
+:meth:`Subscription.next_messages`. Publishing is thread-safe and may come
+from sync views running in worker threads.
+
+Only waiters of the same process are woken. With several worker processes a
+change made in another one is picked up by the waiter's periodic re-check
+(see ``UPDATES_RECHECK_SECONDS``) of the channel versions below, so
+notifications speed things up but are never required for correctness.
+
+Every channel also has a version counter in the Django cache, bumped on each
+change. "Has anything changed since version N?" is then a single cache
+``get`` however many appointments the salon has. The re-check is only as
+good as that counter: the cache must be shared by all worker processes
+(Redis in ``salon_booking.settings``; ``booking.W001`` warns otherwise).
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from time import time_ns
+from typing import Dict, Iterable, List, Optional, Set
+
+from django.core.cache import cache
+
+__all__ = [
+    "ALL_APPOINTMENTS",
+    "UPDATES_RECHECK_SECONDS",
+    "Subscription",
+    "bump_versions",
+    "channel_version",
+    "publish",
+    "salon_channel",
+    "stylist_channel",
+    "subscribe",
+]
+
+
+ALL_APPOINTMENTS = "appointments"
+# Как часто ожидающий перепроверяет БД сам: страховка для изменений из других
+# процессов и мимо сигналов (.update()).
+UPDATES_RECHECK_SECONDS = 15
+# Сообщения, которые подписчик ещё не забрал; при переполнении он должен
+# перечитать изменения из БД.
+_MAX_PENDING = 500
+
+_lock = threading.Lock()
+_subscriptions: Dict[str, Set["Subscription"]] = {}
+
+
+def salon_channel(salon_id) -> str:
+    return f"salon:{salon_id}"
+
+
+def stylist_channel(stylist_id) -> str:
+    return f"stylist:{stylist_id}"
+
+
+def _version_key(channel: str) -> str:
+    return f"appointments:version:{channel}"
+
+
+def channel_version(channel: str) -> int:
+    """Текущая версия канала; растёт при каждом изменении его записей."""
+    key = _version_key(channel)
+    version = cache.get(key)
+    if version is None:
+        # Стартуем со времени, а не с нуля: после вытеснения ключа версия не
+        # должна совпасть с той, что уже видел клиент.
+        cache.add(key, time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(*channels: str) -> None:
+    for channel in channels:
+        key = _version_key(channel)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time_ns(), None)
+
+
+class Subscription:
+    """Подписка на каналы; ``wait()`` просыпается при публикации в любой из них.
+
+    Регистрируется до чтения состояния из БД, поэтому изменение, случившееся
+    между чтением и ожиданием, не теряется.
+    """
+
+    def __init__(self, channels: Iterable[str]):
+        self.channels = tuple(dict.fromkeys(channels))
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self._pending: List[dict] = []
+        self._overflowed = False
+
+    def __enter__(self) -> "Subscription":
+        with _lock:
+            for channel in self.channels:
+                _subscriptions.setdefault(channel, set()).add(self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        with _lock:
+            for channel in self.channels:
+                waiters = _subscriptions.get(channel)
+                if waiters is None:
+                    continue
+                waiters.discard(self)
+                if not waiters:
+                    del _subscriptions[channel]
+
+    def _notify(self, message: Optional[dict]) -> None:
+        self._loop.call_soon_threadsafe(self._deliver, message)
+
+    def _deliver(self, message: Optional[dict]) -> None:
+        if message is not None:
+            if len(self._pending) >= _MAX_PENDING:
+                self._pending.clear()
+                self._overflowed = True
+            elif not self._overflowed:
+                self._pending.append(message)
+        self._event.set()
+
+    async def wait(self, timeout: Optional[float]) -> bool:
+        """Ждать публикации не дольше ``timeout`` секунд; True — если она была."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+    async def next_messages(self, timeout: Optional[float]) -> Optional[List[dict]]:
+        """Сообщения, накопившиеся к пробуждению (пустой список — по таймауту).
+
+        ``None`` означает, что часть сообщений потеряна при переполнении и
+        изменения надо перечитать из БД.
+        """
+        await self.wait(timeout)
+        if self._overflowed:
+            self._overflowed = False
+            return None
+        messages, self._pending = self._pending, []
+        return messages
+
+
+def subscribe(channels: Iterable[str]) -> Subscription:
+    return Subscription(channels)
+
+
+def publish(*channels: str, message: Optional[dict] = None) -> None:
+    """Разбудить всех, кто подписан на любой из ``channels``, передав ``message``."""
+    with _lock:
+        targets = {
+            subscription
+            for channel in channels
+            for subscription in _subscriptions.get(channel, ())
+        }
+    for subscription in targets:
+        try:
+            subscription._notify(message)
+        except RuntimeError:
+            # Цикл событий уже закрыт — запрос завершился, будить некого.
+            pass
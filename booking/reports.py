@@ -0,0 +1,286 @@
+"""Revenue reports of completed appointments.
+
+Reports read ``DailySalonStats``: one row per stylist and local day with the
+clients, services and revenue of the appointments marked as done, so any
+period costs at most one row per stylist and day. The rows are recomputed
+from the appointments whenever one of them enters or leaves the DONE status
+(see ``booking.signals``), ``migrate`` fills the table when it is still empty
+and ``manage.py rebuild_daily_stats`` recomputes a whole period.
+
+Every service of an appointment is worth the price snapshotted on it when
+it was booked (``AppointmentService.price``), so past revenue does not move
+when a stylist changes their prices; rows booked before the snapshot existed
+fall back to the current price (``booked_price``).
+
+The CSV exports read flat ``values_list`` rows through ``iterator()``, so a
+multi-year export of a large salon never holds more than one chunk.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from itertools import groupby
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from booking.models import Appointment, DailySalonStats, Stylist, booked_price
+
+__all__ = [
+    "APPOINTMENT_EXPORT_HEADER",
+    "DAILY_EXPORT_HEADER",
+    "EXPORT_CHUNK_SIZE",
+    "appointment_export_rows",
+    "daily_export_rows",
+    "daily_totals",
+    "rebuild_daily_stats",
+    "refresh_daily_stats",
+    "revenue_report",
+]
+
+EXPORT_CHUNK_SIZE = 2000
+
+APPOINTMENT_EXPORT_HEADER = (
+    "Дата", "Время", "Мастер", "Клиент", "Телефон", "Услуги", "Оплата", "Сумма",
+)
+DAILY_EXPORT_HEADER = (
+    "Дата", "Мастер", "Клиенты", "Услуги", "Выручка", "Наличными", "На карту",
+)
+
+_TOTAL_FIELDS = (
+    "clients",
+    "services",
+    "revenue",
+    "cash_revenue",
+    "card_revenue",
+    "cash_clients",
+    "card_clients",
+)
+
+
+def _money(expression, **extra):
+    return Coalesce(
+        Sum(expression, **extra),
+        Value(Decimal("0")),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def daily_totals(appointments_qs):
+    """Итоги выполненных записей выборки по мастеру и локальному дню одним GROUP BY."""
+    cash = Q(payment_method=Appointment.PaymentMethod.CASH)
+    card = Q(payment_method=Appointment.PaymentMethod.CARD)
+    # Считаются услуги с ценой: снимком или, до бэкфилла, текущим прайсом. Удалённая
+    # позже цена мастера не должна задним числом менять выручку прошлых дней.
+    counted = Q(services__price__isnull=False) | Q(services__stylist_service__isnull=False)
+    return (
+        appointments_qs
+        .filter(status=Appointment.Status.DONE)
+        .order_by()
+        .annotate(date=TruncDate("start_time"))
+        .values("date", "stylist_id", salon_id=F("stylist__salon_id"))
+        .annotate(
+            clients=Count("id", distinct=True),
+            revenue=_money(booked_price("services__"), filter=counted),
+            cash_revenue=_money(booked_price("services__"), filter=counted & cash),
+            card_revenue=_money(booked_price("services__"), filter=counted & card),
+            cash_clients=Count("id", distinct=True, filter=cash),
+            card_clients=Count("id", distinct=True, filter=card),
+            # Последним: после него «services» в выражениях означало бы эту аннотацию.
+            services=Count("services", filter=counted),
+        )
+    )
+
+
+def _day_range(day: date) -> Tuple[datetime, datetime]:
+    start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+
+
+def refresh_daily_stats(stylist_days: Iterable[Tuple[int, date]]) -> None:
+    """Пересчитать строки свёртки для пар (мастер, день) из самих записей."""
+    stylist_days = {(stylist_id, day) for stylist_id, day in stylist_days if stylist_id and day}
+    if not stylist_days:
+        return
+
+    scope = Q()
+    for stylist_id, day in stylist_days:
+        start, end = _day_range(day)
+        scope |= Q(stylist_id=stylist_id, start_time__gte=start, start_time__lt=end)
+
+    with transaction.atomic():
+        rows = {
+            (row["stylist_id"], row["date"]): row
+            for row in daily_totals(Appointment.objects.filter(scope))
+        }
+        for stylist_id, day in stylist_days:
+            row = rows.get((stylist_id, day))
+            if row is None:
+                DailySalonStats.objects.filter(stylist_id=stylist_id, date=day).delete()
+                continue
+            DailySalonStats.objects.update_or_create(
+                stylist_id=stylist_id,
+                date=day,
+                defaults={"salon_id": row["salon_id"], **{field: row[field] for field in _TOTAL_FIELDS}},
+            )
+
+
+def rebuild_daily_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    salon_id: Optional[int] = None,
+) -> int:
+    """Собрать свёртку за период заново (границы включительно); вернуть число строк."""
+    appointments = Appointment.objects.all()
+    stats = DailySalonStats.objects.all()
+    if start:
+        appointments = appointments.filter(start_time__gte=_day_range(start)[0])
+        stats = stats.filter(date__gte=start)
+    if end:
+        appointments = appointments.filter(start_time__lt=_day_range(end)[1])
+        stats = stats.filter(date__lte=end)
+    if salon_id:
+        # Мастера салона сейчас и те, чьи строки записаны на салон: перешедший
+        # в другой салон мастер пересчитывается целиком под своим текущим салоном.
+        stylist_ids = set(
+            Stylist.objects.filter(salon_id=salon_id).values_list("pk", flat=True)
+        ) | set(stats.filter(salon_id=salon_id).values_list("stylist_id", flat=True))
+        appointments = appointments.filter(stylist_id__in=stylist_ids)
+        stats = stats.filter(stylist_id__in=stylist_ids)
+
+    with transaction.atomic():
+        stats.delete()
+        created = DailySalonStats.objects.bulk_create(
+            (
+                DailySalonStats(
+                    salon_id=row["salon_id"],
+                    stylist_id=row["stylist_id"],
+                    date=row["date"],
+                    **{field: row[field] for field in _TOTAL_FIELDS},
+                )
+                for row in daily_totals(appointments).iterator()
+            ),
+            batch_size=1000,
+        )
+    return len(created)
+
+
+def _stylist_names(stylist_ids) -> Dict[int, str]:
+    return {
+        stylist.pk: stylist.user.get_full_name() or str(stylist)
+        for stylist in Stylist.objects.select_related("user", "level").filter(pk__in=stylist_ids)
+    }
+
+
+def revenue_report(stats_qs) -> Tuple[List[dict], Dict[str, dict]]:
+    """Итоги по дням (новые сверху) и по мастерам для шаблона отчёта.
+
+    Клиентом, как и раньше, считается каждая оказанная услуга.
+    """
+    rows = list(stats_qs.values("date", "stylist_id", "services", "revenue").order_by("-date", "stylist_id"))
+    names = _stylist_names({row["stylist_id"] for row in rows})
+
+    stats = defaultdict(lambda: {
+        "clients": 0,
+        "revenue": Decimal("0"),
+        "stylists": defaultdict(lambda: Decimal("0"))
+    })
+    overall_stats = defaultdict(lambda: {"clients": 0, "revenue": Decimal("0")})
+    for row in rows:
+        if not row["services"]:
+            continue
+        name = names.get(row["stylist_id"], "")
+        day_stats = stats[row["date"]]
+        day_stats["clients"] += row["services"]
+        day_stats["revenue"] += row["revenue"]
+        day_stats["stylists"][name] += row["revenue"]
+
+        overall_stats[name]["clients"] += row["services"]
+        overall_stats[name]["revenue"] += row["revenue"]
+
+    daily_stats = [
+        {
+            "day": day,
+            "clients": data["clients"],
+            "revenue": data["revenue"],
+            "stylists": dict(data["stylists"]),
+        }
+        for day, data in stats.items()
+    ]
+    return daily_stats, dict(overall_stats)
+
+
+def _full_name(first_name, last_name, username):
+    return f"{first_name or ''} {last_name or ''}".strip() or username or ""
+
+
+def appointment_export_rows(appointments_qs) -> Iterator[tuple]:
+    """Строки CSV по выполненным записям: одна запись — одна строка.
+
+    Записи и их услуги идут одним запросом (строка на услугу) и склеиваются
+    по id, поэтому выборка читается кусками без отдельного запроса на запись.
+    """
+    payment_labels = dict(Appointment.PaymentMethod.choices)
+    rows = (
+        appointments_qs
+        .filter(status=Appointment.Status.DONE)
+        .order_by("start_time", "id")
+        .annotate(service_price=booked_price("services__"))
+        .values_list(
+            "id",
+            "start_time",
+            "stylist__user__first_name",
+            "stylist__user__last_name",
+            "stylist__user__username",
+            "customer__first_name",
+            "customer__username",
+            "guest_name",
+            "guest_phone",
+            "customer__profile__phone",
+            "payment_method",
+            "services__stylist_service__salon_service__service__name",
+            "service_price",
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for _, services in groupby(rows, key=lambda row: row[0]):
+        services = list(services)
+        (_, start, first_name, last_name, username, customer_name, customer_username,
+         guest_name, guest_phone, customer_phone, payment_method, _, _) = services[0]
+        start = timezone.localtime(start)
+        yield (
+            start.date().isoformat(),
+            start.strftime("%H:%M"),
+            _full_name(first_name, last_name, username),
+            customer_name or customer_username or guest_name or "",
+            customer_phone or guest_phone or "",
+            ", ".join(row[11] for row in services if row[11]),
+            payment_labels.get(payment_method, payment_method or ""),
+            sum((row[12] for row in services if row[12] is not None), Decimal("0")),
+        )
+
+
+def daily_export_rows(stats_qs) -> Iterator[tuple]:
+    """Строки CSV по дням и мастерам из свёртки DailySalonStats."""
+    rows = (
+        stats_qs
+        .order_by("date", "stylist_id")
+        .values_list(
+            "date",
+            "stylist__user__first_name",
+            "stylist__user__last_name",
+            "stylist__user__username",
+            "clients",
+            "services",
+            "revenue",
+            "cash_revenue",
+            "card_revenue",
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for day, first_name, last_name, username, *totals in rows:
+        yield (day.isoformat(), _full_name(first_name, last_name, username), *totals)
@@ -0,0 +1,314 @@
+"""Signal handlers of the booking app.
+
+Cached stylist-days are invalidated whenever their source rows change,
+appointment changes move the cached calendar counters, bump the version
+counters and wake the waiters of ``booking.notifications``, completed
+appointments keep the ``DailySalonStats`` rollup current (seeded by the
+first ``migrate``), reviews keep the denormalized salon rating current in
+their own transaction, and the database guard against overlapping
+appointments is installed after ``migrate``.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_migrate, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from booking.availability import invalidate_stylist, invalidate_stylist_dates
+from booking.calendar_summary import apply_calendar_change
+from booking.maintenance import ensure_appointment_overlap_guard
+from booking.models import (
+    Appointment,
+    AppointmentService,
+    AppointmentTombstone,
+    BreakPeriod,
+    DailySalonStats,
+    Review,
+    Salon,
+    Stylist,
+    StylistDayOff,
+    WorkingHour,
+)
+from booking.notifications import (
+    ALL_APPOINTMENTS,
+    bump_versions,
+    publish,
+    salon_channel,
+    stylist_channel,
+)
+from booking.reports import rebuild_daily_stats, refresh_daily_stats
+
+
+def _appointment_dates(start, end):
+    if start is None:
+        return set()
+    current = timezone.localtime(start).date()
+    last = timezone.localtime(end - timedelta(microseconds=1)).date() if end else current
+    dates = set()
+    while current <= last:
+        dates.add(current)
+        current += timedelta(days=1)
+    return dates
+
+
+def _appointment_state(instance):
+    # __dict__, а не атрибуты: у отложенных полей (.only()) не должно быть запроса.
+    values = instance.__dict__
+    return values.get('stylist_id'), _appointment_dates(values.get('start_time'), values.get('end_time'))
+
+
+def _event_state(instance):
+    values = instance.__dict__
+    return (
+        values.get('status'),
+        values.get('receipt_uploaded_at'),
+        (values.get('refund_requested_at'), values.get('refund_receipt_uploaded_at')),
+    )
+
+
+def _calendar_state(instance):
+    values = instance.__dict__
+    start = values.get('start_time')
+    if start is None:
+        return None
+    return timezone.localtime(start).date(), values.get('status')
+
+
+def _report_state(instance):
+    values = instance.__dict__
+    start = values.get('start_time')
+    return (
+        values.get('stylist_id'),
+        timezone.localtime(start).date() if start else None,
+        values.get('status'),
+        values.get('payment_method'),
+    )
+
+
+def _stylist_salon_key(stylist_id):
+    return f"booking:stylist-salon:{stylist_id}"
+
+
+def _stylist_salon_id(stylist_id):
+    """Салон мастера для каналов оповещений: из кэша, запрос — только при промахе."""
+    key = _stylist_salon_key(stylist_id)
+    salon_id = cache.get(key)
+    if salon_id is None:
+        salon_id = Stylist.objects.filter(pk=stylist_id).values_list('salon_id', flat=True).first()
+        if salon_id is not None:
+            cache.set(key, salon_id, None)
+    return salon_id
+
+
+def _event_kind(instance, previous, created):
+    if created:
+        return 'created'
+    status, receipt, refund = _event_state(instance)
+    if previous is not None:
+        if status != previous[0]:
+            return 'status'
+        if receipt != previous[1]:
+            return 'receipt'
+        if refund != previous[2]:
+            return 'refund'
+    return 'updated'
+
+
+def _day_off_state(instance):
+    values = instance.__dict__
+    day_off_date = values.get('date')
+    return values.get('stylist_id'), {day_off_date} if day_off_date else set()
+
+
+def _on_commit_invalidate(touched):
+    def run():
+        for stylist_id, dates in touched.items():
+            invalidate_stylist_dates(stylist_id, dates)
+    transaction.on_commit(run)
+
+
+def _merge(touched, stylist_id, dates):
+    if stylist_id is not None and dates:
+        touched.setdefault(stylist_id, set()).update(dates)
+
+
+@receiver(post_init, sender=Appointment)
+@receiver(post_init, sender=StylistDayOff)
+def remember_schedule_state(sender, instance, **kwargs):
+    state = _appointment_state if sender is Appointment else _day_off_state
+    instance._availability_state = state(instance)
+
+
+@receiver(post_init, sender=Appointment)
+def remember_event_state(sender, instance, **kwargs):
+    instance._event_state = _event_state(instance)
+    instance._calendar_state = _calendar_state(instance)
+    instance._report_state = _report_state(instance)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_appointment_days(sender, instance, **kwargs):
+    touched = {}
+    _merge(touched, *instance._availability_state)
+    current = _appointment_state(instance)
+    _merge(touched, *current)
+    instance._availability_state = current
+    _on_commit_invalidate(touched)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def publish_appointment_change(sender, instance, signal, created=False, **kwargs):
+    calendar_before = None if created else getattr(instance, '_calendar_state', None)
+    if signal is post_delete:
+        kind = 'deleted'
+        calendar_after = None
+    else:
+        kind = _event_kind(instance, getattr(instance, '_event_state', None), created)
+        instance._event_state = _event_state(instance)
+        calendar_after = instance._calendar_state = _calendar_state(instance)
+    start = instance.__dict__.get('start_time')
+    message = {
+        'id': instance.pk,
+        'kind': kind,
+        'date': timezone.localtime(start).date().isoformat() if start else None,
+    }
+
+    stylist_id = instance.stylist_id
+    # Салон мастера ищется уже после коммита: сохранение записи не платит за него запросом.
+    salon_id = instance.stylist.salon_id if Appointment.stylist.is_cached(instance) else None
+
+    def run():
+        channels = [ALL_APPOINTMENTS, stylist_channel(stylist_id)]
+        resolved_salon_id = salon_id if salon_id is not None else _stylist_salon_id(stylist_id)
+        if resolved_salon_id is not None:
+            channels.append(salon_channel(resolved_salon_id))
+        apply_calendar_change(channels, calendar_before, calendar_after)
+        bump_versions(*channels)
+        publish(*channels, message=message)
+    transaction.on_commit(run)
+
+
+@receiver(post_delete, sender=Appointment)
+def leave_appointment_tombstone(sender, instance, **kwargs):
+    # В той же транзакции, что и удаление: откат удаления откатит и след.
+    stylist_id = instance.stylist_id
+    salon_id = instance.stylist.salon_id if Appointment.stylist.is_cached(instance) else _stylist_salon_id(stylist_id)
+    AppointmentTombstone.objects.filter(deleted_at__lt=timezone.now() - AppointmentTombstone.TTL).delete()
+    AppointmentTombstone.objects.create(
+        appointment_id=instance.pk,
+        salon_id=salon_id,
+        date=timezone.localtime(instance.start_time).date(),
+    )
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def refresh_appointment_report_days(sender, instance, signal, created=False, **kwargs):
+    before = None if created else getattr(instance, '_report_state', None)
+    after = None if signal is post_delete else _report_state(instance)
+    instance._report_state = after
+    if before == after:
+        return
+    # Свёртку трогают только выполненные записи: вход в «Выполнена», выход из
+    # неё и перенос/смена оплаты уже выполненной.
+    stylist_days = {
+        state[:2]
+        for state in (before, after)
+        if state is not None and state[2] == Appointment.Status.DONE
+    }
+    if stylist_days:
+        transaction.on_commit(lambda: refresh_daily_stats(stylist_days))
+
+
+@receiver(post_save, sender=AppointmentService)
+@receiver(post_delete, sender=AppointmentService)
+def refresh_service_report_day(sender, instance, **kwargs):
+    # Без запроса: услуги новых записей (ещё не выполненных) сохраняются со
+    # своей записью в памяти, а каскадное удаление записи пересчитывает
+    # свёртку её собственным сигналом.
+    if not AppointmentService.appointment.is_cached(instance):
+        return
+    state = getattr(instance.appointment, '_report_state', None)
+    if state is not None and state[2] == Appointment.Status.DONE and state[1] is not None:
+        stylist_days = {state[:2]}
+        transaction.on_commit(lambda: refresh_daily_stats(stylist_days))
+
+
+@receiver(post_init, sender=Review)
+def remember_review_salon(sender, instance, **kwargs):
+    instance._rating_salon_id = instance.__dict__.get('salon_id')
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_salon_rating(sender, instance, **kwargs):
+    # Отзыв, перенесённый в другой салон, меняет рейтинг обоих.
+    salon_ids = {getattr(instance, '_rating_salon_id', None), instance.salon_id} - {None}
+    instance._rating_salon_id = instance.salon_id
+    for salon_id in sorted(salon_ids):
+        Salon.refresh_rating(salon_id)
+
+
+# Только при сохранении: удалённому мастеру запись нужна, чтобы оповестить
+# салон об удалении его записей каскадом.
+@receiver(post_save, sender=Stylist)
+def forget_stylist_salon(sender, instance, **kwargs):
+    cache.delete(_stylist_salon_key(instance.pk))
+
+
+@receiver(post_save, sender=StylistDayOff)
+@receiver(post_delete, sender=StylistDayOff)
+def invalidate_day_off_days(sender, instance, **kwargs):
+    touched = {}
+    _merge(touched, *instance._availability_state)
+    current = _day_off_state(instance)
+    _merge(touched, *current)
+    instance._availability_state = current
+    _on_commit_invalidate(touched)
+
+
+@receiver(post_save, sender=WorkingHour)
+@receiver(post_delete, sender=WorkingHour)
+def invalidate_working_hour_days(sender, instance, **kwargs):
+    stylist_id = instance.stylist_id
+    transaction.on_commit(lambda: invalidate_stylist(stylist_id))
+
+
+@receiver(post_save, sender=BreakPeriod)
+@receiver(post_delete, sender=BreakPeriod)
+def invalidate_break_days(sender, instance, **kwargs):
+    stylist_id = (
+        WorkingHour.objects
+        .filter(pk=instance.working_hour_id)
+        .values_list('stylist_id', flat=True)
+        .first()
+    )
+    # При каскадном удалении рабочего интервала его собственный сигнал уже
+    # сбросил кэш мастера.
+    if stylist_id is not None:
+        transaction.on_commit(lambda: invalidate_stylist(stylist_id))
+
+
+@receiver(post_migrate)
+def install_overlap_guard(sender, **kwargs):
+    if sender.name == 'booking':
+        ensure_appointment_overlap_guard()
+
+
+@receiver(post_migrate)
+def seed_daily_stats(sender, **kwargs):
+    # Первый migrate после появления свёртки собирает её за всё время, иначе
+    # отчёты до ручного rebuild_daily_stats были бы пустыми.
+    if sender.name == 'booking' and not DailySalonStats.objects.exists():
+        rebuild_daily_stats()
+
+
+@receiver(post_migrate)
+def seed_salon_ratings(sender, **kwargs):
+    # То же для рейтинга: у салонов с отзывами, но без посчитанного рейтинга.
+    if sender.name == 'booking':
+        Salon.objects.filter(rating_count=0, reviews__isnull=False).distinct().refresh_ratings()
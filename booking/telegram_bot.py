@@ -794,6 +794,16 @@ async def booking_choose_date(message: Message, state: FSMContext):
 
     status, slots_data = await api_request("GET", f"stylists/{stylist_id}/slots/", params=params)
     if status != 200 or not slots_data.get("slots"):
+        first_params = {"from": target_date.isoformat(), "services": params["services"]}
+        first_status, first_data = await api_request("GET", f"stylists/{stylist_id}/slots/first/", params=first_params)
+        first_slot = first_data.get("slot") if first_status == 200 and isinstance(first_data, dict) else None
+        if first_slot:
+            await message.answer(
+                "Нет доступных слотов на выбранную дату.\n"
+                f"Ближайшее свободное время: {first_slot['start'][:16].replace('T', ' ')}. "
+                "Введите эту дату в формате ГГГГ-ММ-ДД, чтобы выбрать время."
+            )
+            return
         await message.answer("Нет доступных слотов на выбранную дату.")
         await state.clear()
         return
@@ -1,3 +1,1180 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import random
+import re
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from booking import calendar_summary
+from booking.api.views import MAX_SLOT_RANGE_DAYS
+from booking.appointment_rows import render_appointment_rows
+from booking.availability import (
+    NextSlotIndex,
+    ScheduleSnapshot,
+    SlotConflict,
+    SlotPolicy,
+    _build_day,
+    _dilate,
+    _grid,
+    _runs,
+    _span,
+    find_slot_conflict,
+    invalidate_stylist_dates,
+    load_stylist_day,
+)
+from booking.calendar_summary import month_summary
+from booking.checks import check_shared_cache
+from booking.models import (
+    Appointment,
+    AppointmentService,
+    BreakPeriod,
+    City,
+    DailySalonStats,
+    Review,
+    Salon,
+    SalonService,
+    Service,
+    Stylist,
+    StylistDayOff,
+    StylistService,
+    WorkingHour,
+)
+from booking.notifications import channel_version, salon_channel
+from booking.reports import (
+    APPOINTMENT_EXPORT_HEADER,
+    DAILY_EXPORT_HEADER,
+    appointment_export_rows,
+    rebuild_daily_stats,
+)
+from booking.signals import seed_daily_stats, seed_salon_ratings
+from booking.views import DASHBOARD_DELTA_OVERLAP, DASHBOARD_MAX_WINDOW_DAYS, dashboard_rows, done_cash_totals
+from users.models import Profile
+
+User = get_user_model()
+
+
+def wall_clock(moment):
+    """'ЧЧ:ММ' по местному времени для datetime или ISO-строки из API."""
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment)
+    return timezone.localtime(moment).strftime('%H:%M')
+
+
+class BookingTestCase(TestCase):
+    """Салон с админом, одним мастером, одной услугой за 100 и рабочим днём 9–18."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.city = City.objects.create(name='Ташкент')
+        cls.salon = Salon.objects.create(city=cls.city, name='Салон', address='ул. 1')
+        cls.stylist = Stylist.objects.create(user=User.objects.create(username='stylist'), salon=cls.salon)
+        cls.salon_service = SalonService.objects.create(
+            salon=cls.salon, service=Service.objects.create(name='Стрижка')
+        )
+        cls.stylist_service = StylistService.objects.create(
+            stylist=cls.stylist, salon_service=cls.salon_service, price=Decimal('100')
+        )
+        cls.day = timezone.localdate() + timedelta(days=1)
+        WorkingHour.objects.create(
+            stylist=cls.stylist, weekday=cls.day.weekday(), start_time=time(9), end_time=time(18)
+        )
+        cls.admin = User.objects.create_user(username='admin', password='admin')
+        Profile.objects.update_or_create(user=cls.admin, defaults={'is_salon_admin': True, 'salon': cls.salon})
+
+    def setUp(self):
+        cache.clear()
+
+    def at(self, hour, minute=0, day=None):
+        return timezone.make_aware(datetime.combine(day or self.day, time(hour, minute)))
+
+    def book(self, hour, minute=0, day=None, status=Appointment.Status.PENDING, **fields):
+        if 'customer' not in fields:
+            fields.update(guest_name='Гость', guest_phone='+998901234567')
+        appointment = Appointment.objects.create(
+            stylist=self.stylist,
+            start_time=self.at(hour, minute, day),
+            end_time=self.at(hour, minute, day) + timedelta(minutes=30),
+            status=status,
+            **fields,
+        )
+        AppointmentService.objects.create(appointment=appointment, stylist_service=self.stylist_service)
+        return appointment
+
+
+class AvailabilityEngineTests(BookingTestCase):
+    def starts(self, minutes=30, **kwargs):
+        day = load_stylist_day(self.stylist, self.day)
+        return [wall_clock(start) for start in day.free_starts(timedelta(minutes=minutes), **kwargs)]
+
+    def grid(self, first=(9, 0), last=(17, 30), exclude=()):
+        moment, end = datetime.combine(self.day, time(*first)), datetime.combine(self.day, time(*last))
+        slots = []
+        while moment <= end:
+            if moment.strftime('%H:%M') not in exclude:
+                slots.append(moment.strftime('%H:%M'))
+            moment += timedelta(minutes=15)
+        return slots
+
+    def test_slots_avoid_breaks_and_appointments(self):
+        working_hour = WorkingHour.objects.get(stylist=self.stylist)
+        BreakPeriod.objects.create(working_hour=working_hour, start_time=time(13), end_time=time(14))
+        self.book(10)
+        self.assertEqual(self.starts(), self.grid(exclude={
+            '09:45', '10:00', '10:15', '12:45', '13:00', '13:15', '13:30', '13:45',
+        }))
+        self.assertEqual(self.starts(minutes=60)[:3], ['09:00', '10:30', '10:45'])
+
+    def test_cancelled_appointment_frees_its_slot(self):
+        appointment = self.book(10)
+        appointment.status = Appointment.Status.CANCELLED
+        appointment.save()
+        self.assertEqual(self.starts(), self.grid())
+
+    def test_day_offs(self):
+        StylistDayOff.objects.create(stylist=self.stylist, date=self.day, from_time=time(15), to_time=time(16))
+        self.assertEqual(self.starts(), self.grid(exclude={'14:45', '15:00', '15:15', '15:30', '15:45'}))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StylistDayOff.objects.create(stylist=self.stylist, date=self.day)
+        self.assertEqual(self.starts(), [])
+
+    def test_slot_must_fit_one_working_window(self):
+        WorkingHour.objects.filter(stylist=self.stylist).update(end_time=time(12))
+        WorkingHour.objects.create(
+            stylist=self.stylist, weekday=self.day.weekday(), start_time=time(12), end_time=time(13)
+        )
+        self.assertEqual(self.starts(minutes=90), ['09:00', '09:15', '09:30', '09:45', '10:00', '10:15', '10:30'])
+
+    def test_no_working_hours_means_no_slots(self):
+        day = load_stylist_day(self.stylist, self.day + timedelta(days=1))
+        self.assertEqual(day.free_starts(timedelta(minutes=30)), [])
+
+
+class CellMaskTests(TestCase):
+    def masks(self, count=200, width=120):
+        rng = random.Random(2)
+        return [rng.getrandbits(width) for _ in range(count)]
+
+    def test_runs_match_brute_force(self):
+        for mask in self.masks():
+            for length in (1, 2, 3, 6, 13):
+                expected = sum(
+                    1 << cell for cell in range(120)
+                    if all(mask >> (cell + offset) & 1 for offset in range(length))
+                )
+                self.assertEqual(_runs(mask, length), expected)
+
+    def test_dilate_matches_brute_force(self):
+        for mask in self.masks():
+            for cells in (0, 1, 2, 5):
+                expected = sum(
+                    1 << cell for cell in range(288)
+                    if any(mask >> near & 1 for near in range(max(cell - cells, 0), cell + cells + 1))
+                )
+                self.assertEqual(_dilate(mask, cells), expected)
+
+    def test_grid(self):
+        self.assertEqual(_grid(3, 12, 4), (1 << 3) | (1 << 7) | (1 << 11))
+        self.assertEqual(_grid(5, 5, 3), 0)
+        self.assertEqual(_grid(0, 3, 1), 0b111)
+
+    def test_schedule_rounds_to_cells_in_the_safe_direction(self):
+        start = timezone.make_aware(datetime(2026, 1, 5, 10, 2))
+        day = _build_day(
+            1, date(2026, 1, 5), [(time(9, 3), time(11, 58))], [], [], [(start, start + timedelta(minutes=5))]
+        )
+        self.assertEqual(day.windows, [(9 * 12 + 1, 11 * 12 + 11)])
+        self.assertEqual(day.booked, _span(10 * 12, 10 * 12 + 2))
+
+
+class SlotRangeApiTests(BookingTestCase):
+    def get_range(self, days=2, **params):
+        url = reverse('api-available-slots-range', args=[self.stylist.pk])
+        return self.client.get(url, {
+            'from': self.day.isoformat(),
+            'to': (self.day + timedelta(days=days - 1)).isoformat(),
+            'services': str(self.salon_service.pk),
+            **params,
+        })
+
+    def test_every_day_of_the_range(self):
+        self.book(10)
+        days = self.get_range().json()['days']
+        self.assertEqual([day['date'] for day in days], [str(self.day), str(self.day + timedelta(days=1))])
+        starts = [wall_clock(slot['start']) for slot in days[0]['slots']]
+        self.assertNotIn('10:00', starts)
+        self.assertIn('10:30', starts)
+        self.assertEqual(days[1]['slots'], [])
+
+    def test_stream_sends_one_json_line_per_day(self):
+        response = self.get_range(stream='1')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.get_range().json()['days'])
+
+    def test_queries_do_not_grow_with_days(self):
+        with CaptureQueriesContext(connection) as one_day:
+            self.get_range(days=1)
+        cache.clear()
+        with CaptureQueriesContext(connection) as two_weeks:
+            self.get_range(days=14)
+        self.assertEqual(len(two_weeks), len(one_day))
+
+    def test_invalid_ranges(self):
+        self.assertEqual(self.get_range(days=MAX_SLOT_RANGE_DAYS + 1).status_code, 400)
+        self.assertEqual(self.get_range(to=(self.day - timedelta(days=1)).isoformat()).status_code, 400)
+        self.assertEqual(self.get_range(services='999').status_code, 400)
+
+
+class SlotPolicyTests(BookingTestCase):
+    def starts(self, policy, minutes=30):
+        day = load_stylist_day(self.stylist, self.day)
+        return [wall_clock(start) for start in day.free_starts(timedelta(minutes=minutes), policy)]
+
+    def api_slots(self):
+        url = reverse('api-available-slots', args=[self.stylist.pk])
+        params = {'date': self.day.isoformat(), 'services': str(self.salon_service.pk)}
+        return [wall_clock(slot['start']) for slot in self.client.get(url, params).json()['slots']]
+
+    def test_salon_settings_and_service_overrides(self):
+        step, buffer = timedelta(minutes=20), timedelta(minutes=5)
+        Salon.objects.filter(pk=self.salon.pk).update(slot_step=step, buffer_after=buffer)
+        salon = Salon.objects.get(pk=self.salon.pk)
+        self.assertEqual(SlotPolicy.for_salon(salon), SlotPolicy(step=step, buffer_after=buffer))
+
+        other = SalonService(salon=salon, buffer_after=timedelta(minutes=15))
+        plain = SalonService(salon=salon, slot_step=timedelta(minutes=10), buffer_after=timedelta(minutes=10))
+        policy = SlotPolicy.for_salon(salon, [other, plain])
+        self.assertEqual((policy.step, policy.buffer_after), (timedelta(minutes=10), timedelta(minutes=15)))
+        self.assertEqual(SlotPolicy.for_salon(None), SlotPolicy())
+
+    def test_step_and_buffers(self):
+        self.book(10)
+        stepped = SlotPolicy(step=timedelta(minutes=20))
+        self.assertEqual(self.starts(stepped)[:5], ['09:00', '09:20', '10:40', '11:00', '11:20'])
+        buffered = SlotPolicy(step=timedelta(minutes=10), buffer_after=timedelta(minutes=10))
+        self.assertEqual(self.starts(buffered)[:4], ['09:00', '09:10', '09:20', '10:40'])
+
+    def test_api_applies_salon_settings(self):
+        self.book(10)
+        Salon.objects.filter(pk=self.salon.pk).update(
+            slot_step=timedelta(minutes=20), buffer_before=timedelta(minutes=10)
+        )
+        self.assertEqual(self.api_slots()[:4], ['09:00', '09:20', '10:40', '11:00'])
+
+        Salon.objects.filter(pk=self.salon.pk).update(min_lead_time=timedelta(days=3))
+        self.assertEqual(self.api_slots(), [])
+
+
+class NextSlotIndexTests(BookingTestCase):
+    def first_slot(self):
+        url = reverse('api-first-available-slot', args=[self.stylist.pk])
+        slot = self.client.get(url, {'services': str(self.salon_service.pk)}).json()['slot']
+        return slot and datetime.fromisoformat(slot['start'])
+
+    def test_matches_scanning_every_day(self):
+        later = self.day + timedelta(days=7)
+        rng = random.Random(5)
+        for hour in rng.sample(range(9, 18), 5):
+            self.book(hour, rng.choice([0, 30]))
+            if hour % 2:
+                self.book(hour, rng.choice([0, 30]), day=later)
+        index = NextSlotIndex.load([self.stylist], self.day, later)
+        schedule = ScheduleSnapshot.load([self.stylist], self.day, later)
+
+        for minutes in (30, 60, 90, 150):
+            for hour, minute in ((0, 0), (9, 7), (12, 40), (17, 10)):
+                not_before = self.at(hour, minute)
+                expected = next(
+                    (
+                        start
+                        for target_date in schedule.dates
+                        for start in schedule.day(self.stylist, target_date).free_starts(
+                            timedelta(minutes=minutes), not_before=not_before
+                        )
+                    ),
+                    None,
+                )
+                self.assertEqual(index.earliest(self.stylist, timedelta(minutes=minutes), not_before), expected)
+
+    def test_skips_days_without_room(self):
+        StylistDayOff.objects.create(stylist=self.stylist, date=self.day)
+        index = NextSlotIndex.load([self.stylist], self.day, self.day + timedelta(days=7))
+        next_week = self.day + timedelta(days=7)
+        self.assertEqual(index.earliest(self.stylist, timedelta(minutes=30)), self.at(9, day=next_week))
+        self.assertIsNone(index.earliest(self.stylist, timedelta(hours=10)))
+
+    def test_endpoint_follows_bookings_and_cancellations(self):
+        self.assertEqual(self.first_slot(), self.at(9))
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.book(9)
+        self.assertEqual(self.first_slot(), self.at(9, 30))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = Appointment.Status.CANCELLED
+            appointment.save()
+        self.assertEqual(self.first_slot(), self.at(9))
+
+
+class SlotConflictTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        working_hour = WorkingHour.objects.get(stylist=self.stylist)
+        BreakPeriod.objects.create(working_hour=working_hour, start_time=time(13), end_time=time(14))
+        StylistDayOff.objects.create(stylist=self.stylist, date=self.day, from_time=time(16), to_time=time(17))
+
+    def conflict(self, hour, minute=0, minutes=30, **kwargs):
+        start = self.at(hour, minute)
+        return find_slot_conflict(self.stylist, start, start + timedelta(minutes=minutes), **kwargs)
+
+    def test_reasons(self):
+        self.assertEqual(self.conflict(8, 45), SlotConflict.OFF_HOURS)
+        self.assertEqual(self.conflict(17, 45), SlotConflict.OFF_HOURS)
+        self.assertEqual(self.conflict(12, 45), SlotConflict.BREAK)
+        self.assertEqual(self.conflict(16, 30), SlotConflict.DAY_OFF)
+        self.assertEqual(self.conflict(11, policy=SlotPolicy(lead_time=timedelta(days=3))), SlotConflict.TOO_SOON)
+        self.assertIsNone(self.conflict(11))
+        self.assertIsNone(self.conflict(7, check_schedule=False))
+
+    def test_overlaps(self):
+        self.book(10)
+        buffered = SlotPolicy(buffer_before=timedelta(minutes=10))
+        self.assertEqual(self.conflict(10, 30, policy=buffered), SlotConflict.BUSY)
+        self.assertIsNone(self.conflict(10, 45, policy=buffered))
+        # Без буферов пересечение ловит сама база (IntegrityError при вставке).
+        with mock.patch('booking.availability.ensure_appointment_overlap_guard', return_value=False):
+            self.assertEqual(self.conflict(10, 15), SlotConflict.BUSY)
+            self.assertEqual(self.conflict(10, 15, check_schedule=False), SlotConflict.BUSY)
+            self.assertIsNone(self.conflict(10, 30))
+
+    def test_agrees_with_listed_slots(self):
+        starts = set(load_stylist_day(self.stylist, self.day).free_starts(timedelta(minutes=30)))
+        moment = self.at(8)
+        while moment < self.at(19):
+            free = find_slot_conflict(self.stylist, moment, moment + timedelta(minutes=30)) is None
+            self.assertEqual(free, moment in starts, moment)
+            moment += timedelta(minutes=15)
+
+    def test_api_booking_reports_a_taken_slot(self):
+        self.book(10)
+        self.client.force_login(self.admin)
+
+        def post(hour, minute):
+            return self.client.post(reverse('api-appointments'), {
+                'stylist_id': self.stylist.pk,
+                'salon_service_ids': [self.salon_service.pk],
+                'start_time': self.at(hour, minute).isoformat(),
+            }, content_type='application/json')
+
+        response = post(10, 15)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail'], 'На это время уже есть запись.')
+        self.assertEqual(post(12, 45).json()['detail'], 'Это время попадает в перерыв мастера.')
+        self.assertEqual(post(10, 30).status_code, 201)
+
+    def test_one_read_of_the_stylist_day(self):
+        self.conflict(11)
+        with self.assertNumQueries(2):
+            self.assertIsNone(self.conflict(11))
+
+
+@override_settings(TIME_ZONE='Europe/Berlin')
+class DaylightSavingTests(TestCase):
+    # 29.03.2026 в Берлине часы переводятся с 02:00 на 03:00.
+    switch = date(2026, 3, 29)
+
+    def setUp(self):
+        booked = timezone.make_aware(datetime.combine(self.switch, time(3)))
+        self.day = _build_day(1, self.switch, [(time(1), time(5))], [], [], [(booked, booked + timedelta(minutes=30))])
+
+    def test_slots_skip_the_missing_hour(self):
+        starts = self.day.free_starts(timedelta(minutes=30))
+        self.assertEqual(
+            [start.strftime('%H:%M%z') for start in starts],
+            ['01:00+0100', '01:15+0100', '01:30+0100',
+             '03:30+0200', '03:45+0200', '04:00+0200', '04:15+0200', '04:30+0200'],
+        )
+        # Между 01:30 и 03:30 по часам прошёл один реальный час.
+        elapsed = starts[3].astimezone(dt_timezone.utc) - starts[2].astimezone(dt_timezone.utc)
+        self.assertEqual(elapsed, timedelta(hours=1))
+
+    def test_next_slot_index_jumps_over_the_gap(self):
+        schedule = mock.Mock(start_date=self.switch, dates=[self.switch], day=lambda stylist, target_date: self.day)
+        index = NextSlotIndex(schedule)
+        not_before = timezone.make_aware(datetime.combine(self.switch, time(1, 40)))
+        self.assertEqual(
+            index.earliest(1, timedelta(minutes=30), not_before).strftime('%H:%M%z'), '03:30+0200'
+        )
+
+
+class AdminAppointmentListTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def page(self, **params):
+        response = self.client.get(reverse('api-admin-appointment-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def walk(self, **params):
+        ids, cursor = [], None
+        while True:
+            payload = self.page(**params, **({'cursor': cursor} if cursor else {}))
+            ids += [row['id'] for row in payload['results']]
+            cursor = payload['next']
+            if cursor is None:
+                return ids
+
+    def test_pages_have_no_duplicates_or_gaps(self):
+        # Отменённые записи могут стоять на одно время — проверка тай-брейка по id.
+        for hour in (12, 10, 11):
+            self.book(hour)
+            self.book(hour, status=Appointment.Status.CANCELLED)
+        self.book(10, status=Appointment.Status.CANCELLED)
+        expected = list(Appointment.objects.order_by('start_time', 'pk').values_list('pk', flat=True))
+
+        for limit in (1, 2, 3, 7, 50):
+            self.assertEqual(self.walk(limit=limit), expected)
+
+    def test_rows_added_behind_the_cursor_do_not_shift_pages(self):
+        for hour in (10, 11, 12, 13):
+            self.book(hour)
+        first = self.page(limit=2)
+        self.book(9)
+        rest = self.page(limit=2, cursor=first['next'])
+        expected = Appointment.objects.filter(start_time__gte=self.at(10)).order_by('start_time')
+        self.assertEqual(
+            [row['id'] for row in first['results'] + rest['results']],
+            list(expected.values_list('pk', flat=True)),
+        )
+
+    def test_filters_and_errors(self):
+        self.book(10)
+        cancelled = self.book(11, status=Appointment.Status.CANCELLED)
+        later_day = self.day + timedelta(days=2)
+        later = self.book(10, day=later_day)
+        self.assertEqual(self.walk(status='X'), [cancelled.pk])
+        self.assertEqual(self.walk(**{'from': str(later_day), 'to': str(later_day)}), [later.pk])
+
+        url = reverse('api-admin-appointment-list')
+        self.assertEqual(self.client.get(url, {'cursor': 'not-a-cursor'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'status': 'Z'}).status_code, 400)
+        self.client.force_login(self.stylist.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_queries_do_not_grow_with_page_size(self):
+        for hour in range(9, 17):
+            self.book(hour)
+        with CaptureQueriesContext(connection) as small:
+            self.page(limit=2)
+        with CaptureQueriesContext(connection) as large:
+            self.page(limit=8)
+        self.assertEqual(len(large), len(small))
+
+
+class StylistDayCacheTests(BookingTestCase):
+    def test_booking_invalidates_cached_day(self):
+        self.assertTrue(load_stylist_day(self.stylist, self.day).free & 1 << 10 * 12)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(10)
+        self.assertFalse(load_stylist_day(self.stylist, self.day).free & 1 << 10 * 12)
+
+    def test_invalidation_during_build_is_not_overwritten(self):
+        build = ScheduleSnapshot.load
+
+        def build_then_invalidate(*args, **kwargs):
+            snapshot = build(*args, **kwargs)
+            invalidate_stylist_dates(self.stylist.pk, [self.day])
+            return snapshot
+
+        with mock.patch.object(ScheduleSnapshot, 'load', side_effect=build_then_invalidate):
+            load_stylist_day(self.stylist, self.day)
+        with mock.patch.object(ScheduleSnapshot, 'load', side_effect=build) as rebuilt:
+            load_stylist_day(self.stylist, self.day)
+        rebuilt.assert_called_once()
+
+
+class DashboardUpdatesTests(BookingTestCase):
+    def poll(self, **params):
+        response = self.client.get(reverse('dashboard_updates'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_requires_login_and_get(self):
+        response = self.client.get(reverse('dashboard_updates'))
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.post(reverse('dashboard_updates')).status_code, 405)
+
+    def test_version_changes_only_with_appointments(self):
+        self.client.force_login(self.admin)
+        version = self.poll(version=0)['version']
+        self.assertFalse(self.poll(version=version)['has_updates'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(10)
+        state = self.poll(version=version)
+        self.assertTrue(state['has_updates'])
+        self.assertFalse(self.poll(version=state['version'])['has_updates'])
+
+
+class DashboardStreamTests(BookingTestCase):
+    def test_wsgi_request_falls_back_to_long_poll(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('dashboard_stream')).status_code, 204)
+
+    async def test_stream_catches_up_from_cursor(self):
+        appointment = await sync_to_async(self.book)(10)
+        await self.async_client.aforce_login(self.admin)
+        since = (appointment.updated_at - timedelta(minutes=5)).isoformat()
+        response = await self.async_client.get(reverse('dashboard_stream'), {'since': since})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        events = aiter(response.streaming_content)
+        try:
+            self.assertTrue((await anext(events)).startswith(b'retry:'))
+            event = (await anext(events)).decode()
+        finally:
+            await response.streaming_content.aclose()
+        self.assertIn('event: updated', event)
+        self.assertIn(f'"id": {appointment.pk}', event)
+
+
+class AppointmentNotificationTests(BookingTestCase):
+    def test_saving_appointment_does_not_look_up_salon(self):
+        appointment = Appointment.objects.get(pk=self.book(10).pk)
+        appointment.status = Appointment.Status.CONFIRMED
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks() as callbacks:
+            appointment.save(update_fields=['status'])
+        self.assertTrue(callbacks)
+
+    def test_salon_channel_follows_moved_stylist(self):
+        appointment = self.book(10)
+        other = Salon.objects.create(city=self.city, name='Другой', address='ул. 2')
+        self.stylist.salon = other
+        self.stylist.save()
+
+        version = channel_version(salon_channel(other.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.get(pk=appointment.pk).save()
+        self.assertNotEqual(channel_version(salon_channel(other.pk)), version)
+
+
+class DailySalonStatsTests(BookingTestCase):
+    def stats(self):
+        return list(DailySalonStats.objects.values_list('date', 'clients', 'services', 'revenue'))
+
+    def test_rollup_follows_status_transitions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.book(10, status=Appointment.Status.DONE)
+            self.book(11)
+        self.assertEqual(self.stats(), [(self.day, 1, 1, Decimal('100'))])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = Appointment.Status.CANCELLED
+            appointment.save()
+        self.assertEqual(self.stats(), [])
+
+    def test_service_added_to_done_appointment_is_counted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.book(10, status=Appointment.Status.DONE)
+        with self.captureOnCommitCallbacks(execute=True):
+            AppointmentService.objects.create(appointment=appointment, stylist_service=self.stylist_service)
+        self.assertEqual(self.stats(), [(self.day, 1, 2, Decimal('200'))])
+
+    def test_services_count_while_they_have_a_booked_price(self):
+        loose = StylistService.objects.create(stylist=self.stylist, price=Decimal('50'))
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.book(10, status=Appointment.Status.DONE)
+            AppointmentService.objects.create(appointment=appointment, stylist_service=loose)
+        self.assertEqual(self.stats(), [(self.day, 1, 2, Decimal('150'))])
+
+        loose.delete()
+        rebuild_daily_stats()
+        self.assertEqual(self.stats(), [(self.day, 1, 2, Decimal('150'))])
+        self.assertEqual(list(appointment_export_rows(Appointment.objects.all()))[0][-1], Decimal('150'))
+
+    def test_booking_services_cost_no_report_query(self):
+        appointment = Appointment.objects.create(
+            stylist=self.stylist, guest_name='Гость', guest_phone='+998901234567',
+            start_time=self.at(10), end_time=self.at(10, 30),
+        )
+        with self.assertNumQueries(1):
+            AppointmentService.objects.create(appointment=appointment, stylist_service=self.stylist_service)
+
+    def test_migrate_seeds_empty_rollup(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(10, status=Appointment.Status.DONE)
+        DailySalonStats.objects.all().delete()
+        seed_daily_stats(sender=apps.get_app_config('booking'))
+        self.assertEqual(self.stats(), [(self.day, 1, 1, Decimal('100'))])
+
+
+class PriceSnapshotTests(BookingTestCase):
+    def test_price_change_does_not_move_booked_totals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.book(10, status=Appointment.Status.DONE)
+        self.stylist_service.price = Decimal('250')
+        self.stylist_service.save()
+
+        done = Appointment.objects.filter(pk=appointment.pk)
+        self.assertEqual(done.with_total_price().get().total_price, Decimal('100'))
+        self.assertEqual(done.revenue(), Decimal('100'))
+        rebuild_daily_stats()
+        self.assertEqual(DailySalonStats.objects.get().revenue, Decimal('100'))
+
+    def test_rows_without_snapshot_use_current_price_everywhere(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.book(10, status=Appointment.Status.DONE)
+        AppointmentService.objects.update(price=None, duration=None)
+        self.stylist_service.price = Decimal('250')
+        self.stylist_service.save()
+
+        done = Appointment.objects.filter(pk=appointment.pk)
+        self.assertEqual(appointment.services.get().get_price(), Decimal('250'))
+        self.assertEqual(done.with_total_price().get().total_price, Decimal('250'))
+        self.assertEqual(done.revenue(), Decimal('250'))
+        rebuild_daily_stats()
+        self.assertEqual(DailySalonStats.objects.get().revenue, Decimal('250'))
+        self.assertEqual(list(appointment_export_rows(done))[0][-1], Decimal('250'))
+
+
+class SalonRatingTests(BookingTestCase):
+    def rating(self, salon):
+        salon.refresh_from_db(fields=['rating_avg', 'rating_count'])
+        return salon.rating_avg, salon.rating_count
+
+    def test_reviews_keep_rating_current(self):
+        first = Review.objects.create(salon=self.salon, user=self.admin, rating=5)
+        Review.objects.create(salon=self.salon, user=self.stylist.user, rating=4)
+        self.assertEqual(self.rating(self.salon), (Decimal('4.5'), 2))
+
+        first.delete()
+        self.assertEqual(self.rating(self.salon), (Decimal('4'), 1))
+
+    def test_moved_review_refreshes_both_salons(self):
+        other = Salon.objects.create(city=self.city, name='Другой', address='ул. 2')
+        review = Review.objects.create(salon=self.salon, user=self.admin, rating=5)
+        review = Review.objects.get(pk=review.pk)
+        review.salon = other
+        review.save()
+        self.assertEqual(self.rating(self.salon), (Decimal('0'), 0))
+        self.assertEqual(self.rating(other), (Decimal('5'), 1))
+
+    def test_delete_review_view_reports_new_rating(self):
+        Review.objects.create(salon=self.salon, user=self.stylist.user, rating=3)
+        review = Review.objects.create(salon=self.salon, user=self.admin, rating=5)
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('delete_review', args=[review.pk]))
+        self.assertEqual(response.json()['average_rating'], 3.0)
+        self.assertEqual(response.json()['review_count'], 1)
+
+    def test_migrate_seeds_missing_ratings(self):
+        Review.objects.create(salon=self.salon, user=self.admin, rating=4)
+        Salon.objects.update(rating_avg=0, rating_count=0)
+        seed_salon_ratings(sender=apps.get_app_config('booking'))
+        self.assertEqual(self.rating(self.salon), (Decimal('4'), 1))
+
+
+class RevenueAggregateTests(BookingTestCase):
+    def test_total_price_annotation_matches_services(self):
+        extra = StylistService.objects.create(
+            stylist=self.stylist,
+            salon_service=SalonService.objects.create(
+                salon=self.salon, service=Service.objects.create(name='Укладка')
+            ),
+            price=Decimal('40'),
+        )
+        two = self.book(10)
+        AppointmentService.objects.create(appointment=two, stylist_service=extra)
+        one = self.book(11)
+        empty = self.book(12)
+        empty.services.all().delete()
+
+        with self.assertNumQueries(1):
+            totals = {a.pk: a.get_total_price() for a in Appointment.objects.with_total_price()}
+        self.assertEqual(totals, {two.pk: Decimal('140'), one.pk: Decimal('100'), empty.pk: Decimal('0')})
+
+    def test_cash_totals_are_sums_of_done_appointments(self):
+        later = self.day + timedelta(days=1)
+        self.book(10, status=Appointment.Status.DONE)
+        self.book(11, status=Appointment.Status.DONE, day=later)
+        self.book(12, status=Appointment.Status.CONFIRMED)
+        self.assertEqual(Appointment.objects.none().revenue(), Decimal('0'))
+        with self.assertNumQueries(2):
+            totals = done_cash_totals(Appointment.objects.filter(stylist__salon=self.salon), self.day)
+        self.assertEqual(totals, (Decimal('200'), Decimal('100')))
+
+
+class AppointmentRowCacheTests(BookingTestCase):
+    def render(self, csrf_token='token-a', **context):
+        row_context = {'csrf_token': csrf_token, 'is_salon_admin': True, 'show_stylist': True, **context}
+        with mock.patch('booking.appointment_rows.render_to_string', wraps=render_to_string) as renders:
+            rows = render_appointment_rows(dashboard_rows(Appointment.objects.all()), row_context)
+        return rows, renders.call_count
+
+    def test_rows_are_rendered_once_per_version(self):
+        appointment = self.book(10)
+        self.book(11)
+        self.assertEqual(self.render()[1], 2)
+        self.assertEqual(self.render()[1], 0)
+
+        appointment.status = Appointment.Status.CONFIRMED
+        appointment.save()
+        rows, renders = self.render()
+        self.assertEqual(renders, 1)
+        self.assertIn(Appointment.Status.CONFIRMED.label, rows[appointment.pk])
+
+    def test_csrf_token_is_never_shared(self):
+        # Форма подтверждения чека — строка с токеном.
+        appointment = self.book(
+            10,
+            payment_method=Appointment.PaymentMethod.CARD,
+            payment_status=Appointment.PaymentStatus.AWAITING_CONFIRMATION,
+        )
+        self.render(csrf_token='token-a')
+        rows, renders = self.render(csrf_token='token-b')
+        self.assertEqual(renders, 0)
+        self.assertIn('token-b', rows[appointment.pk])
+        self.assertNotIn('token-a', rows[appointment.pk])
+
+    def test_viewer_variants_are_cached_apart(self):
+        self.book(10)
+        self.render()
+        stylist_view = {'is_salon_admin': False, 'stylist': self.stylist, 'show_stylist': False}
+        self.assertEqual(self.render(**stylist_view)[1], 1)
+        self.assertEqual(self.render(**stylist_view)[1], 0)
+
+
+class SalonDashboardWindowTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def shown(self, **params):
+        response = self.client.get(reverse('dashboard'), params)
+        self.assertEqual(response.status_code, 200)
+        return [appointment.pk for appointment in response.context['appointments']]
+
+    def test_rows_come_from_the_requested_window(self):
+        later_day = self.day + timedelta(days=5)
+        near, later = self.book(10), self.book(10, day=later_day)
+        self.assertEqual(self.shown(**{'from': str(self.day), 'to': str(self.day)}), [near.pk])
+        self.assertEqual(self.shown(date=str(later_day)), [later.pk])
+        both = self.shown(**{'from': str(self.day), 'to': str(later_day)})
+        self.assertEqual(sorted(both), [near.pk, later.pk])
+
+    def test_window_is_capped(self):
+        params = {'from': str(self.day), 'to': str(self.day + timedelta(days=400))}
+        window = self.client.get(reverse('dashboard_ajax'), params).json()['window']
+        self.assertEqual(window['to'], str(self.day + timedelta(days=DASHBOARD_MAX_WINDOW_DAYS - 1)))
+
+    def test_queries_do_not_grow_with_rows(self):
+        params = {'from': str(self.day), 'to': str(self.day + timedelta(days=1))}
+
+        def queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.client.get(reverse('dashboard_ajax'), params).status_code, 200)
+            return len(captured)
+
+        self.book(9)
+        single = queries()
+        for hour in (10, 11, 12):
+            self.book(hour, day=self.day + timedelta(days=hour % 2))
+        self.assertEqual(queries(), single)
+
+
+class StylistDashboardWindowTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.stylist.user)
+
+    def test_page_shows_own_rows_of_the_window(self):
+        other = Stylist.objects.create(user=User.objects.create(username='other'), salon=self.salon)
+        mine = self.book(10)
+        Appointment.objects.create(
+            stylist=other, guest_name='Гость', guest_phone='+998901234567',
+            start_time=self.at(10), end_time=self.at(10, 30),
+        )
+        self.book(10, day=self.day + timedelta(days=5))
+
+        response = self.client.get(reverse('stylist_dashboard'), {'from': str(self.day), 'to': str(self.day)})
+        self.assertEqual([appointment.pk for appointment in response.context['appointments']], [mine.pk])
+
+    def test_ajax_loads_a_single_day(self):
+        later_day = self.day + timedelta(days=5)
+        self.book(10)
+        later = self.book(10, day=later_day)
+        payload = self.client.get(reverse('stylist_dashboard_ajax'), {'date': str(later_day)}).json()
+        self.assertEqual(payload['window'], {'from': str(later_day), 'to': str(later_day)})
+        self.assertEqual(set(re.findall(r'data-appointment-id="(\d+)"', payload['html'])), {str(later.pk)})
+        self.assertEqual(payload['calendar'][str(later_day)], {Appointment.Status.PENDING: 1})
+
+    def test_queries_do_not_grow_with_rows(self):
+        params = {'from': str(self.day), 'to': str(self.day + timedelta(days=1))}
+
+        def queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.client.get(reverse('stylist_dashboard_ajax'), params).status_code, 200)
+            return len(captured)
+
+        self.book(9)
+        single = queries()
+        for hour in (10, 11, 12):
+            self.book(hour, day=self.day + timedelta(days=hour % 2))
+        self.assertEqual(queries(), single)
+
+
+class DashboardDeltaTests(BookingTestCase):
+    def delta(self, since, **params):
+        # Окно задаётся явно: по умолчанию оно от даты UTC, а self.day — местная.
+        window = {'from': str(self.day - timedelta(days=1)), 'to': str(self.day + timedelta(days=1))}
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('dashboard_delta'), {'since': since, **window, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cursor_is_required(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('dashboard_delta')).status_code, 400)
+
+    def test_changes_after_cursor_are_returned_once_past_overlap(self):
+        appointment = self.book(10)
+        since = (appointment.updated_at - timedelta(minutes=1)).isoformat()
+        payload = self.delta(since)
+        self.assertEqual([row['id'] for row in payload['rows']], [appointment.pk])
+        self.assertEqual(payload['cursor'], appointment.updated_at.isoformat())
+        self.assertEqual(payload['calendar'], {self.day.isoformat(): {Appointment.Status.PENDING: 1}})
+
+        later = (appointment.updated_at + DASHBOARD_DELTA_OVERLAP + timedelta(seconds=1)).isoformat()
+        self.assertEqual(self.delta(later)['rows'], [])
+
+    def test_rows_outside_window_are_removed(self):
+        appointment = self.book(10, day=self.day + timedelta(days=3))
+        since = (appointment.updated_at - timedelta(minutes=1)).isoformat()
+        payload = self.delta(since)
+        self.assertEqual(payload['rows'], [])
+        self.assertEqual(payload['removed'], [appointment.pk])
+
+    def test_deleted_appointments_are_removed(self):
+        deleted = self.book(10)
+        kept = self.book(11)
+        since = (kept.updated_at - timedelta(minutes=1)).isoformat()
+        deleted_pk = deleted.pk
+        deleted.delete()
+
+        payload = self.delta(since)
+        self.assertEqual(payload['removed'], [deleted_pk])
+        self.assertEqual([row['id'] for row in payload['rows']], [kept.pk])
+        self.assertEqual(payload['calendar'], {self.day.isoformat(): {Appointment.Status.PENDING: 1}})
+
+    def test_cascade_deletes_are_removed_for_their_salon_only(self):
+        customer = User.objects.create(username='client')
+        first, second = self.book(10, customer=customer), self.book(11, customer=customer)
+        since = (second.updated_at - timedelta(minutes=1)).isoformat()
+        customer.delete()
+
+        payload = self.delta(since)
+        self.assertEqual(sorted(payload['removed']), [first.pk, second.pk])
+        self.assertEqual(payload['calendar'], {self.day.isoformat(): {}})
+        self.assertGreater(datetime.fromisoformat(payload['cursor']), datetime.fromisoformat(since))
+
+        other = Salon.objects.create(city=self.city, name='Другой', address='ул. 2')
+        Profile.objects.filter(user=self.admin).update(salon=other)
+        self.assertEqual(self.delta(since)['removed'], [])
+
+
+class CalendarCounterTests(BookingTestCase):
+    def test_warm_month_follows_appointment_changes(self):
+        channel = salon_channel(self.salon.pk)
+        appointments = Appointment.objects.filter(stylist__salon=self.salon)
+        month = (self.day.year, self.day.month)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.book(10)
+            self.book(11)
+        month_summary(channel, appointments, *month)
+        # Окно подсчёта прошло.
+        cache.delete(calendar_summary._priming_key(channel, *month))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = Appointment.Status.CONFIRMED
+            appointment.save()
+            self.book(12, day=self.day + timedelta(days=1))
+            Appointment.objects.get(stylist=self.stylist, start_time=self.at(11)).delete()
+
+        with self.assertNumQueries(0):
+            cached = month_summary(channel, appointments, *month)
+        cache.clear()
+        self.assertEqual(cached, month_summary(channel, appointments, *month))
+
+    def test_change_while_month_is_counted_is_not_lost(self):
+        channel = salon_channel(self.salon.pk)
+        appointments = Appointment.objects.filter(stylist__salon=self.salon)
+        month = (self.day.year, self.day.month)
+        counted = calendar_summary.summarize_by_day(appointments)
+
+        def count_then_change(queryset):
+            # Запись создана после запроса, её on_commit приходит до set_many.
+            with self.captureOnCommitCallbacks(execute=True):
+                self.book(10)
+            return counted
+
+        with mock.patch('booking.calendar_summary.summarize_by_day', count_then_change):
+            self.assertEqual(month_summary(channel, appointments, *month), {})
+        self.assertEqual(
+            month_summary(channel, appointments, *month),
+            {self.day.isoformat(): {Appointment.Status.PENDING: 1}},
+        )
+
+    def test_change_right_after_counting_drops_the_month(self):
+        channel = salon_channel(self.salon.pk)
+        appointments = Appointment.objects.filter(stylist__salon=self.salon)
+        month = (self.day.year, self.day.month)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(10)
+        month_summary(channel, appointments, *month)
+        # Коммит этой записи мог попасть в подсчёт до её on_commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(11)
+
+        with self.assertNumQueries(1):
+            summary = month_summary(channel, appointments, *month)
+        self.assertEqual(summary, {self.day.isoformat(): {Appointment.Status.PENDING: 2}})
+
+
+class OverlapGuardTests(BookingTestCase):
+    def test_database_rejects_overlapping_active_appointments(self):
+        self.book(10)
+        later = self.book(11)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Appointment.objects.filter(pk=later.pk).update(
+                start_time=self.at(10, 15), end_time=self.at(10, 45)
+            )
+
+    def test_cancelled_appointments_do_not_block(self):
+        self.book(10, status=Appointment.Status.CANCELLED)
+        self.book(10)
+        self.assertEqual(Appointment.objects.count(), 2)
+
+
+class SalonWideAvailabilityTests(BookingTestCase):
+    def add_stylist(self, username):
+        stylist = Stylist.objects.create(user=User.objects.create(username=username), salon=self.salon)
+        StylistService.objects.create(stylist=stylist, salon_service=self.salon_service, price=Decimal('100'))
+        WorkingHour.objects.create(
+            stylist=stylist, weekday=self.day.weekday(), start_time=time(9), end_time=time(18)
+        )
+        return stylist
+
+    def booking_page_queries(self):
+        cache.clear()
+        params = {'salon': self.salon.pk, 'services': self.salon_service.service_id, 'date': self.day.isoformat()}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('service_booking'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_booking_page_queries_do_not_grow_with_stylists(self):
+        single = self.booking_page_queries()
+        for number in range(5):
+            self.add_stylist(f'stylist{number}')
+        self.assertEqual(self.booking_page_queries(), single)
+
+    def availability(self):
+        url = reverse('api-salon-availability', args=[self.salon.pk])
+        params = {'date': self.day.isoformat(), 'services': str(self.salon_service.pk)}
+        return self.client.get(url, params).json()['stylists']
+
+    def test_availability_api_lists_each_stylists_own_slots(self):
+        other = self.add_stylist('other')
+        Stylist.objects.create(user=User.objects.create(username='no-service'), salon=self.salon)
+        self.book(10)
+
+        slots = {
+            entry['stylist']: {wall_clock(slot['start']) for slot in entry['slots']}
+            for entry in self.availability()
+        }
+        self.assertEqual(set(slots), {self.stylist.pk, other.pk})
+        self.assertNotIn('10:00', slots[self.stylist.pk])
+        self.assertIn('10:00', slots[other.pk])
+
+    def test_availability_api_queries_do_not_grow_with_stylists(self):
+        with CaptureQueriesContext(connection) as single:
+            self.availability()
+        for number in range(5):
+            self.add_stylist(f'stylist{number}')
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(len(self.availability()), 6)
+        self.assertEqual(len(many), len(single))
+
+    def test_availability_api_skips_inactive_services(self):
+        url = reverse('api-salon-availability', args=[self.salon.pk])
+        params = {'date': self.day.isoformat(), 'services': str(self.salon_service.pk)}
+        self.assertEqual(len(self.client.get(url, params).json()['stylists']), 1)
+
+        SalonService.objects.filter(pk=self.salon_service.pk).update(is_active=False)
+        self.assertEqual(self.client.get(url, params).json()['stylists'], [])
+
+
+class RevenueReportTests(BookingTestCase):
+    def add_stylist(self, username, price):
+        stylist = Stylist.objects.create(
+            user=User.objects.create(username=username, first_name=username.title()), salon=self.salon
+        )
+        stylist_service = StylistService.objects.create(
+            stylist=stylist, salon_service=self.salon_service, price=Decimal(price)
+        )
+        return stylist, stylist_service
+
+    def done(self, stylist, stylist_service, hour, day=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            start = self.at(hour, day=day)
+            appointment = Appointment.objects.create(
+                stylist=stylist, guest_name='Гость', guest_phone='+998901234567',
+                start_time=start, end_time=start + timedelta(minutes=30), status=Appointment.Status.DONE,
+            )
+            AppointmentService.objects.create(appointment=appointment, stylist_service=stylist_service)
+
+    def report(self, **params):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('reports'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def test_totals_per_day_and_stylist(self):
+        anna, anna_service = self.add_stylist('anna', '70')
+        next_day = self.day + timedelta(days=1)
+        self.done(self.stylist, self.stylist_service, 10)
+        self.done(anna, anna_service, 10)
+        self.done(anna, anna_service, 11, day=next_day)
+
+        context = self.report(start=str(self.day), end=str(next_day))
+        days = {row['day']: (row['clients'], row['revenue']) for row in context['daily_stats']}
+        self.assertEqual(days, {self.day: (2, Decimal('170')), next_day: (1, Decimal('70'))})
+        self.assertEqual(context['overall_stats']['Anna'], {'clients': 2, 'revenue': Decimal('140')})
+        self.assertEqual((context['total_clients'], context['total_revenue']), (3, Decimal('240')))
+
+        self.assertEqual(self.report(start=str(next_day))['total_revenue'], Decimal('70'))
+
+    def test_other_salons_are_not_counted(self):
+        self.done(self.stylist, self.stylist_service, 10)
+        other_salon = Salon.objects.create(city=self.city, name='Другой', address='ул. 2')
+        Profile.objects.filter(user=self.admin).update(salon=other_salon)
+        self.assertEqual(self.report()['total_revenue'], 0)
+
+    def test_queries_do_not_grow_with_stylists(self):
+        self.done(self.stylist, self.stylist_service, 10)
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as single:
+            self.client.get(reverse('reports'))
+        for number in range(4):
+            self.done(*self.add_stylist(f'stylist{number}', '50'), 10)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(reverse('reports'))
+        self.assertEqual(len(many), len(single))
+
+
+class ReportExportTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(content[1:]), delimiter=';'))
+
+    def done(self, hour, extra=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.book(hour, status=Appointment.Status.DONE)
+            if extra:
+                AppointmentService.objects.create(appointment=appointment, stylist_service=extra)
+        return appointment
+
+    def test_appointment_rows_merge_their_services(self):
+        extra = StylistService.objects.create(
+            stylist=self.stylist,
+            salon_service=SalonService.objects.create(
+                salon=self.salon, service=Service.objects.create(name='Укладка')
+            ),
+            price=Decimal('40'),
+        )
+        self.done(10, extra)
+        self.book(12)
+
+        header, *rows = self.export('reports_export', kind='appointments', start=str(self.day), end=str(self.day))
+        self.assertEqual(tuple(header), APPOINTMENT_EXPORT_HEADER)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][:3], [str(self.day), '10:00', 'stylist'])
+        self.assertEqual(sorted(rows[0][5].split(', ')), ['Стрижка', 'Укладка'])
+        self.assertEqual(Decimal(rows[0][7]), Decimal('140'))
+
+    def test_day_rows_come_from_the_rollup(self):
+        self.done(10)
+        self.done(11)
+        header, *rows = self.export('reports_export', kind='days')
+        self.assertEqual(tuple(header), DAILY_EXPORT_HEADER)
+        self.assertEqual([row[:4] for row in rows], [[str(self.day), 'stylist', '2', '2']])
+        self.assertEqual(Decimal(rows[0][4]), Decimal('200'))
+
+    def test_stylist_export_needs_a_period(self):
+        self.done(10)
+        self.client.force_login(self.stylist.user)
+        self.assertEqual(self.client.get(reverse('stylist_reports_export')).status_code, 400)
+        rows = self.export('stylist_reports_export', start_date=str(self.day), end_date=str(self.day))
+        self.assertEqual(len(rows), 2)
+
+    def test_queries_do_not_grow_with_rows(self):
+        def queries():
+            with CaptureQueriesContext(connection) as captured:
+                self.export('reports_export', kind='appointments')
+            return len(captured)
+
+        self.done(9)
+        single = queries()
+        for hour in (10, 11, 12, 13):
+            self.done(hour)
+        self.assertEqual(queries(), single)
+
+
+class RebuildDailyStatsTests(BookingTestCase):
+    def test_salon_rebuild_covers_stylists_who_moved_away(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(10, status=Appointment.Status.DONE)
+        other = Salon.objects.create(city=self.city, name='Другой', address='ул. 2')
+        self.stylist.salon = other
+        self.stylist.save()
+
+        rebuild_daily_stats(salon_id=self.salon.pk)
+        self.assertEqual(list(DailySalonStats.objects.values_list('salon_id', flat=True)), [other.pk])
+        rebuild_daily_stats(salon_id=other.pk)
+        self.assertEqual(list(DailySalonStats.objects.values_list('salon_id', flat=True)), [other.pk])
+
+
+class SharedCacheCheckTests(TestCase):
+    def test_process_local_cache_is_reported(self):
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+        with self.settings(CACHES=local):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['booking.W001'])
+        with self.settings(CACHES=shared):
+            self.assertEqual(check_shared_cache(None), [])
@@ -23,16 +23,22 @@ urlpatterns = [
     path('booking/', service_booking, name='service_booking'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('dashboard/ajax/', views.dashboard_ajax, name='dashboard_ajax'),
+    path('dashboard/delta/', views.dashboard_delta, name='dashboard_delta'),
+    path('dashboard/calendar/', views.dashboard_calendar, name='dashboard_calendar'),
     path('dashboard/updates/', views.dashboard_updates, name='dashboard_updates'),
+    path('dashboard/stream/', views.dashboard_stream, name='dashboard_stream'),
     path('appointments/overdue/complete/', views.complete_overdue_appointments, name='complete_overdue_appointments'),
     path("appointment/<int:pk>/action/", views.AppointmentActionView.as_view(), name="appointment_action"),
     path("reports/", ReportView.as_view(), name="reports"),
+    path("reports/export/", views.ReportExportView.as_view(), name="reports_export"),
     path("my-appointments/", my_appointments, name="my_appointments"),
     path("cancel-appointment/<int:appointment_id>/", cancel_appointment, name="cancel_appointment"),
     # path('category/<int:category_id>/', views.services_by_category, name='services_by_category'),
     path("stylist/dashboard/", views.stylist_dashboard, name="stylist_dashboard"),
     path("stylist/dashboard/ajax/", views.stylist_dashboard_ajax, name="stylist_dashboard_ajax"),
     path("stylist/dashboard/updates/", views.stylist_dashboard_updates, name="stylist_dashboard_updates"),
+    path("stylist/dashboard/stream/", views.stylist_dashboard_stream, name="stylist_dashboard_stream"),
+    path("stylist/dashboard/calendar/", views.stylist_dashboard_calendar, name="stylist_dashboard_calendar"),
     path("appointment/<int:appointment_id>/update-status/", views.appointment_update_status,
          name="appointment_update_status"),
     path("appointment/<int:appointment_id>/payment-action/", views.appointment_payment_action,
@@ -43,6 +49,7 @@ urlpatterns = [
     path('stylist/appointment/', StylistManualAppointmentCreateView.as_view(), name='stylist_manual_appointment'),
     path('ajax/get_available_times/', get_available_times_for_stylist, name='get_available_times'),
     path('stylist/reports/', views.stylist_reports, name='stylist_reports'),
+    path('stylist/reports/export/', views.stylist_reports_export, name='stylist_reports_export'),
     path('category/<int:pk>/', CategoryServicesView.as_view(), name='category_services'),
     # path('services/search/', ServiceSearchView.as_view(), name='service_search')
     path('autocomplete/', views.autocomplete_search, name='autocomplete_search'),
@@ -1,6 +1,8 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model, login
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.core.handlers.asgi import ASGIRequest
 from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views import View
@@ -27,32 +29,54 @@ from .form import (
 )
 from .models import Service, Stylist, Appointment, StylistService, Category, BreakPeriod, WorkingHour, Salon, \
     SalonService, City, AppointmentService, StylistDayOff, WEEKDAYS, Review, SalonPaymentCard, FavoriteSalon, \
-    SalonProduct, ProductCart, ProductCartItem, ProductOrder, ProductOrderItem
+    SalonProduct, ProductCart, ProductCartItem, ProductOrder, ProductOrderItem, DailySalonStats, \
+    AppointmentTombstone
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils import timezone
 from django.utils.timezone import make_aware, now, localtime, timedelta
 from django.contrib import messages
+from booking.availability import (
+    NextSlotIndex,
+    SlotConflict,
+    SlotPolicy,
+    find_slot_conflict,
+    load_stylist_day,
+    load_stylist_days,
+)
+from booking import notifications
+from booking.appointment_rows import attach_rendered_rows, render_appointment_row
+from booking.calendar_summary import month_summary, summarize_by_day
+from booking.reports import (
+    APPOINTMENT_EXPORT_HEADER,
+    DAILY_EXPORT_HEADER,
+    appointment_export_rows,
+    daily_export_rows,
+    revenue_report,
+)
 from booking.telebot import send_telegram
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import (
+    HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse,
+)
 from django.template.loader import render_to_string
 from django.views.decorators.http import require_GET, require_POST
 from django.template.context_processors import csrf
-from django.db import transaction
-from django.db.models import Count, Sum, DecimalField, Prefetch, F, Max, Avg, Q, Case, When, Value, IntegerField
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum, DecimalField, Prefetch, F, Max, Q, Case, When, Value, IntegerField
 from django.db.models.functions import Cast, TruncDate, Coalesce, Lower, Upper
 from datetime import date, datetime
 from calendar import monthrange
 from collections import defaultdict, Counter
+import csv
 import json
 from decimal import Decimal, InvalidOperation
+from functools import partial
 import datetime as dt
 import secrets
-import time
+import asyncio
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
 import re
 from django.utils.dateparse import parse_datetime
-import pytz
 from django.db.models.deletion import ProtectedError
 from users.forms import ProfileUpdateForm
 
@@ -310,7 +334,6 @@ class HomePageView(ListView):
 
     def get_queryset(self):
         queryset = Salon.objects.active().order_by('position')
-        queryset = queryset.annotate(avg_rating=Avg('reviews__rating'))
 
         # Фильтр по типу (male, female, both)
         salon_type = self.request.GET.get('type')
@@ -322,7 +345,7 @@ class HomePageView(ListView):
         if rating:
             try:
                 rating = float(rating)
-                queryset = queryset.filter(avg_rating__gte=rating)
+                queryset = queryset.filter(rating_avg__gte=rating)
             except ValueError:
                 pass
 
@@ -916,13 +939,14 @@ def delete_review(request, pk):
 
     salon = review.salon
     review.delete()
+    salon.refresh_from_db(fields=['rating_avg', 'rating_count'])
 
-    average_rating = salon.average_rating() or 0
+    average_rating = salon.average_rating()
     rounded_rating = round(average_rating * 2) / 2
     full_stars = int(rounded_rating)
     has_half_star = (rounded_rating - full_stars) == 0.5
     empty_stars = 5 - full_stars - (1 if has_half_star else 0)
-    review_count = salon.reviews.count()
+    review_count = salon.rating_count
 
     return JsonResponse({
         'success': True,
@@ -1028,28 +1052,11 @@ class StylistDetailView(DetailView):
         else:
             date = timezone.now().date()
 
-        weekday = date.weekday()
-        slots = []
-
-        for wh in stylist.working_hours.filter(weekday=weekday):
-            start = make_aware(datetime.combine(date, wh.start_time))
-            end = make_aware(datetime.combine(date, wh.end_time))
-            current = start
-
-            while current + timedelta(minutes=15) <= end:
-                overlap = (
-                    Appointment.objects
-                    .filter(
-                        stylist=stylist,
-                        start_time__lt=current + timedelta(minutes=15),
-                        end_time__gt=current,
-                    )
-                    .exclude(status=Appointment.Status.CANCELLED)
-                    .exists()
-                )
-                if not overlap and current >= timezone.now():
-                    slots.append(current)
-                current += timedelta(minutes=15)
+        # Проба длиной в один шаг: показываем все начала, где свободен хотя бы шаг.
+        policy = SlotPolicy.for_salon(stylist.salon)
+        slots = load_stylist_day(stylist, date).free_starts(
+            policy.step, policy, not_before=policy.earliest_start()
+        )
 
         context['slots'] = slots
         context['selected_date'] = date
@@ -1071,7 +1078,7 @@ class AppointmentCreateView(View):
             messages.error(request, 'Не хватает данных для записи.')
             return redirect('home')
 
-        stylist = get_object_or_404(Stylist, id=stylist_id)
+        stylist = get_object_or_404(Stylist.objects.select_related('salon'), id=stylist_id)
         stylist_services = list(StylistService.objects.select_related('salon_service').filter(
             stylist=stylist,
             salon_service__service_id__in=service_ids
@@ -1090,45 +1097,16 @@ class AppointmentCreateView(View):
         total_duration = sum((ss.salon_service.duration for ss in stylist_services), timedelta())
         end_time = start_time + total_duration
 
-        # Проверка занятости
-        if (
-            Appointment.objects
-            .filter(
-                stylist=stylist,
-                start_time__lt=end_time,
-                end_time__gt=start_time,
-            )
-            .exclude(status=Appointment.Status.CANCELLED)
-            .exists()
-        ):
-            messages.error(request, 'Извините, мастер уже занят в это время.')
-            return redirect('home')
-
-        # Проверка рабочего времени
-        start_time_local = localtime(start_time)
-        end_time_local = localtime(end_time)
-        weekday = start_time_local.weekday()
-
-        wh = WorkingHour.objects.filter(
-            stylist=stylist,
-            weekday=weekday,
-            start_time__lte=start_time_local.time(),
-            end_time__gte=end_time_local.time()
-        ).first()
-
-        if not wh:
-            messages.error(request, 'Выбранное время не входит в рабочее время мастера.')
-            return redirect('home')
-
-        # Перерывы
-        in_break = BreakPeriod.objects.filter(
-            working_hour=wh,
-            start_time__lt=end_time_local.time(),
-            end_time__gt=start_time_local.time()
-        ).exists()
-
-        if in_break:
-            messages.error(request, 'Это время попадает в перерыв мастера.')
+        policy = SlotPolicy.for_salon(stylist.salon, [ss.salon_service for ss in stylist_services])
+        conflict = find_slot_conflict(stylist, start_time, end_time, policy=policy)
+        if conflict:
+            messages.error(request, {
+                SlotConflict.BUSY: 'Извините, мастер уже занят в это время.',
+                SlotConflict.OFF_HOURS: 'Выбранное время не входит в рабочее время мастера.',
+                SlotConflict.BREAK: 'Это время попадает в перерыв мастера.',
+                SlotConflict.DAY_OFF: 'Мастер не работает в выбранное время.',
+                SlotConflict.TOO_SOON: 'На это время записаться уже нельзя, выберите время позже.',
+            }[conflict])
             return redirect('home')
 
         # Клиент
@@ -1163,8 +1141,8 @@ class AppointmentCreateView(View):
             customer, credentials_data = ensure_guest_account(guest_name, guest_phone)
             auto_login_user = customer
 
-        # Создаём запись
-        appointment = Appointment.objects.create(
+        # Создаём запись; пересечение с другой записью отклонит сама БД
+        appointment = Appointment(
             customer=customer,
             guest_name='' if customer else guest_name,
             guest_phone='' if customer else guest_phone,
@@ -1172,12 +1150,18 @@ class AppointmentCreateView(View):
             start_time=start_time,
             end_time=end_time
         )
-
-        for ss in stylist_services:
-            AppointmentService.objects.create(
-                appointment=appointment,
-                stylist_service=ss
-            )
+        appointment.mark_slot_checked()
+        try:
+            with transaction.atomic():
+                appointment.save()
+                for ss in stylist_services:
+                    AppointmentService.objects.create(
+                        appointment=appointment,
+                        stylist_service=ss
+                    )
+        except IntegrityError:
+            messages.error(request, 'Извините, мастер уже занят в это время.')
+            return redirect('home')
 
         # Telegram уведомление мастеру
         phone_txt = (
@@ -1351,13 +1335,20 @@ def service_booking(request):
 
         all_stylist_services = (
             StylistService.objects.filter(**filters)
-            .select_related('stylist', 'salon_service', 'salon_service__service')
+            .select_related('stylist', 'stylist__user', 'stylist__level', 'salon_service', 'salon_service__service')
         )
 
         for ss in all_stylist_services:
             stylist_to_services[ss.stylist_id].append(ss)
 
-        def build_slot_entry(stylist_id, target_date):
+        # У всех мастеров одни и те же услуги салона — правила слотов общие.
+        policy = SlotPolicy.for_salon(salon, {
+            ss.salon_service_id: ss.salon_service
+            for ss in all_stylist_services
+            if ss.salon_service.service_id in selected_service_ids
+        }.values())
+
+        def build_offer(stylist_id):
             services_list = stylist_to_services.get(stylist_id)
             if not services_list:
                 return None
@@ -1379,58 +1370,49 @@ def service_booking(request):
             if ss_duration.total_seconds() <= 0:
                 return None
 
-            weekday_local = target_date.weekday()
-            slots = []
-            for wh in stylist.working_hours.filter(weekday=weekday_local):
-                start = make_aware(datetime.combine(target_date, wh.start_time))
-                end = make_aware(datetime.combine(target_date, wh.end_time))
-                current = start
-
-                while current + ss_duration <= end:
-                    overlap = (
-                        Appointment.objects
-                        .filter(
-                            stylist=stylist,
-                            start_time__lt=current + ss_duration,
-                            end_time__gt=current,
-                        )
-                        .exclude(status=Appointment.Status.CANCELLED)
-                        .exists()
-                    )
-
-                    in_break = BreakPeriod.objects.filter(
-                        working_hour=wh,
-                        start_time__lt=(current + ss_duration).time(),
-                        end_time__gt=current.time()
-                    ).exists()
-
-                    in_dayoff = StylistDayOff.objects.filter(
-                        stylist=stylist,
-                        date=target_date
-                    ).filter(
-                        Q(from_time__isnull=True, to_time__isnull=True)
-                        | Q(from_time__lt=(current + ss_duration).time(), to_time__gt=current.time())
-                    ).exists()
-
-                    if not overlap and not in_break and not in_dayoff and current >= now():
-                        slots.append(current)
-
-                    current += timedelta(minutes=15)
-
-            if not slots:
-                return None
-
             return {
                 'stylist': stylist,
                 'services': relevant_services,
                 'price': ss_price,
                 'duration': ss_duration,
                 'duration_display': format_duration(ss_duration),
-                'slots': slots
             }
 
+        def build_slot_entry(stylist_id, day):
+            offer = build_offer(stylist_id)
+            if not offer:
+                return None
+
+            slots = day.free_starts(offer['duration'], policy, not_before=policy.earliest_start())
+            if not slots:
+                return None
+
+            return {**offer, 'slots': slots}
+
+        def find_next_slot(next_index, stylist_id):
+            offer = build_offer(stylist_id)
+            if not offer:
+                return None
+
+            first_slot = next_index.earliest(stylist_id, offer['duration'], not_before=policy.earliest_start())
+            if not first_slot:
+                return None
+
+            return offer, first_slot
+
+        qualifying_stylist_ids = [
+            stylist_id
+            for stylist_id, services_list in stylist_to_services.items()
+            if set(selected_service_ids).issubset(
+                {s.salon_service.service_id for s in services_list}
+            )
+        ]
+        selected_days = load_stylist_days(qualifying_stylist_ids, selected_date)
+
         for stylist_id in stylist_to_services:
-            slot_entry = build_slot_entry(stylist_id, selected_date)
+            if stylist_id not in selected_days:
+                continue
+            slot_entry = build_slot_entry(stylist_id, selected_days[stylist_id])
             if not slot_entry:
                 continue
 
@@ -1453,54 +1435,53 @@ def service_booking(request):
         if stylist_slots:
             stylist_slots.sort(key=lambda entry: entry['slots'][0])
 
-        if selected_stylist and (not selected_stylist_slot or not selected_stylist_slot.get('slots')):
-            search_date = selected_date + timedelta(days=1)
-            while search_date <= max_date:
-                slot_entry = build_slot_entry(selected_stylist.id, search_date)
-                if slot_entry:
-                    next_available_slot = {
-                        'date': search_date,
-                        'slot': slot_entry['slots'][0],
-                        'price': slot_entry['price'],
-                        'duration': slot_entry['duration'],
-                        'stylist_id': selected_stylist.id,
-                        'auto_slot_str': slot_entry['slots'][0].strftime('%Y-%m-%dT%H:%M'),
-                    }
-                    break
-
-                search_date += timedelta(days=1)
-
-        if not selected_stylist and not stylist_slots and stylist_to_services:
-            pending_stylists = set(stylist_to_services.keys())
-            search_date = selected_date + timedelta(days=1)
-
-            while pending_stylists and search_date <= max_date:
-                for stylist_id in list(pending_stylists):
-                    slot_entry = build_slot_entry(stylist_id, search_date)
-                    if not slot_entry:
-                        continue
-
-                    first_slot = slot_entry['slots'][0]
-                    slot_payload = {
-                        'date': search_date,
-                        'slot': first_slot,
-                        'price': slot_entry['price'],
-                        'duration': slot_entry['duration'],
-                        'duration_display': slot_entry.get('duration_display'),
-                        'stylist': slot_entry['stylist'],
-                        'stylist_id': stylist_id,
-                        'services': slot_entry.get('services', []),
-                        'auto_slot_str': first_slot.strftime('%Y-%m-%dT%H:%M'),
-                    }
+        if (
+            selected_stylist
+            and (not selected_stylist_slot or not selected_stylist_slot.get('slots'))
+            and selected_date < max_date
+        ):
+            next_index = NextSlotIndex.load(
+                [selected_stylist.id], selected_date + timedelta(days=1), max_date, policy
+            )
+            found = find_next_slot(next_index, selected_stylist.id)
+            if found:
+                offer, first_slot = found
+                next_available_slot = {
+                    'date': localtime(first_slot).date(),
+                    'slot': first_slot,
+                    'price': offer['price'],
+                    'duration': offer['duration'],
+                    'stylist_id': selected_stylist.id,
+                    'auto_slot_str': first_slot.strftime('%Y-%m-%dT%H:%M'),
+                }
 
-                    next_available_slots.append(slot_payload)
+        if not selected_stylist and not stylist_slots and qualifying_stylist_ids and selected_date < max_date:
+            next_index = NextSlotIndex.load(
+                qualifying_stylist_ids, selected_date + timedelta(days=1), max_date, policy
+            )
 
-                    if not next_available_slot or first_slot < next_available_slot['slot']:
-                        next_available_slot = slot_payload
+            for stylist_id in qualifying_stylist_ids:
+                found = find_next_slot(next_index, stylist_id)
+                if not found:
+                    continue
+
+                offer, first_slot = found
+                slot_payload = {
+                    'date': localtime(first_slot).date(),
+                    'slot': first_slot,
+                    'price': offer['price'],
+                    'duration': offer['duration'],
+                    'duration_display': offer['duration_display'],
+                    'stylist': offer['stylist'],
+                    'stylist_id': stylist_id,
+                    'services': offer['services'],
+                    'auto_slot_str': first_slot.strftime('%Y-%m-%dT%H:%M'),
+                }
 
-                    pending_stylists.remove(stylist_id)
+                next_available_slots.append(slot_payload)
 
-                search_date += timedelta(days=1)
+                if not next_available_slot or first_slot < next_available_slot['slot']:
+                    next_available_slot = slot_payload
 
             next_available_slots.sort(key=lambda entry: entry['slot'])
 
@@ -1581,53 +1562,163 @@ def service_booking(request):
 def group_appointments_by_date(appointments):
     grouped = defaultdict(list)
     for a in appointments:
-        date_key = a.start_time.date()  # ← сохраняем объект date, а не строку
+        date_key = localtime(a.start_time).date()  # ← сохраняем объект date, а не строку
         grouped[date_key].append(a)
     return dict(sorted(grouped.items(), reverse=True))  # свежие даты сверху
 
 
-def get_latest_activity_timestamp(appointments):
-    timestamps = []
-    for appointment in appointments:
-        timestamps.extend(
-            filter(
-                None,
-                (
-                    appointment.created_at,
-                    getattr(appointment, "receipt_uploaded_at", None),
-                    getattr(appointment, "refund_receipt_uploaded_at", None),
-                    getattr(appointment, "refund_requested_at", None),
-                ),
+DASHBOARD_MAX_WINDOW_DAYS = 31
+
+
+def resolve_dashboard_window(request, today):
+    """Диапазон дат дашборда из ?from=&to= (или ?date=); по умолчанию вчера–завтра."""
+    default = (today - timedelta(days=1), today + timedelta(days=1))
+    date_str = request.GET.get('date')
+    from_str = request.GET.get('from') or date_str
+    to_str = request.GET.get('to') or date_str
+    if not from_str or not to_str:
+        return default
+
+    try:
+        start = datetime.strptime(from_str, "%Y-%m-%d").date()
+        end = datetime.strptime(to_str, "%Y-%m-%d").date()
+    except ValueError:
+        return default
+
+    if end < start:
+        return default
+    return start, min(end, start + timedelta(days=DASHBOARD_MAX_WINDOW_DAYS - 1))
+
+
+def local_day_bounds(start, end):
+    """Полуинтервал [начало start, начало дня после end) в локальной зоне."""
+    return (
+        make_aware(datetime.combine(start, datetime.min.time())),
+        make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time())),
+    )
+
+
+def summarize_appointment_activity(appointments_qs):
+    """Время последнего изменения и число записей — то, что сравнивают *_updates."""
+    totals = appointments_qs.aggregate(
+        latest_created=Max("created_at"),
+        latest_receipt_uploaded=Max("receipt_uploaded_at"),
+        latest_refund_receipt_uploaded=Max("refund_receipt_uploaded_at"),
+        latest_refund_requested=Max("refund_requested_at"),
+        latest_updated=Max("updated_at"),
+        total_count=Count("id"),
+    )
+    latest = max(
+        (
+            ts
+            for ts in (
+                totals.get("latest_created"),
+                totals.get("latest_updated"),
+                totals.get("latest_receipt_uploaded"),
+                totals.get("latest_refund_receipt_uploaded"),
+                totals.get("latest_refund_requested"),
+            )
+            if ts is not None
+        ),
+        default=None,
+    )
+    return latest, totals.get("total_count", 0) or 0
+
+
+def parse_calendar_month(raw, today):
+    """«YYYY-MM» → (год, месяц); по умолчанию — текущий месяц."""
+    try:
+        parsed = datetime.strptime(raw or "", "%Y-%m")
+    except ValueError:
+        return today.year, today.month
+    return parsed.year, parsed.month
+
+
+def calendar_for_months(channel, appointments_qs, months):
+    """Сводки нескольких месяцев из кэша одним словарём и их ключи «YYYY-MM»."""
+    summary = {}
+    keys = []
+    for year, month in dict.fromkeys(months):
+        summary.update(month_summary(channel, appointments_qs, year, month))
+        keys.append(f"{year:04d}-{month:02d}")
+    return summary, keys
+
+
+def done_cash_totals(appointments_qs, today):
+    """Выручка по выполненным записям: за всё время и за сегодня, агрегатами в БД."""
+    day_start, day_end = local_day_bounds(today, today)
+    done = appointments_qs.filter(status=Appointment.Status.DONE)
+    return (
+        done.revenue(),
+        done.filter(start_time__gte=day_start, start_time__lt=day_end).revenue(),
+    )
+
+
+def salon_dashboard_appointments(user, profile):
+    """Записи, которые видит администратор: все для суперпользователя, иначе своего салона."""
+    appointments_qs = Appointment.objects.all()
+    if not user.is_superuser:
+        appointments_qs = appointments_qs.filter(stylist__salon=profile.salon)
+    return appointments_qs
+
+
+def salon_updates_channel(user, profile):
+    """Канал оповещений и версий для дашборда администратора (суперпользователь — все записи)."""
+    if user.is_superuser:
+        return notifications.ALL_APPOINTMENTS
+    return notifications.salon_channel(profile.salon_id)
+
+
+def dashboard_rows(appointments_qs):
+    """Всё, что нужно для отрисовки строк дашборда, без запросов на каждую строку."""
+    return (
+        appointments_qs
+        .with_total_price()
+        .select_related("customer", "stylist__user", "payment_card")
+        .prefetch_related(
+            Prefetch(
+                "services",
+                queryset=AppointmentService.objects.select_related(
+                    "stylist_service__salon_service__service"
+                )
             )
         )
+        .order_by("-start_time")
+    )
 
-    return max(timestamps) if timestamps else None
 
+def dashboard_window_rows(appointments_qs, window_start, window_end):
+    range_start, range_end = local_day_bounds(window_start, window_end)
+    return list(dashboard_rows(
+        appointments_qs.filter(start_time__gte=range_start, start_time__lt=range_end)
+    ))
 
-def build_calendar_summary(appointments):
-    summary = defaultdict(lambda: {
-        Appointment.Status.PENDING: 0,
-        Appointment.Status.CONFIRMED: 0,
-        Appointment.Status.DONE: 0,
-    })
 
-    for appointment in appointments:
-        date_key = appointment.start_time.date().isoformat()
-        if appointment.status in {
-            Appointment.Status.PENDING,
-            Appointment.Status.CONFIRMED,
-            Appointment.Status.DONE,
-        }:
-            summary[date_key][appointment.status] += 1
-
-    formatted = {}
-    for date_key, counts in summary.items():
-        # убираем статусы без записей, чтобы не загромождать JSON
-        formatted[date_key] = {
-            status: count for status, count in counts.items() if count
-        }
+def salon_row_context(request):
+    """Контекст строки записи в дашборде админа (см. booking.appointment_rows)."""
+    return {
+        "csrf_token": get_token(request),
+        "refund_card_type_choices": SalonPaymentCard.CARD_TYPE_CHOICES,
+        "is_salon_admin": True,
+        "viewer_stylist": None,
+        "show_stylist": True,
+    }
+
+
+def stylist_row_context(request, stylist):
+    """Контекст строки записи в дашборде мастера."""
+    return {
+        "csrf_token": get_token(request),
+        "refund_card_type_choices": SalonPaymentCard.CARD_TYPE_CHOICES,
+        "show_stylist": False,
+        "stylist": stylist,
+    }
+
+
+# Курсор берётся с запасом: запись, закоммиченная чуть позже соседней, но с
+# более ранним updated_at, всё равно попадёт в следующую дельту.
+DASHBOARD_DELTA_OVERLAP = timedelta(seconds=5)
 
-    return formatted
 
 @login_required
 def dashboard_view(request):
@@ -1641,47 +1732,37 @@ def dashboard_view(request):
     if not user.is_superuser and not (profile and profile.is_salon_admin and profile.salon):
         return HttpResponseForbidden("Недостаточно прав для доступа к дашборду.")
 
-    # 🔽 Базовый queryset
-    appointments_qs = (
-        Appointment.objects
-        .select_related("customer", "stylist")  # оставляем только существующие связи
-        .filter()
-        .order_by("-start_time")
-    )
+    # 🔽 Записи салона (для суперпользователя — все); строки грузим только за окно дат
+    # Версию и курсор берём до чтения записей: изменение между ними не потеряется.
+    updates_version = notifications.channel_version(salon_updates_channel(user, profile))
+    delta_cursor = now()
+    appointments_qs = salon_dashboard_appointments(user, profile)
+    window_start, window_end = resolve_dashboard_window(request, today)
 
-    # 🔽 Фильтрация по салону
-    if not user.is_superuser:
-        appointments_qs = appointments_qs.filter(stylist__salon=profile.salon)
-
-    appointments = list(appointments_qs)
+    appointments = dashboard_window_rows(appointments_qs, window_start, window_end)
+    attach_rendered_rows(appointments, salon_row_context(request))
     grouped_appointments = group_appointments_by_date(appointments)
-    latest_activity = get_latest_activity_timestamp(appointments)
+    latest_activity, activity_count = summarize_appointment_activity(
+        appointments_qs.filter(start_time__date__gte=yesterday)
+    )
     latest_created_iso = latest_activity.isoformat() if latest_activity else ""
     appointment_view_style = 1
     if profile and getattr(profile, 'salon', None):
         appointment_view_style = getattr(profile.salon, 'appointment_view_style', 1) or 1
 
-    # 📊 Группировка и расчёты
-    visible_start = yesterday
-    visible_end = tomorrow
-
-    cash_total = sum(
-        a.get_total_price() for a in appointments if a.status == Appointment.Status.DONE
-    )
-
-    cash_today = sum(
-        a.get_total_price()
-        for a in appointments
-        if a.status == Appointment.Status.DONE and a.start_time.date() == today
-    )
+    # 📊 Итоги считает БД
+    cash_total, cash_today = done_cash_totals(appointments_qs, today)
 
     default_visible_dates = [
-        visible_start.isoformat(),
+        yesterday.isoformat(),
         today.isoformat(),
-        visible_end.isoformat(),
+        tomorrow.isoformat(),
     ]
 
-    calendar_summary = build_calendar_summary(appointments)
+    # В календарь кладём только текущий месяц, остальные JS догружает по запросу.
+    calendar_summary, calendar_months = calendar_for_months(
+        salon_updates_channel(user, profile), appointments_qs, [(today.year, today.month)]
+    )
     salon_stylists = []
     if not user.is_superuser and profile and profile.salon:
         salon_stylists = [
@@ -1703,12 +1784,18 @@ def dashboard_view(request):
     context = {
         "grouped_appointments": grouped_appointments,
         "appointments": appointments,
+        "activity_count": activity_count,
         "cash_total": cash_total,
         "cash_today": cash_today,
         "today": today,
+        "window_from": window_start,
+        "window_to": window_end,
         "default_visible_dates_json": json.dumps(default_visible_dates),
         "calendar_summary_json": json.dumps(calendar_summary),
+        "calendar_months_json": json.dumps(calendar_months),
         "latest_created_iso": latest_created_iso,
+        "delta_cursor": delta_cursor.isoformat(),
+        "updates_version": updates_version,
         "refund_card_type_choices": SalonPaymentCard.CARD_TYPE_CHOICES,
         "is_salon_admin": True,  # ← Админ салона всегда видит всё
         "viewer_stylist": None,
@@ -1728,31 +1815,34 @@ def dashboard_ajax(request):
     user = request.user
     profile = getattr(user, 'profile', None)
 
-    # Базовый queryset
-    appointments_qs = (
-        Appointment.objects
-        .select_related("customer", "stylist")
-        .filter()
-        .order_by("-start_time")
-    )
+    if not user.is_superuser and not (profile and profile.is_salon_admin and profile.salon):
+        return HttpResponseForbidden("Недостаточно прав для доступа к дашборду.")
 
-    # Фильтрация по салону — только если не суперадмин
-    if not user.is_superuser:
-        appointments_qs = appointments_qs.filter(stylist__salon=profile.salon)  # ← БЕЗОПАСНО
+    delta_cursor = now()
+    appointments_qs = salon_dashboard_appointments(user, profile)
+    window_start, window_end = resolve_dashboard_window(request, today)
 
-    appointments = list(appointments_qs)
+    appointments = dashboard_window_rows(appointments_qs, window_start, window_end)
+    attach_rendered_rows(appointments, salon_row_context(request))
     grouped_appointments = group_appointments_by_date(appointments)
-    latest_activity = get_latest_activity_timestamp(appointments)
+    latest_activity, activity_count = summarize_appointment_activity(
+        appointments_qs.filter(start_time__date__gte=yesterday)
+    )
     default_visible_dates = [
         yesterday.isoformat(),
         today.isoformat(),
         tomorrow.isoformat(),
     ]
-    calendar_summary = build_calendar_summary(appointments)
+    calendar_summary, calendar_months = calendar_for_months(
+        salon_updates_channel(user, profile),
+        appointments_qs,
+        [(today.year, today.month), (window_start.year, window_start.month), (window_end.year, window_end.month)],
+    )
 
     context = {
         "grouped_appointments": grouped_appointments,
         "csrf_token": get_token(request),
+        "show_stylist_column": True,
         "refund_card_type_choices": SalonPaymentCard.CARD_TYPE_CHOICES,
         "is_salon_admin": True,      # ← ВСЁ ВИДИТ
         "viewer_stylist": None,      # ← Нет конкретного стилиста
@@ -1762,29 +1852,158 @@ def dashboard_ajax(request):
     return JsonResponse({
         "html": html,
         "calendar": calendar_summary,
+        "calendar_months": calendar_months,
         "default_visible_dates": default_visible_dates,
+        "window": {"from": window_start.isoformat(), "to": window_end.isoformat()},
+        "cursor": delta_cursor.isoformat(),
         "today": today.isoformat(),
         "latest_created": latest_activity.isoformat() if latest_activity else None,
-        "count": len(appointments),
+        "count": activity_count,
     })
 
 
 @login_required
 @require_GET
-def dashboard_updates(request):
+def dashboard_calendar(request):
+    """Сводка календаря дашборда за месяц ?month=YYYY-MM."""
+    user = request.user
+    profile = getattr(user, 'profile', None)
+
+    if not user.is_superuser and not (profile and profile.is_salon_admin and profile.salon):
+        return HttpResponseForbidden("Недостаточно прав для доступа к дашборду.")
+
+    summary, months = calendar_for_months(
+        salon_updates_channel(user, profile),
+        salon_dashboard_appointments(user, profile),
+        [parse_calendar_month(request.GET.get("month"), now().date())],
+    )
+    return JsonResponse({"month": months[0], "days": summary})
+
+
+@login_required
+@require_GET
+def dashboard_delta(request):
+    """Записи, изменённые после курсора ?since=: строки окна и сводка календаря по их дням."""
     today = now().date()
     yesterday = today - timedelta(days=1)
     user = request.user
-    profile = getattr(user, "profile", None)
+    profile = getattr(user, 'profile', None)
 
-    appointments_qs = Appointment.objects.filter(start_time__date__gte=yesterday)
+    if not user.is_superuser and not (profile and profile.is_salon_admin and profile.salon):
+        return HttpResponseForbidden("Недостаточно прав для доступа к дашборду.")
 
+    since = parse_datetime(request.GET.get("since") or "")
+    if since is None:
+        return JsonResponse({"error": "Не указан курсор since."}, status=400)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+
+    appointments_qs = salon_dashboard_appointments(user, profile)
+    window_start, window_end = resolve_dashboard_window(request, today)
+
+    changed = list(dashboard_rows(
+        appointments_qs.filter(updated_at__gte=since - DASHBOARD_DELTA_OVERLAP)
+    ))
+
+    row_context = salon_row_context(request)
+    rows = []
+    removed = []
+    touched_dates = set()
+    for appointment in changed:
+        day = localtime(appointment.start_time).date()
+        touched_dates.add(day)
+        if not window_start <= day <= window_end:
+            removed.append(appointment.id)
+            continue
+        rows.append({
+            "id": appointment.id,
+            "date": day.isoformat(),
+            "html": render_appointment_row(appointment, row_context),
+        })
+
+    # Удалённые записи (и каскадом) строк не оставляют — только следы.
+    tombstones = AppointmentTombstone.objects.filter(deleted_at__gte=since - DASHBOARD_DELTA_OVERLAP)
     if not user.is_superuser:
-        if profile and profile.is_salon_admin and profile.salon:
-            appointments_qs = appointments_qs.filter(stylist__salon=profile.salon)
-        else:
-            return JsonResponse({"has_updates": False, "latest_created": None, "count": 0})
+        tombstones = tombstones.filter(salon_id=profile.salon_id)
+    tombstones = list(tombstones.values_list("appointment_id", "date", "deleted_at"))
+    for appointment_id, day, _ in tombstones:
+        removed.append(appointment_id)
+        touched_dates.add(day)
+
+    calendar = {day.isoformat(): {} for day in touched_dates}
+    if touched_dates:
+        calendar.update(summarize_by_day(
+            appointments_qs.filter(start_time__date__in=touched_dates)
+        ))
+
+    cursor = max(
+        [a.updated_at for a in changed] + [deleted_at for _, _, deleted_at in tombstones],
+        default=since,
+    )
+    latest_activity, activity_count = summarize_appointment_activity(
+        appointments_qs.filter(start_time__date__gte=yesterday)
+    )
+    return JsonResponse({
+        "cursor": cursor.isoformat(),
+        "rows": rows,
+        "removed": removed,
+        "calendar": calendar,
+        "window": {"from": window_start.isoformat(), "to": window_end.isoformat()},
+        "today": today.isoformat(),
+        "latest_created": latest_activity.isoformat() if latest_activity else None,
+        "count": activity_count,
+    })
+
+
+def _appointment_updates_state(appointments_qs, since_raw, last_count_raw, channel=None):
+    version = notifications.channel_version(channel) if channel else None
+    latest_created, total_count = summarize_appointment_activity(appointments_qs)
 
+    has_updates = False
+
+    if since_raw:
+        parsed_since = parse_datetime(since_raw)
+        if parsed_since is not None:
+            if timezone.is_naive(parsed_since):
+                parsed_since = timezone.make_aware(parsed_since)
+            if latest_created and latest_created > parsed_since:
+                has_updates = True
+
+    if not has_updates and last_count_raw is not None:
+        try:
+            last_count_value = int(last_count_raw)
+        except (TypeError, ValueError):
+            last_count_value = None
+
+        if last_count_value is not None and total_count != last_count_value:
+            has_updates = True
+
+    payload = {
+        "has_updates": has_updates,
+        "latest_created": latest_created.isoformat() if latest_created else None,
+        "count": total_count,
+    }
+    if version is not None:
+        payload["version"] = str(version)
+    return payload
+
+
+def _appointment_version_state(appointments_qs, channel, known_version):
+    """С ?version=N: без изменений — только чтение версии из кэша, без агрегатов по записям."""
+    version = notifications.channel_version(channel)
+    # Строкой: версия больше 2**53 и потеряла бы точность в JS-числе.
+    if version == known_version:
+        return {"has_updates": False, "version": str(version)}
+    payload = _appointment_updates_state(appointments_qs, None, None)
+    payload.update(has_updates=True, version=str(version))
+    return payload
+
+
+async def long_poll_appointment_updates(request, appointments_qs, channels):
+    """Ответ *_updates; с ?wait=1 ждёт оповещения об изменении, а не опрашивает БД.
+
+    Клиент, приславший ?version=N, получает ответ по версии первого канала.
+    """
     wait_for_updates = request.GET.get("wait") in {"1", "true", "True"}
 
     timeout_seconds = 25
@@ -1795,68 +2014,201 @@ def dashboard_updates(request):
         except (TypeError, ValueError):
             timeout_seconds = 25
 
-    deadline = timezone.now() + timedelta(seconds=timeout_seconds) if wait_for_updates else None
-
-    since_raw = request.GET.get("since")
-    last_count_raw = request.GET.get("count")
+    try:
+        known_version = int(request.GET["version"])
+    except (KeyError, TypeError, ValueError):
+        known_version = None
 
-    def evaluate_changes():
-        totals_local = appointments_qs.aggregate(
-            latest_created=Max("created_at"),
-            latest_receipt_uploaded=Max("receipt_uploaded_at"),
-            latest_refund_receipt_uploaded=Max("refund_receipt_uploaded_at"),
-            latest_refund_requested=Max("refund_requested_at"),
-            total_count=Count("id"),
-        )
-        latest_created_local = max(
-            (
-                ts
-                for ts in (
-                    totals_local.get("latest_created"),
-                    totals_local.get("latest_receipt_uploaded"),
-                    totals_local.get("latest_refund_receipt_uploaded"),
-                    totals_local.get("latest_refund_requested"),
-                )
-                if ts is not None
-            ),
-            default=None,
+    if known_version is not None:
+        read_state = partial(sync_to_async(_appointment_version_state), appointments_qs, channels[0], known_version)
+    else:
+        read_state = partial(
+            sync_to_async(_appointment_updates_state),
+            appointments_qs,
+            request.GET.get("since"),
+            request.GET.get("count"),
+            channels[0],
         )
-        total_count_local = totals_local.get("total_count", 0) or 0
 
-        has_updates_local = False
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_seconds
+    while True:
+        # Подписка раньше чтения: изменение между ними разбудит ожидание сразу.
+        with notifications.subscribe(channels) as subscription:
+            payload = await read_state()
+            remaining = deadline - loop.time()
+            if not wait_for_updates or payload["has_updates"] or remaining <= 0:
+                return JsonResponse(payload)
+            await subscription.wait(min(remaining, notifications.UPDATES_RECHECK_SECONDS))
+
+
+SSE_RETRY_MILLISECONDS = 5000
+
+
+def _sse_message(kind, payload, event_id=None):
+    lines = [f"id: {event_id}"] if event_id else []
+    lines.append(f"event: {kind}")
+    # json.dumps экранирует переводы строк, так что data всегда одной строкой.
+    lines.append("data: " + json.dumps(payload, ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
+
+
+def _appointment_stream_events(appointments_qs, row_context, messages):
+    """Сообщения шины → события SSE: строка в разметке зрителя и сводка календаря по её дню."""
+    latest = {}
+    for message in messages:
+        previous = latest.get(message["id"])
+        # «created» важнее последующих правок той же записи: по нему звучит сигнал.
+        if previous is None or previous["kind"] != "created":
+            latest[message["id"]] = message
+
+    live_ids = [pk for pk, message in latest.items() if message["kind"] != "deleted"]
+    rows = {}
+    if live_ids:
+        rows = {a.id: a for a in dashboard_rows(appointments_qs.filter(pk__in=live_ids))}
+
+    dates = {message["date"] for message in latest.values() if message.get("date")}
+    dates.update(localtime(a.start_time).date().isoformat() for a in rows.values())
+    calendar = {day: {} for day in dates}
+    if dates:
+        calendar.update(summarize_by_day(appointments_qs.filter(start_time__date__in=dates)))
+
+    events = []
+    for pk, message in latest.items():
+        appointment = rows.get(pk)
+        if appointment is None:
+            day = message.get("date")
+            events.append(("deleted", {
+                "id": pk,
+                "date": day,
+                "calendar": {day: calendar.get(day, {})} if day else {},
+            }, None))
+            continue
+
+        day = localtime(appointment.start_time).date().isoformat()
+        events.append((message["kind"], {
+            "id": pk,
+            "date": day,
+            "status": appointment.status,
+            "updated_at": appointment.updated_at.isoformat(),
+            "html": render_appointment_row(appointment, row_context),
+            "calendar": {day: calendar.get(day, {})},
+        }, appointment.updated_at))
+    return events
+
+
+def _appointment_stream_catch_up(appointments_qs, since, sent):
+    """Изменения после ``since``, не пришедшие через шину (другой процесс, .update())."""
+    changed = (
+        appointments_qs
+        .filter(updated_at__gte=since - DASHBOARD_DELTA_OVERLAP)
+        .values_list("id", "updated_at", "start_time")
+    )
+    return [
+        {"id": pk, "kind": "updated", "date": localtime(start).date().isoformat()}
+        for pk, updated_at, start in changed
+        if sent.get(pk) != updated_at
+    ]
 
-        if since_raw:
-            parsed_since = parse_datetime(since_raw)
-            if parsed_since is not None:
-                if timezone.is_naive(parsed_since):
-                    parsed_since = timezone.make_aware(parsed_since)
-                if latest_created_local and latest_created_local > parsed_since:
-                    has_updates_local = True
 
-        if not has_updates_local and last_count_raw is not None:
-            try:
-                last_count_value = int(last_count_raw)
-            except (TypeError, ValueError):
-                last_count_value = None
+async def appointment_event_stream(appointments_qs, channels, row_context, since=None):
+    build_events = sync_to_async(_appointment_stream_events)
+    catch_up = sync_to_async(_appointment_stream_catch_up)
+    cursor = since or now()
+    sent = {}
+
+    with notifications.subscribe(channels) as subscription:
+        yield f"retry: {SSE_RETRY_MILLISECONDS}\n\n"
+        messages = await catch_up(appointments_qs, cursor, sent) if since else []
+        while True:
+            if messages:
+                for kind, payload, updated_at in await build_events(appointments_qs, row_context, messages):
+                    if updated_at is not None:
+                        sent[payload["id"]] = updated_at
+                        cursor = max(cursor, updated_at)
+                    yield _sse_message(kind, payload, cursor.isoformat())
+                horizon = cursor - DASHBOARD_DELTA_OVERLAP
+                sent = {pk: ts for pk, ts in sent.items() if ts >= horizon}
+            else:
+                yield ": ping\n\n"
 
-            if last_count_value is not None and total_count_local != last_count_value:
-                has_updates_local = True
+            messages = await subscription.next_messages(notifications.UPDATES_RECHECK_SECONDS)
+            if not messages:
+                # Таймаут или переполнение очереди — сверяемся с БД по курсору.
+                messages = await catch_up(appointments_qs, cursor, sent)
 
-        return has_updates_local, latest_created_local, total_count_local
 
-    while True:
-        has_updates, latest_created, total_count = evaluate_changes()
+def streams_supported(request):
+    """SSE-поток бесконечен: под WSGI он занял бы воркер навсегда (см. salon_booking/asgi.py)."""
+    return isinstance(request, ASGIRequest)
 
-        payload = {
-            "has_updates": has_updates,
-            "latest_created": latest_created.isoformat() if latest_created else None,
-            "count": total_count,
-        }
 
-        if not wait_for_updates or has_updates or timezone.now() >= deadline:
-            return JsonResponse(payload)
+def appointment_stream_response(request, appointments_qs, channels, row_context):
+    """SSE-ответ; после переподключения продолжает с Last-Event-ID (курсор updated_at)."""
+    since = parse_datetime(request.GET.get("since") or request.headers.get("Last-Event-ID") or "")
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+
+    response = StreamingHttpResponse(
+        appointment_event_stream(appointments_qs, channels, row_context, since),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _salon_updates_scope(request):
+    user = request.user
+    yesterday = now().date() - timedelta(days=1)
+    appointments_qs = Appointment.objects.filter(start_time__date__gte=yesterday)
+    profile = getattr(user, "profile", None)
+    if user.is_superuser:
+        return appointments_qs, [salon_updates_channel(user, profile)]
+
+    if profile and profile.is_salon_admin and profile.salon_id:
+        return (
+            appointments_qs.filter(stylist__salon_id=profile.salon_id),
+            [salon_updates_channel(user, profile)],
+        )
+    return JsonResponse({"has_updates": False, "latest_created": None, "count": 0})
+
+
+def _salon_stream_scope(request):
+    user = request.user
+    profile = getattr(user, "profile", None)
+    if not user.is_superuser and not (profile and profile.is_salon_admin and profile.salon):
+        return HttpResponseForbidden("Недостаточно прав для доступа к дашборду.")
+
+    channels = [salon_updates_channel(user, profile)]
+    return salon_dashboard_appointments(user, profile), channels, salon_row_context(request)
 
-        time.sleep(1)
+
+# Асинхронные: под ASGI ожидание изменений не держит поток воркера
+# (см. salon_booking/asgi.py).
+@login_required
+@require_GET
+async def dashboard_updates(request):
+    scope = await sync_to_async(_salon_updates_scope)(request)
+    if isinstance(scope, HttpResponse):
+        return scope
+    appointments_qs, channels = scope
+    return await long_poll_appointment_updates(request, appointments_qs, channels)
+
+
+@login_required
+@require_GET
+async def dashboard_stream(request):
+    """SSE-поток изменений записей салона: created, status, receipt, refund, updated, deleted.
+
+    Без ASGI отвечает 204: EventSource закрывается, и дашборд переходит на long-poll.
+    """
+    if not streams_supported(request):
+        return HttpResponse(status=204)
+    scope = await sync_to_async(_salon_stream_scope)(request)
+    if isinstance(scope, HttpResponse):
+        return scope
+    return appointment_stream_response(request, *scope)
 
 
 @method_decorator(login_required, name="dispatch")
@@ -1905,91 +2257,62 @@ class AppointmentActionView(View):
 
         return JsonResponse({"status": "ok", "action": action})
 
+class _CsvEcho:
+    """Псевдобуфер для csv.writer: записанная строка сразу уходит в ответ."""
+
+    def write(self, value):
+        return value
+
+
+def csv_streaming_response(filename, header, rows):
+    """CSV для Excel (BOM, «;») потоком: строки пишутся по мере чтения из БД."""
+    writer = csv.writer(_CsvEcho(), delimiter=";")
+
+    def lines():
+        yield "\ufeff" + writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def report_period_filename(prefix, kind, start_date, end_date):
+    period = "-".join(d.isoformat() for d in (start_date, end_date) if d) or "all"
+    return f"{prefix}-{kind}-{period}.csv"
+
+
 @method_decorator(login_required, name="dispatch")
 class ReportView(View):
     template_name = "reports.html"
 
-    def get(self, request):
-        tz = timezone.get_current_timezone()
-
-        def parse_date(raw):
-            try:
-                return dt.datetime.strptime(raw, "%Y-%m-%d").date()
-            except (TypeError, ValueError):
-                return None
+    @staticmethod
+    def parse_date(raw):
+        try:
+            return dt.datetime.strptime(raw, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return None
 
-        start_raw = request.GET.get("start")
-        end_raw = request.GET.get("end")
-        start_date = parse_date(start_raw)
-        end_date = parse_date(end_raw)
+    def get(self, request):
+        start_date = self.parse_date(request.GET.get("start"))
+        end_date = self.parse_date(request.GET.get("end"))
 
-        qs = Appointment.objects.select_related(
-            "stylist", "stylist__user"
-        ).prefetch_related(
-            "services__stylist_service__salon_service__service"
-        ).filter(status="D")
+        stats_qs = DailySalonStats.objects.all()
 
         profile = getattr(request.user, "profile", None)
         if not request.user.is_superuser:
             if not (profile and profile.is_salon_admin and profile.salon):
                 return render(request, "403.html", status=403)
-            qs = qs.filter(stylist__salon=profile.salon)
+            stats_qs = stats_qs.filter(salon=profile.salon)
 
         if start_date:
-            start_dt = dt.datetime.combine(start_date, dt.time.min).replace(tzinfo=tz)
-            qs = qs.filter(start_time__gte=start_dt)
+            stats_qs = stats_qs.filter(date__gte=start_date)
         if end_date:
-            end_dt = dt.datetime.combine(end_date, dt.time.max).replace(tzinfo=tz)
-            qs = qs.filter(start_time__lte=end_dt)
-
-        # СБОР ЦЕН: пары (stylist_id, service_id)
-        pairs = set()
-        for a in qs:
-            for s in a.services.all():
-                ss = s.stylist_service
-                if ss and ss.salon_service:
-                    pairs.add((ss.stylist_id, ss.salon_service.service_id))
-
-        price_map = {
-            (s.stylist_id, s.salon_service.service_id): s.price
-            for s in StylistService.objects.filter(
-                stylist_id__in=[p[0] for p in pairs],
-                salon_service__service_id__in=[p[1] for p in pairs]
-            )
-        }
-
-        stats = defaultdict(lambda: {
-            "clients": 0,
-            "revenue": Decimal("0"),
-            "stylists": defaultdict(lambda: Decimal("0"))
-        })
-        overall_stats = defaultdict(lambda: {"clients": 0, "revenue": Decimal("0")})
-
-        for ap in qs:
-            day = timezone.localtime(ap.start_time).date()
-            for s in ap.services.all():
-                ss = s.stylist_service
-                if ss and ss.salon_service:
-                    service_id = ss.salon_service.service_id
-                    price = price_map.get((ss.stylist_id, service_id), Decimal("0"))
-                    name = ap.stylist.user.get_full_name() or str(ap.stylist)
+            stats_qs = stats_qs.filter(date__lte=end_date)
 
-                    stats[day]["clients"] += 1
-                    stats[day]["revenue"] += price
-                    stats[day]["stylists"][name] += price
-
-                    overall_stats[name]["clients"] += 1
-                    overall_stats[name]["revenue"] += price
-
-        daily_stats = [
-            {
-                "day": day,
-                "clients": data["clients"],
-                "revenue": data["revenue"],
-                "stylists": dict(data["stylists"]),
-            }
-            for day, data in sorted(stats.items(), reverse=True)
-        ]
+        # Суммы по дням и мастерам — из свёртки DailySalonStats, не из записей.
+        daily_stats, overall_stats = revenue_report(stats_qs)
 
         total_revenue = sum(d["revenue"] for d in daily_stats)
         total_clients = sum(d["clients"] for d in daily_stats)
@@ -2002,14 +2325,53 @@ class ReportView(View):
             "page_obj": page_obj,
             "daily_stats": daily_stats,
             "total_revenue": total_revenue,
-            "overall_stats": dict(overall_stats),
+            "overall_stats": overall_stats,
             "total_clients": total_clients,
         })
 
+
+class ReportExportView(ReportView):
+    """CSV отчёта салона за ?start=&end=: ?kind=days — по дням и мастерам, appointments — по записям."""
+
+    def get(self, request):
+        start_date = self.parse_date(request.GET.get("start"))
+        end_date = self.parse_date(request.GET.get("end"))
+        kind = request.GET.get("kind", "days")
+        if kind not in {"days", "appointments"}:
+            return HttpResponse("Неизвестный вид выгрузки.", status=400)
+
+        profile = getattr(request.user, "profile", None)
+        if not request.user.is_superuser and not (profile and profile.is_salon_admin and profile.salon):
+            return render(request, "403.html", status=403)
+        salon = None if request.user.is_superuser else profile.salon
+
+        filename = report_period_filename("report", kind, start_date, end_date)
+        if kind == "days":
+            stats_qs = DailySalonStats.objects.all()
+            if salon:
+                stats_qs = stats_qs.filter(salon=salon)
+            if start_date:
+                stats_qs = stats_qs.filter(date__gte=start_date)
+            if end_date:
+                stats_qs = stats_qs.filter(date__lte=end_date)
+            return csv_streaming_response(filename, DAILY_EXPORT_HEADER, daily_export_rows(stats_qs))
+
+        appointments_qs = Appointment.objects.all()
+        if salon:
+            appointments_qs = appointments_qs.filter(stylist__salon=salon)
+        if start_date:
+            appointments_qs = appointments_qs.filter(start_time__gte=local_day_bounds(start_date, start_date)[0])
+        if end_date:
+            appointments_qs = appointments_qs.filter(start_time__lt=local_day_bounds(end_date, end_date)[1])
+        return csv_streaming_response(
+            filename, APPOINTMENT_EXPORT_HEADER, appointment_export_rows(appointments_qs)
+        )
+
 @login_required(login_url='login')
 def my_appointments(request):
     appointments_qs = (
         Appointment.objects
+        .with_total_price()
         .select_related("stylist", "stylist__salon", "payment_card")
         .prefetch_related("services__stylist_service__salon_service__service")
         .filter(customer=request.user)
@@ -2339,35 +2701,21 @@ def stylist_dashboard(request):
     today = now().date()
     yesterday = today - timedelta(days=1)
     tomorrow = today + timedelta(days=1)
+    updates_version = notifications.channel_version(notifications.stylist_channel(stylist.pk))
 
-    appointments_qs = (
-        Appointment.objects
-        .filter(stylist=stylist)
-        .select_related("customer", "payment_card")
-        .prefetch_related(
-            Prefetch(
-                "services",
-                queryset=AppointmentService.objects.select_related(
-                    "stylist_service__salon_service__service"
-                )
-            )
-        )
-        .order_by("-start_time")
-    )
+    # Строки — только за окно дат, остальные дни JS догружает через stylist_dashboard_ajax.
+    appointments_qs = Appointment.objects.filter(stylist=stylist)
+    window_start, window_end = resolve_dashboard_window(request, today)
 
-    appointments = list(appointments_qs)
+    appointments = dashboard_window_rows(appointments_qs, window_start, window_end)
+    attach_rendered_rows(appointments, stylist_row_context(request, stylist))
     grouped_appointments = group_appointments_by_date(appointments)
-    latest_activity = get_latest_activity_timestamp(appointments)
+    latest_activity, activity_count = summarize_appointment_activity(
+        appointments_qs.filter(start_time__date__gte=yesterday)
+    )
     latest_created_iso = latest_activity.isoformat() if latest_activity else ""
 
-    cash_total = sum(
-        a.get_total_price() for a in appointments if a.status == Appointment.Status.DONE
-    )
-    cash_today = sum(
-        a.get_total_price()
-        for a in appointments
-        if a.status == Appointment.Status.DONE and a.start_time.date() == today
-    )
+    cash_total, cash_today = done_cash_totals(appointments_qs, today)
 
     default_visible_dates = [
         yesterday.isoformat(),
@@ -2375,17 +2723,26 @@ def stylist_dashboard(request):
         tomorrow.isoformat(),
     ]
 
-    calendar_summary = build_calendar_summary(appointments)
+    calendar_summary, calendar_months = calendar_for_months(
+        notifications.stylist_channel(stylist.pk),
+        appointments_qs,
+        [(today.year, today.month)],
+    )
 
     context = {
         "grouped_appointments": grouped_appointments,
         "appointments": appointments,
+        "activity_count": activity_count,
         "cash_total": cash_total,
         "cash_today": cash_today,
         "today": today,
+        "window_from": window_start,
+        "window_to": window_end,
         "default_visible_dates_json": json.dumps(default_visible_dates),
         "calendar_summary_json": json.dumps(calendar_summary),
+        "calendar_months_json": json.dumps(calendar_months),
         "latest_created_iso": latest_created_iso,
+        "updates_version": updates_version,
         "total_cash": cash_today,
         "refund_card_type_choices": SalonPaymentCard.CARD_TYPE_CHOICES,
         "stylist": stylist,
@@ -2397,6 +2754,7 @@ def stylist_dashboard(request):
 @login_required
 @require_GET
 def stylist_dashboard_ajax(request):
+    """Строки дашборда мастера за ?from=&to= (или ?date=), как у dashboard_ajax."""
     try:
         stylist = request.user.stylist_profile
     except Stylist.DoesNotExist:
@@ -2406,30 +2764,25 @@ def stylist_dashboard_ajax(request):
     yesterday = today - timedelta(days=1)
     tomorrow = today + timedelta(days=1)
 
-    appointments_qs = (
-        Appointment.objects
-        .filter(stylist=stylist)
-        .select_related("customer", "payment_card")
-        .prefetch_related(
-            Prefetch(
-                "services",
-                queryset=AppointmentService.objects.select_related(
-                    "stylist_service__salon_service__service"
-                )
-            )
-        )
-        .order_by("-start_time")
-    )
+    appointments_qs = Appointment.objects.filter(stylist=stylist)
+    window_start, window_end = resolve_dashboard_window(request, today)
 
-    appointments = list(appointments_qs)
+    appointments = dashboard_window_rows(appointments_qs, window_start, window_end)
+    attach_rendered_rows(appointments, stylist_row_context(request, stylist))
     grouped_appointments = group_appointments_by_date(appointments)
-    latest_activity = get_latest_activity_timestamp(appointments)
+    latest_activity, activity_count = summarize_appointment_activity(
+        appointments_qs.filter(start_time__date__gte=yesterday)
+    )
     default_visible_dates = [
         yesterday.isoformat(),
         today.isoformat(),
         tomorrow.isoformat(),
     ]
-    calendar_summary = build_calendar_summary(appointments)
+    calendar_summary, calendar_months = calendar_for_months(
+        notifications.stylist_channel(stylist.pk),
+        appointments_qs,
+        [(today.year, today.month), (window_start.year, window_start.month), (window_end.year, window_end.month)],
+    )
 
     context = {
         "grouped_appointments": grouped_appointments,
@@ -2443,101 +2796,79 @@ def stylist_dashboard_ajax(request):
     return JsonResponse({
         "html": html,
         "calendar": calendar_summary,
+        "calendar_months": calendar_months,
         "default_visible_dates": default_visible_dates,
+        "window": {"from": window_start.isoformat(), "to": window_end.isoformat()},
         "today": today.isoformat(),
         "latest_created": latest_activity.isoformat() if latest_activity else None,
-        "count": len(appointments),
+        "count": activity_count,
     })
 
 
 @login_required
 @require_GET
-def stylist_dashboard_updates(request):
+def stylist_dashboard_calendar(request):
+    """Сводка календаря мастера за месяц ?month=YYYY-MM."""
     try:
         stylist = request.user.stylist_profile
     except Stylist.DoesNotExist:
-        return JsonResponse({"has_updates": False, "latest_created": None, "count": 0})
+        return HttpResponseForbidden("Профиль мастера не найден.")
 
-    today = now().date()
-    yesterday = today - timedelta(days=1)
+    summary, months = calendar_for_months(
+        notifications.stylist_channel(stylist.pk),
+        Appointment.objects.filter(stylist=stylist),
+        [parse_calendar_month(request.GET.get("month"), now().date())],
+    )
+    return JsonResponse({"month": months[0], "days": summary})
 
+
+def _stylist_updates_scope(request):
+    try:
+        stylist = request.user.stylist_profile
+    except Stylist.DoesNotExist:
+        return JsonResponse({"has_updates": False, "latest_created": None, "count": 0})
+
+    yesterday = now().date() - timedelta(days=1)
     appointments_qs = Appointment.objects.filter(
         stylist=stylist,
         start_time__date__gte=yesterday,
     )
+    return appointments_qs, [notifications.stylist_channel(stylist.pk)]
 
-    wait_for_updates = request.GET.get("wait") in {"1", "true", "True"}
-
-    timeout_seconds = 25
-    requested_timeout = request.GET.get("timeout")
-    if requested_timeout:
-        try:
-            timeout_seconds = max(5, min(60, int(requested_timeout)))
-        except (TypeError, ValueError):
-            timeout_seconds = 25
-
-    deadline = timezone.now() + timedelta(seconds=timeout_seconds) if wait_for_updates else None
-
-    since_raw = request.GET.get("since")
-    last_count_raw = request.GET.get("count")
-
-    def evaluate_changes():
-        totals_local = appointments_qs.aggregate(
-            latest_created=Max("created_at"),
-            latest_receipt_uploaded=Max("receipt_uploaded_at"),
-            latest_refund_receipt_uploaded=Max("refund_receipt_uploaded_at"),
-            latest_refund_requested=Max("refund_requested_at"),
-            total_count=Count("id"),
-        )
-        latest_created_local = max(
-            (
-                ts
-                for ts in (
-                    totals_local.get("latest_created"),
-                    totals_local.get("latest_receipt_uploaded"),
-                    totals_local.get("latest_refund_receipt_uploaded"),
-                    totals_local.get("latest_refund_requested"),
-                )
-                if ts is not None
-            ),
-            default=None,
-        )
-        total_count_local = totals_local.get("total_count", 0) or 0
-
-        has_updates_local = False
-
-        if since_raw:
-            parsed_since = parse_datetime(since_raw)
-            if parsed_since is not None:
-                if timezone.is_naive(parsed_since):
-                    parsed_since = timezone.make_aware(parsed_since)
-                if latest_created_local and latest_created_local > parsed_since:
-                    has_updates_local = True
-
-        if not has_updates_local and last_count_raw is not None:
-            try:
-                last_count_value = int(last_count_raw)
-            except (TypeError, ValueError):
-                last_count_value = None
 
-            if last_count_value is not None and total_count_local != last_count_value:
-                has_updates_local = True
+def _stylist_stream_scope(request):
+    try:
+        stylist = request.user.stylist_profile
+    except Stylist.DoesNotExist:
+        return HttpResponseForbidden("Профиль мастера не найден.")
 
-        return has_updates_local, latest_created_local, total_count_local
+    return (
+        Appointment.objects.filter(stylist=stylist),
+        [notifications.stylist_channel(stylist.pk)],
+        stylist_row_context(request, stylist),
+    )
 
-    while True:
-        has_updates, latest_created, total_count = evaluate_changes()
 
-        payload = {
-            "has_updates": has_updates,
-            "latest_created": latest_created.isoformat() if latest_created else None,
-            "count": total_count,
-        }
+@login_required
+@require_GET
+async def stylist_dashboard_stream(request):
+    """SSE-поток изменений записей мастера; без ASGI — 204, как у салона."""
+    if not streams_supported(request):
+        return HttpResponse(status=204)
+    scope = await sync_to_async(_stylist_stream_scope)(request)
+    if isinstance(scope, HttpResponse):
+        return scope
+    return appointment_stream_response(request, *scope)
 
-        if not wait_for_updates or has_updates or timezone.now() >= deadline:
-            return JsonResponse(payload)
 
-        time.sleep(1)
+@login_required
+@require_GET
+async def stylist_dashboard_updates(request):
+    scope = await sync_to_async(_stylist_updates_scope)(request)
+    if isinstance(scope, HttpResponse):
+        return scope
+    appointments_qs, channels = scope
+    return await long_poll_appointment_updates(request, appointments_qs, channels)
 
 
 @require_POST
@@ -2749,16 +3080,7 @@ class ManualAppointmentCreateView(View):
         end_time = start_time + total_duration
 
         # Проверка на пересечение по времени
-        if (
-            Appointment.objects
-            .filter(
-                stylist=stylist,
-                start_time__lt=end_time,
-                end_time__gt=start_time,
-            )
-            .exclude(status=Appointment.Status.CANCELLED)
-            .exists()
-        ):
+        if find_slot_conflict(stylist, start_time, end_time, check_schedule=False):
             messages.error(request, "Мастер занят в это время.")
             return redirect('manual_appointment')
 
@@ -2769,7 +3091,7 @@ class ManualAppointmentCreateView(View):
         guest_phone = normalize_uzbek_phone(guest_phone_input) if guest_phone_input else ''
 
         # Создаём запись
-        appointment = Appointment.objects.create(
+        appointment = Appointment(
             stylist=stylist,
             start_time=start_time,
             end_time=end_time,
@@ -2777,13 +3099,19 @@ class ManualAppointmentCreateView(View):
             guest_phone=guest_phone,
             customer=None
         )
-
-        # Привязываем все услуги
-        for ss in stylist_services:
-            AppointmentService.objects.create(
-                appointment=appointment,
-                stylist_service=ss
-            )
+        appointment.mark_slot_checked()
+        try:
+            with transaction.atomic():
+                appointment.save()
+                # Привязываем все услуги
+                for ss in stylist_services:
+                    AppointmentService.objects.create(
+                        appointment=appointment,
+                        stylist_service=ss
+                    )
+        except IntegrityError:
+            messages.error(request, "Мастер занят в это время.")
+            return redirect('manual_appointment')
 
         messages.success(request, "Запись успешно добавлена.")
         return redirect('dashboard')
@@ -2826,8 +3154,6 @@ def get_available_times(request):
     except:
         return JsonResponse({'times': []})
 
-    tz = pytz.timezone("Asia/Tashkent")
-
     stylist = get_object_or_404(Stylist, id=stylist_id)
     service = get_object_or_404(Service, id=service_id)
 
@@ -2841,59 +3167,17 @@ def get_available_times(request):
     stylist_service = StylistService.objects.filter(
         stylist=stylist,
         salon_service__service=service
-    ).first()
+    ).select_related('salon_service').first()
 
     if not stylist_service:
         return JsonResponse({'times': []})  # Мастер не оказывает услугу
 
     duration = stylist_service.salon_service.duration
-    working_hours = WorkingHour.objects.filter(stylist=stylist, weekday=date.weekday())
-
-    available_slots = []
-    slot = timedelta(minutes=15)
-
-    for wh in working_hours:
-        start_dt = datetime.combine(date, wh.start_time)
-        end_dt = datetime.combine(date, wh.end_time)
-
-        break_periods = BreakPeriod.objects.filter(working_hour=wh)
-
-        while start_dt + duration <= end_dt:
-            st_aware = tz.localize(start_dt)
-            end_aware = st_aware + duration
-
-            # Проверка на пересечение с другими записями
-            overlap = (
-                Appointment.objects
-                .filter(
-                    stylist=stylist,
-                    start_time__lt=end_aware,
-                    end_time__gt=st_aware,
-                )
-                .exclude(status=Appointment.Status.CANCELLED)
-                .exists()
-            )
-
-            # Проверка на пересечение с перерывами
-            in_break = any(
-                (start_dt < datetime.combine(date, bp.end_time) and
-                 start_dt + duration > datetime.combine(date, bp.start_time))
-                for bp in break_periods
-            )
-
-            # ✅ Проверка на блокировку времени стилистом
-            in_dayoff = StylistDayOff.objects.filter(
-                stylist=stylist,
-                date=date
-            ).filter(
-                Q(from_time__isnull=True, to_time__isnull=True) |  # Весь день
-                Q(from_time__lt=(start_dt + duration).time(), to_time__gt=start_dt.time())  # Частичная
-            ).exists()
-
-            if not overlap and not in_break and not in_dayoff:
-                available_slots.append(start_dt.strftime("%H:%M"))
-
-            start_dt += slot
+    policy = SlotPolicy.for_salon(stylist.salon, [stylist_service.salon_service])
+    available_slots = [
+        localtime(slot).strftime("%H:%M")
+        for slot in load_stylist_day(stylist, date).free_starts(duration, policy)
+    ]
 
     return JsonResponse({'times': available_slots})
 
@@ -2930,8 +3214,7 @@ class StylistManualAppointmentCreateView(View):
             messages.error(request, "Неверная дата или время.")
             return redirect('stylist_manual_appointment')
 
-        tz = pytz.timezone("Asia/Tashkent")
-        start_time = tz.localize(start_time)
+        start_time = make_aware(start_time)
 
         # Получаем все StylistService-объекты
         stylist_services = StylistService.objects.filter(
@@ -2947,18 +3230,7 @@ class StylistManualAppointmentCreateView(View):
         total_duration = sum((s.salon_service.duration for s in stylist_services), timedelta())
         end_time = start_time + total_duration
 
-        overlap = (
-            Appointment.objects
-            .filter(
-                stylist=stylist,
-                start_time__lt=end_time,
-                end_time__gt=start_time,
-            )
-            .exclude(status=Appointment.Status.CANCELLED)
-            .exists()
-        )
-
-        if overlap:
+        if find_slot_conflict(stylist, start_time, end_time, check_schedule=False):
             messages.error(request, "Выбранное время занято.")
             return redirect('stylist_manual_appointment')
 
@@ -2969,7 +3241,7 @@ class StylistManualAppointmentCreateView(View):
         guest_phone = normalize_uzbek_phone(guest_phone_input) if guest_phone_input else ''
 
         # ✅ Создаём Appointment
-        appointment = Appointment.objects.create(
+        appointment = Appointment(
             stylist=stylist,
             start_time=start_time,
             end_time=end_time,
@@ -2978,13 +3250,19 @@ class StylistManualAppointmentCreateView(View):
             guest_phone=guest_phone,
             customer=None
         )
-
-        # ✅ Привязываем все услуги
-        for s in stylist_services:
-            AppointmentService.objects.create(
-                appointment=appointment,
-                stylist_service=s
-            )
+        appointment.mark_slot_checked()
+        try:
+            with transaction.atomic():
+                appointment.save()
+                # ✅ Привязываем все услуги
+                for s in stylist_services:
+                    AppointmentService.objects.create(
+                        appointment=appointment,
+                        stylist_service=s
+                    )
+        except IntegrityError:
+            messages.error(request, "Выбранное время занято.")
+            return redirect('stylist_manual_appointment')
 
         messages.success(request, "Запись успешно создана.")
         return redirect('stylist_dashboard')
@@ -3020,52 +3298,11 @@ def get_available_times_for_stylist(request):
             return JsonResponse({'times': []})
 
         duration = stylist_service.salon_service.duration
-        working_hours = WorkingHour.objects.filter(stylist=stylist, weekday=date.weekday())
-
-        tz = pytz.timezone("Asia/Tashkent")
-        slot = timedelta(minutes=15)
-        available_slots = []
-
-        for wh in working_hours:
-            start_dt = datetime.combine(date, wh.start_time)
-            end_dt = datetime.combine(date, wh.end_time)
-            break_periods = BreakPeriod.objects.filter(working_hour=wh)
-
-            while start_dt + duration <= end_dt:
-                st_aware = tz.localize(start_dt)
-
-                # Проверка на пересечение с другими записями
-                overlap = (
-                    Appointment.objects
-                    .filter(
-                        stylist=stylist,
-                        start_time__lt=st_aware + duration,
-                        end_time__gt=st_aware,
-                    )
-                    .exclude(status=Appointment.Status.CANCELLED)
-                    .exists()
-                )
-
-                # Проверка на пересечение с перерывами
-                in_break = any(
-                    datetime.combine(date, bp.start_time) < start_dt + duration and
-                    datetime.combine(date, bp.end_time) > start_dt
-                    for bp in break_periods
-                )
-
-                # ✅ Проверка на блокировку времени стилистом
-                in_dayoff = StylistDayOff.objects.filter(
-                    stylist=stylist,
-                    date=date
-                ).filter(
-                    Q(from_time__isnull=True, to_time__isnull=True) |  # Весь день
-                    Q(from_time__lt=(start_dt + duration).time(), to_time__gt=start_dt.time())  # Частичная блокировка
-                ).exists()
-
-                if not overlap and not in_break and not in_dayoff:
-                    available_slots.append(start_dt.strftime("%H:%M"))
-
-                start_dt += slot
+        policy = SlotPolicy.for_salon(stylist.salon, [stylist_service.salon_service])
+        available_slots = [
+            localtime(slot).strftime("%H:%M")
+            for slot in load_stylist_day(stylist, date).free_starts(duration, policy)
+        ]
 
         return JsonResponse({'times': available_slots})
 
@@ -3110,6 +3347,7 @@ def stylist_reports(request):
                     start_time__date__range=(start, end),
                     status=Appointment.Status.DONE
                 )
+                .with_total_price()
                 .prefetch_related(
                     Prefetch(
                         'services',
@@ -3118,13 +3356,17 @@ def stylist_reports(request):
                 )
             )
 
-            total_clients = report_appointments.count()
             period_label = f"{start.strftime('%d.%m.%Y')} — {end.strftime('%d.%m.%Y')}"
 
-            for a in report_appointments:
-                total_cash += a.get_total_price()
-
-            worked_days = len({a.start_time.date() for a in report_appointments})
+            # Итоги — из свёртки DailySalonStats: не больше строки на день.
+            totals = (
+                DailySalonStats.objects
+                .filter(stylist=stylist, date__range=(start, end))
+                .aggregate(clients=Sum("clients"), revenue=Sum("revenue"), days=Count("id"))
+            )
+            total_clients = totals["clients"] or 0
+            total_cash = totals["revenue"] or Decimal("0")
+            worked_days = totals["days"]
 
             if total_clients:
                 average_ticket = total_cash / total_clients
@@ -3150,6 +3392,37 @@ def stylist_reports(request):
 
     return render(request, "stylist_reports.html", context)
 
+
+@login_required
+@require_GET
+def stylist_reports_export(request):
+    """CSV отчёта мастера за ?start_date=&end_date= (см. ReportExportView)."""
+    try:
+        stylist = request.user.stylist_profile
+    except Stylist.DoesNotExist:
+        return render(request, "no_stylist_profile.html")
+
+    start = ReportView.parse_date(request.GET.get("start_date"))
+    end = ReportView.parse_date(request.GET.get("end_date"))
+    if not start or not end:
+        return HttpResponse("Укажите период.", status=400)
+    kind = request.GET.get("kind", "appointments")
+    if kind not in {"days", "appointments"}:
+        return HttpResponse("Неизвестный вид выгрузки.", status=400)
+
+    filename = report_period_filename("stylist-report", kind, start, end)
+    if kind == "days":
+        stats_qs = DailySalonStats.objects.filter(stylist=stylist, date__range=(start, end))
+        return csv_streaming_response(filename, DAILY_EXPORT_HEADER, daily_export_rows(stats_qs))
+
+    range_start, range_end = local_day_bounds(start, end)
+    appointments_qs = Appointment.objects.filter(
+        stylist=stylist, start_time__gte=range_start, start_time__lt=range_end
+    )
+    return csv_streaming_response(
+        filename, APPOINTMENT_EXPORT_HEADER, appointment_export_rows(appointments_qs)
+    )
+
 @login_required
 def stylist_dayoff_view(request):
     profile = request.user.profile
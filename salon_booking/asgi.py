@@ -5,6 +5,21 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+
+The dashboard long-polls (``dashboard_updates``, ``stylist_dashboard_updates``)
+and the SSE streams are async views. They only pay off when the project is
+served from this module by an ASGI server, e.g.::
+
+    gunicorn salon_booking.asgi:application -k uvicorn.workers.UvicornWorker -w 4
+
+(or ``uvicorn salon_booking.asgi:application --workers 4``). A waiting
+client then holds no worker thread until an appointment change wakes it, and
+one event loop per worker process shares the in-process notifications of
+``booking.notifications`` between all of its waiters.
+
+Under WSGI (``salon_booking.wsgi``) the long-polls still work, but each one
+runs in its own event loop and keeps a worker busy for up to its timeout;
+the SSE streams answer 204 and the dashboards fall back to the long-poll.
 """
 
 import os
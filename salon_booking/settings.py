@@ -87,6 +87,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'salon_booking.wsgi.application'
+# Живые обновления дашбордов рассчитаны на ASGI-сервер (см. salon_booking/asgi.py).
+ASGI_APPLICATION = 'salon_booking.asgi.application'
 
 
 # Database
@@ -104,6 +106,18 @@ DATABASES = {
 }
 
 
+# Кэш должен быть общим для всех процессов-воркеров: в нём лежат версии
+# каналов дашбордов, счётчики календаря и собранные дни мастеров, и
+# изменение, сделанное одним воркером, должно быть видно остальным.
+# Нужен пакет redis; проверка booking.W001 предупреждает о кэше в памяти процесса.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv("REDIS_URL", "redis://127.0.0.1:6379/1"),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -17,11 +17,7 @@ def is_stylist(user):
 
 @register.filter
 def sum_prices(appointment_services):
-    return sum(
-        ap.stylist_service.price
-        for ap in appointment_services
-        if ap.stylist_service and ap.stylist_service.price
-    )
+    return sum(ap.get_price() for ap in appointment_services)
 
 
 @register.simple_tag